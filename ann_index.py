@@ -0,0 +1,226 @@
+"""Approximate nearest-neighbour index for the emotion matrix
+
+- `IVFIndex` partitions the unit movie vectors with spherical k-means
+  (inverted file); a query scores the `n_probe` closest centroids and then
+  only the movies in those lists
+- `n_probe` is the recall/latency knob: `n_probe == n_lists` is exact.
+  Left unset, `build` picks the smallest `n_probe` whose recall@TUNE_K on
+  `TUNE_QUERIES` sampled queries (`sample_queries`) reaches
+  `recall_target`. The measured `recall` is kept with the index, saved with
+  it and reported by `server.py --ann`
+- Build once, `save` to an .npz next to the catalog and `load` it in workers
+
+    python ann_index.py datasets/movies_dataset_500_souj.emx [--recall 0.95 | --probe 8]
+    -> datasets/movies_dataset_500_souj.emx.ivf.npz
+
+Pure NumPy; used through `EmotionIndex.build_ann` / `EmotionIndex.load_ann`.
+"""
+
+import argparse
+import sys
+
+import numpy as np
+
+from emotion_index import topk_rows
+
+# rows per block when assigning the catalog to centroids (bounds memory)
+ASSIGN_BLOCK = 65536
+# n_probe tuning: default recall@k target, sampled queries and their k
+RECALL_TARGET = 0.95
+TUNE_QUERIES = 200
+TUNE_K = 10
+
+
+def _unit_rows(X):
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return X / norms
+
+
+def _assign(X, centroids):
+    """Index of the most similar centroid for every row of X."""
+    labels = np.empty(len(X), dtype=np.int32)
+    for start in range(0, len(X), ASSIGN_BLOCK):
+        labels[start:start + ASSIGN_BLOCK] = np.argmax(X[start:start + ASSIGN_BLOCK] @ centroids.T, axis=1)
+    return labels
+
+
+def spherical_kmeans(X, n_clusters, n_iter=10, train_size=None, seed=0):
+    """Cluster unit vectors by cosine similarity; returns unit centroids."""
+    rng = np.random.default_rng(seed)
+    if train_size is not None and len(X) > train_size:
+        X = X[rng.choice(len(X), train_size, replace=False)]
+    centroids = X[rng.choice(len(X), n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        labels = _assign(X, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, X)
+        counts = np.bincount(labels, minlength=n_clusters)
+        # reseed empty clusters with random rows so every list stays useful
+        empty = np.flatnonzero(counts == 0)
+        if empty.size:
+            sums[empty] = X[rng.choice(len(X), empty.size, replace=False)]
+        centroids = _unit_rows(sums).astype(np.float32)
+    return centroids
+
+
+class IVFIndex:
+    """Inverted-file index over a (unit) movie matrix.
+
+    Lists are stored CSR-style: `ids[offsets[c]:offsets[c + 1]]` are the movie
+    rows assigned to centroid `c`, and `vectors` holds those rows in the same
+    order so each probed list is one contiguous slice.
+    """
+
+    def __init__(self, n_lists=None, n_probe=None, n_iter=10, seed=0, recall_target=RECALL_TARGET):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.n_iter = n_iter
+        self.seed = seed
+        self.recall_target = recall_target
+        # sampled recall@TUNE_K at n_probe (None: not measured)
+        self.recall = None
+        self.centroids = None
+        self.offsets = None
+        self.ids = None
+        self.vectors = None
+
+    def build(self, matrix):
+        matrix = np.asarray(matrix, dtype=np.float32)
+        if self.n_lists is None:
+            self.n_lists = max(1, int(np.sqrt(len(matrix))))
+        self.n_lists = min(self.n_lists, len(matrix))
+        self.centroids = spherical_kmeans(_unit_rows(matrix), self.n_lists, self.n_iter,
+                                          train_size=256 * self.n_lists, seed=self.seed)
+        self._attach(matrix, _assign(_unit_rows(matrix), self.centroids))
+        if self.n_probe is None:
+            self.tune(self.recall_target)
+        else:
+            # a fixed n_probe: no target to re-tune for after catalog changes
+            self.recall, self.recall_target = self.measure_recall(), None
+        return self
+
+    def _attach(self, matrix, labels):
+        self.ids = np.argsort(labels, kind="stable").astype(np.int64)
+        counts = np.bincount(labels, minlength=self.n_lists)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        self.vectors = np.ascontiguousarray(matrix[self.ids])
+
+    def labels(self):
+        """List number of every indexed row."""
+        labels = np.empty(len(self.ids), dtype=np.int32)
+        labels[self.ids] = np.repeat(np.arange(self.n_lists, dtype=np.int32), np.diff(self.offsets))
+        return labels
+
+    def update(self, rows, matrix):
+        """Re-index `rows` of `matrix` (changed or appended rows) against the
+        existing centroids; no re-clustering, one O(M) regroup."""
+        matrix = np.asarray(matrix, dtype=np.float32)
+        labels = np.zeros(len(matrix), dtype=np.int32)
+        labels[:len(self.ids)] = self.labels()
+        rows = np.asarray(rows, dtype=np.int64)
+        if rows.size:
+            labels[rows] = _assign(_unit_rows(matrix[rows]), self.centroids)
+        self._attach(matrix, labels)
+        return self
+
+    def sample_queries(self, n=TUNE_QUERIES):
+        """Unit queries for recall checks: half movie profiles with randomly
+        re-weighted emotions, half uniform random slider settings."""
+        rng = np.random.default_rng(self.seed)
+        rows = self.vectors[rng.choice(len(self.vectors), min(n // 2, len(self.vectors)), replace=False)]
+        sliders = rng.random((n - len(rows), self.vectors.shape[1]), dtype=np.float32)
+        return _unit_rows(np.vstack([rows * rng.random(rows.shape, dtype=np.float32), sliders]))
+
+    def measure_recall(self, queries=None, k=TUNE_K, n_probe=None):
+        """Recall@k of `search` against an exact scan (default queries:
+        `sample_queries`). A result counts as a hit when its score reaches
+        the exact k-th best, so equally scored movies are interchangeable."""
+        queries = self.sample_queries() if queries is None else queries
+        _, approx = self.search(queries, k, n_probe)
+        _, exact = topk_rows(queries @ self.vectors.T, min(k, len(self.ids)))
+        return float((approx >= exact[:, -1:] - 1e-6).mean())
+
+    def tune(self, target=RECALL_TARGET):
+        """Set `n_probe` to the smallest value whose sampled recall reaches
+        `target` (recall grows with n_probe; n_lists is exact)."""
+        queries = self.sample_queries()
+        # doubling, then bisection between the last miss and the first hit
+        lo, hi = 0, 1
+        while hi < self.n_lists and self.measure_recall(queries, n_probe=hi) < target:
+            lo, hi = hi, min(2 * hi, self.n_lists)
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if self.measure_recall(queries, n_probe=mid) >= target:
+                hi = mid
+            else:
+                lo = mid
+        self.n_probe, self.recall_target = hi, target
+        self.recall = self.measure_recall(queries)
+        return self.n_probe
+
+    def save(self, path):
+        np.savez(path, centroids=self.centroids, labels=self.labels(),
+                 params=np.array([self.n_lists, self.n_probe, self.n_iter, self.seed]),
+                 recall=np.array([np.nan if v is None else v for v in (self.recall, self.recall_target)]))
+
+    @classmethod
+    def load(cls, path, matrix):
+        """Load a saved index; `matrix` must be the catalog it was built from."""
+        with np.load(path) as data:
+            n_lists, n_probe, n_iter, seed = (int(x) for x in data["params"])
+            index = cls(n_lists, n_probe, n_iter, seed)
+            index.centroids = data["centroids"]
+            labels = data["labels"]
+            # files saved before recall tuning have no recall entry
+            recall, target = data["recall"] if "recall" in data else (np.nan, np.nan)
+            index.recall = None if np.isnan(recall) else float(recall)
+            index.recall_target = None if np.isnan(target) else float(target)
+        if len(labels) != len(matrix):
+            raise ValueError(f"Index was built for {len(labels)} movies, catalog has {len(matrix)}")
+        index._attach(np.asarray(matrix, dtype=np.float32), labels)
+        return index
+
+    def search(self, queries, k, n_probe=None):
+        """Top-k (ids, scores) per query row, best first.
+
+        Queries whose probed lists hold fewer than k movies fall back to an
+        exact scan, so results always have k entries.
+        """
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+        k = min(k, len(self.ids))
+        out_idx = np.empty((len(queries), k), dtype=np.intp)
+        out_sim = np.empty((len(queries), k), dtype=np.float32)
+        probes, _ = topk_rows(queries @ self.centroids.T, n_probe)
+        for i, (q, lists) in enumerate(zip(queries, probes)):
+            spans = [(self.offsets[c], self.offsets[c + 1]) for c in lists]
+            if sum(b - a for a, b in spans) < k:
+                spans = [(0, len(self.ids))]
+            sim = np.concatenate([self.vectors[a:b] @ q for a, b in spans])
+            pos = np.concatenate([np.arange(a, b) for a, b in spans])
+            order, top = topk_rows(sim[None, :], k)
+            out_idx[i], out_sim[i] = self.ids[pos[order[0]]], top[0]
+        return out_idx, out_sim
+
+
+def main(argv=None):
+    from emotion_index import open_index
+    parser = argparse.ArgumentParser(description="Build an IVF approximate index for a catalog")
+    parser.add_argument("catalog", help="catalog CSV or compiled .emx")
+    parser.add_argument("--lists", type=int, help="number of lists (default: sqrt(movies))")
+    parser.add_argument("--recall", type=float, default=RECALL_TARGET,
+                        help=f"pick the smallest n_probe with this sampled recall@{TUNE_K} (default %(default)s)")
+    parser.add_argument("--probe", type=int, help="fixed n_probe instead of --recall (lower: faster, less recall)")
+    parser.add_argument("--out", help="output .npz (default: <catalog>.ivf.npz)")
+    args = parser.parse_args(argv)
+    if not 0 < args.recall <= 1:
+        sys.exit("--recall must be in (0, 1]")
+    index = open_index(args.catalog)
+    ann = index.build_ann(n_lists=args.lists, n_probe=args.probe, recall_target=args.recall)
+    out = args.out or f"{args.catalog}.ivf.npz"
+    ann.save(out)
+    print(f"Wrote {out} ({ann.n_lists} lists, n_probe {ann.n_probe}, sampled recall@{TUNE_K} {ann.recall:.3f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,9 @@
 /**
  * Multi-User Emotion-Based Movie Recommender (Web)
- * Same logic as multi_user_recommender.py; dataset: movies_dataset_500_souj.csv
+ * Same logic as multi_user_recommender.py. Served by server.py, scoring runs
+ * on the server (POST /group, /recommend); opened from any other static
+ * server, it falls back to downloading movies_dataset_500_souj.csv and
+ * scoring in the browser.
  */
 
 const EMOTIONS = [
@@ -12,11 +15,25 @@ const EMOTIONS = [
 
 const CSV_URL = 'datasets/movies_dataset_500_souj.csv';
 
+// true when server.py answers /health: the CSV is never downloaded
+let useServer = false;
+
 let df = [];
 let movieMatrix = [];
-let movieUnit = [];
+let movieUnit = new Float32Array(0); // flat M x EMOTIONS.length, row-major
 let movieNorms = [];
 
+// group strategies (same as group_stats.py)
+const STRATEGY_LABELS = {
+  mean: 'averaged',
+  average: 'average score',
+  least_misery: 'least misery',
+  most_pleasure: 'most pleasure',
+  borda: 'Borda count',
+  fairness: 'fairness'
+};
+const FAIRNESS_PENALTY = 0.5;
+
 function parseCSV(text) {
   const lines = text.trim().split(/\r?\n/);
   if (lines.length < 2) return [];
@@ -58,6 +75,98 @@ function norm(v) {
   return Math.sqrt(s) || 1;
 }
 
+/**
+ * Top-k movies for several unit vectors in one pass over the movie matrix.
+ * Keeps a small sorted buffer per vector instead of sorting all M scores.
+ * Returns one array of { idx, sim } per vector, best first.
+ */
+function topKBatch(vectors, k) {
+  const d = EMOTIONS.length;
+  const m = movieUnit.length / d;
+  const tops = vectors.map(() => []);
+  for (let r = 0; r < m; r++) {
+    const off = r * d;
+    for (let u = 0; u < vectors.length; u++) {
+      const vec = vectors[u];
+      let s = 0;
+      for (let j = 0; j < d; j++) s += movieUnit[off + j] * vec[j];
+      const top = tops[u];
+      if (top.length === k && s <= top[k - 1].sim) continue;
+      let pos = top.length < k ? top.length : k - 1;
+      while (pos > 0 && top[pos - 1].sim < s) {
+        top[pos] = top[pos - 1];
+        pos--;
+      }
+      top[pos] = { idx: r, sim: s };
+    }
+  }
+  return tops;
+}
+
+// n x M user-by-movie scores (row-major): one pass shared by the per-user
+// Top-k and every group strategy
+function scoreMatrix(vectors) {
+  const d = EMOTIONS.length;
+  const m = movieUnit.length / d;
+  const S = new Float32Array(vectors.length * m);
+  for (let r = 0; r < m; r++) {
+    const off = r * d;
+    for (let u = 0; u < vectors.length; u++) {
+      const vec = vectors[u];
+      let s = 0;
+      for (let j = 0; j < d; j++) s += movieUnit[off + j] * vec[j];
+      S[u * m + r] = s;
+    }
+  }
+  return S;
+}
+
+function topKOf(scores, offset, m, k) {
+  const top = [];
+  for (let r = 0; r < m; r++) {
+    const s = scores[offset + r];
+    if (top.length === k && s <= top[k - 1].sim) continue;
+    let pos = top.length < k ? top.length : k - 1;
+    while (pos > 0 && top[pos - 1].sim < s) {
+      top[pos] = top[pos - 1];
+      pos--;
+    }
+    top[pos] = { idx: r, sim: s };
+  }
+  return top;
+}
+
+// per-movie group score from the n x M score matrix
+function aggregateScores(S, n, m, strategy) {
+  const out = new Float64Array(m);
+  if (strategy === 'borda') {
+    const order = new Array(m);
+    for (let u = 0; u < n; u++) {
+      for (let r = 0; r < m; r++) order[r] = r;
+      order.sort((a, b) => S[u * m + a] - S[u * m + b] || a - b);
+      // points = number of movies this user scores lower
+      order.forEach((r, rank) => { out[r] += rank; });
+    }
+    return out;
+  }
+  for (let r = 0; r < m; r++) {
+    let sum = 0, sq = 0, min = Infinity, max = -Infinity;
+    for (let u = 0; u < n; u++) {
+      const s = S[u * m + r];
+      sum += s;
+      sq += s * s;
+      if (s < min) min = s;
+      if (s > max) max = s;
+    }
+    const mean = sum / n;
+    if (strategy === 'least_misery') out[r] = min;
+    else if (strategy === 'most_pleasure') out[r] = max;
+    else if (strategy === 'fairness') out[r] = mean - FAIRNESS_PENALTY * Math.sqrt(Math.max(sq / n - mean * mean, 0));
+    else out[r] = mean;
+  }
+  return out;
+}
+
 function loadDataset() {
   const loading = document.getElementById('loading');
   loading.hidden = false;
@@ -77,7 +186,8 @@ function loadDataset() {
       movieMatrix = M;
       movieNorms = M.map(row => norm(row));
       movieNorms = movieNorms.map(n => n === 0 ? 1 : n);
-      movieUnit = movieMatrix.map((row, i) => row.map((v, j) => v / movieNorms[i]));
+      movieUnit = new Float32Array(M.length * EMOTIONS.length);
+      M.forEach((row, i) => row.forEach((v, j) => { movieUnit[i * EMOTIONS.length + j] = v / movieNorms[i]; }));
       loading.hidden = true;
       document.getElementById('computeBtn').disabled = false;
       const status = document.getElementById('dataStatus');
@@ -90,6 +200,35 @@ function loadDataset() {
     });
 }
 
+// Probe for server.py; without it, load the CSV and score locally
+function connect() {
+  fetch('health')
+    .then(r => (r.ok ? r.json() : null))
+    .catch(() => null)
+    .then(health => {
+      if (!health || health.status !== 'ok') return loadDataset();
+      useServer = true;
+      document.getElementById('computeBtn').disabled = false;
+      const status = document.getElementById('dataStatus');
+      if (status) status.textContent = `${health.movies} movies on the server`;
+      ensureOneUser();
+    });
+}
+
+function postJSON(url, body) {
+  return fetch(url, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify(body)
+  }).then(r => r.json().catch(() => ({})).then(data => {
+    if (!r.ok) throw new Error(data.error || `${url} failed (HTTP ${r.status})`);
+    return data;
+  }));
+}
+
+// API movie -> the { idx, title, year, sim } items the renderers use
+const fromApi = x => ({ idx: x.id, title: x.title, year: x.year, sim: x.score });
+
 function showToast(msg, durationMs) {
   const el = document.getElementById('toast');
   el.textContent = msg;
@@ -149,7 +288,10 @@ function addUser() {
     const valueSpan = document.createElement('span');
     valueSpan.className = 'slider-value';
     valueSpan.textContent = '5';
-    input.addEventListener('input', () => { valueSpan.textContent = input.value; });
+    input.addEventListener('input', () => {
+      valueSpan.textContent = input.value;
+      sendLiveDelta(card, emotion, parseFloat(input.value) || 0);
+    });
     wrap.appendChild(label);
     wrap.appendChild(input);
     wrap.appendChild(valueSpan);
@@ -174,6 +316,7 @@ function addUser() {
       const val = wrap && wrap.querySelector('.slider-value');
       if (val) val.textContent = '5';
     });
+    sendLiveVector(card);
   });
   const previewBtn = document.createElement('button');
   previewBtn.type = 'button';
@@ -181,9 +324,21 @@ function addUser() {
   previewBtn.style.fontSize = '0.8rem';
   previewBtn.textContent = 'Preview my top 3';
   previewBtn.addEventListener('click', () => previewUserTop3(card));
+  const liveBtn = document.createElement('button');
+  liveBtn.type = 'button';
+  liveBtn.className = 'btn btn-ghost';
+  liveBtn.style.fontSize = '0.8rem';
+  liveBtn.textContent = 'Live top 3';
+  liveBtn.addEventListener('click', () => toggleLive(card, liveBtn));
   btnRow.appendChild(resetOneBtn);
   btnRow.appendChild(previewBtn);
+  btnRow.appendChild(liveBtn);
   card.appendChild(btnRow);
+  const liveBox = document.createElement('ol');
+  liveBox.className = 'live-top';
+  liveBox.hidden = true;
+  card.appendChild(liveBox);
+  card._liveBox = liveBox;
   card._inputs = inputs;
 
   // Insert before the wrapper (addCard is inside add-user-wrap; only direct children work for insertBefore)
@@ -199,6 +354,7 @@ function removeUser(card) {
     showToast('Keep at least one user.');
     return;
   }
+  stopLive(card);
   card.remove();
   renumberUserTitles();
 }
@@ -252,27 +408,27 @@ function compute() {
   }
   const userUnits = result.vectors;
   const n = userUnits.length;
-
-  const U = userUnits.map(u => u.slice());
-
-  const perUserTop3 = [];
-  const perUserSims = [];
-  for (let i = 0; i < n; i++) {
-    const sim = movieUnit.map(row => {
-      let d = 0;
-      for (let j = 0; j < EMOTIONS.length; j++) d += row[j] * userUnits[i][j];
-      return d;
-    });
-    perUserSims.push(sim);
-    const order = sim
-      .map((s, idx) => ({ s, idx }))
-      .sort((a, b) => b.s - a.s)
-      .slice(0, 3)
-      .map(x => x.idx);
-    perUserTop3.push(order.map(idx => ({ idx, title: df[idx].title, year: df[idx].year, sim: sim[idx] })));
+  const originalVecs = getOriginalScaledVectors();
+  const strategySelect = document.getElementById('strategySelect');
+  const strategy = strategySelect ? strategySelect.value : 'mean';
+
+  if (useServer) {
+    // the server scores every user and the group in one request
+    postJSON('group', { users: originalVecs, k: 3, strategy, pairwise: true })
+      .then(data => showResults({
+        perUserTop3: data.per_user.map(top => top.map(fromApi)),
+        groupOrder: data.group.map(fromApi),
+        strategy,
+        pairwise: data.pairwise,
+        consensus: data.consensus,
+        userToGroup: data.user_to_group,
+        n
+      }))
+      .catch(err => showToast(err.message));
+    return;
   }
 
-  const originalVecs = getOriginalScaledVectors();
+  const U = userUnits.map(u => u.slice());
   let groupVec = originalVecs[0].slice();
   for (let i = 1; i < originalVecs.length; i++) {
     for (let j = 0; j < groupVec.length; j++) groupVec[j] += originalVecs[i][j];
@@ -285,16 +441,19 @@ function compute() {
   }
   const groupUnit = groupVec.map(x => x / groupNorm);
 
-  const groupSim = movieUnit.map(row => {
-    let d = 0;
-    for (let j = 0; j < EMOTIONS.length; j++) d += row[j] * groupUnit[j];
-    return d;
-  });
-  const groupOrder = groupSim
-    .map((s, idx) => ({ s, idx }))
-    .sort((a, b) => b.s - a.s)
-    .slice(0, 3)
-    .map(x => ({ idx: x.idx, title: df[x.idx].title, year: df[x.idx].year, sim: x.s }));
+  const withRow = x => ({ idx: x.idx, title: df[x.idx].title, year: df[x.idx].year, sim: x.sim });
+  let perUserTop3, groupOrder;
+  if (strategy === 'mean') {
+    // every user plus the group vector scored in a single pass
+    const tops = topKBatch(userUnits.concat([groupUnit]), 3);
+    perUserTop3 = tops.slice(0, n).map(top => top.map(withRow));
+    groupOrder = tops[n].map(withRow);
+  } else {
+    const m = movieUnit.length / EMOTIONS.length;
+    const S = scoreMatrix(userUnits);
+    perUserTop3 = userUnits.map((_, u) => topKOf(S, u * m, m, 3).map(withRow));
+    groupOrder = topKOf(aggregateScores(S, n, m, strategy), 0, m, 3).map(withRow);
+  }
 
   const pairwise = [];
   for (let i = 0; i < n; i++) {
@@ -325,25 +484,28 @@ function compute() {
     return d;
   });
 
-  const groupTitlesSet = new Set(groupOrder.map(x => x.title));
-  const overlaps = perUserTop3.map(tops => {
-    const userSet = new Set(tops.map(t => t.title));
-    let count = 0;
-    groupTitlesSet.forEach(t => { if (userSet.has(t)) count++; });
-    return count;
-  });
-
-  renderResults({
+  showResults({
     perUserTop3,
     groupOrder,
+    strategy,
     pairwise,
     consensus,
     userToGroup,
-    overlaps,
     n
   });
 }
 
+function showResults(data) {
+  const groupTitlesSet = new Set(data.groupOrder.map(x => x.title));
+  data.overlaps = data.perUserTop3.map(tops => {
+    const userSet = new Set(tops.map(t => t.title));
+    let count = 0;
+    groupTitlesSet.forEach(t => { if (userSet.has(t)) count++; });
+    return count;
+  });
+  renderResults(data);
+}
+
 function renderResults(data) {
   const section = document.getElementById('resultsSection');
   const content = document.getElementById('resultsContent');
@@ -368,12 +530,13 @@ function renderResults(data) {
 
   const groupCard = document.createElement('div');
   groupCard.className = 'result-card group';
-  groupCard.innerHTML = '<h4>Group top 3 (averaged)</h4><ul></ul>';
+  groupCard.innerHTML = `<h4>Group top 3 (${STRATEGY_LABELS[data.strategy]})</h4><ul></ul>`;
   const groupUl = groupCard.querySelector('ul');
   data.groupOrder.forEach((item, r) => {
     const li = document.createElement('li');
     const yearStr = item.year != null && !isNaN(item.year) ? item.year : 'N/A';
-    li.innerHTML = `${r + 1}. ${escapeHtml(item.title)} (${yearStr}) <span class="similarity-badge">${item.sim.toFixed(3)}</span>`;
+    const score = item.sim.toFixed(data.strategy === 'borda' ? 0 : 3);
+    li.innerHTML = `${r + 1}. ${escapeHtml(item.title)} (${yearStr}) <span class="similarity-badge">${score}</span>`;
     groupUl.appendChild(li);
   });
   grid.appendChild(groupCard);
@@ -444,22 +607,95 @@ function previewUserTop3(card) {
     showToast('Set at least one emotion slider above 0 to preview.');
     return;
   }
+  const show = order => {
+    const msg = order.map((x, r) => {
+      const yr = x.year != null && !isNaN(x.year) ? x.year : 'N/A';
+      return `${r + 1}. ${x.title} (${yr}) — ${x.sim.toFixed(3)}`;
+    }).join('\n');
+    showToast(`User ${idx + 1} top 3:\n${msg}`, 6000);
+  };
+  if (useServer) {
+    postJSON('recommend', { vector: scaled, k: 3 })
+      .then(data => show(data.results.map(fromApi)))
+      .catch(err => showToast(err.message));
+    return;
+  }
   const unit = scaled.map(x => x / n);
-  const sim = movieUnit.map(row => {
-    let d = 0;
-    for (let j = 0; j < EMOTIONS.length; j++) d += row[j] * unit[j];
-    return d;
+  show(topKBatch([unit], 3)[0].map(x => ({ title: df[x.idx].title, year: df[x.idx].year, sim: x.sim })));
+}
+
+// Live mode (needs python server.py): the server keeps a session per card and
+// pushes a new top 3 over Server-Sent Events as slider moves arrive; it
+// coalesces rapid moves, so dragging costs a bounded number of scoring passes.
+function toggleLive(card, button) {
+  if (card._live) {
+    stopLive(card);
+    button.textContent = 'Live top 3';
+    return;
+  }
+  const raw = EMOTIONS.map(e => parseFloat(card._inputs[e].value) || 0);
+  if (!raw.some(x => x > 0)) {
+    showToast('Set at least one emotion slider above 0 to go live.');
+    return;
+  }
+  const source = new EventSource(`live?k=3&vector=${raw.join(',')}`);
+  const live = { source, id: null };
+  card._live = live;
+  button.textContent = 'Stop live';
+  source.addEventListener('session', ev => {
+    const previous = live.id;
+    live.id = JSON.parse(ev.data).id;
+    // a reconnect opens a new session seeded from the URL's first vector,
+    // and moves posted meanwhile went to the dead one: send the sliders now
+    if (previous !== null && previous !== live.id) sendLiveVector(card);
   });
-  const order = sim
-    .map((s, i) => ({ s, i }))
-    .sort((a, b) => b.s - a.s)
-    .slice(0, 3);
-  const msg = order.map((x, r) => {
-    const row = df[x.i];
-    const yr = row.year != null && !isNaN(row.year) ? row.year : 'N/A';
-    return `${r + 1}. ${row.title} (${yr}) — ${x.s.toFixed(3)}`;
-  }).join('\n');
-  showToast(`User ${idx + 1} top 3:\n${msg}`, 6000);
+  source.addEventListener('topk', ev => renderLive(card, JSON.parse(ev.data)));
+  source.onerror = () => {
+    if (live.id) return; // the browser reconnects on its own once opened
+    stopLive(card);
+    button.textContent = 'Live top 3';
+    showToast('Live mode needs the Python server (python server.py).');
+  };
+}
+
+function stopLive(card) {
+  if (!card._live) return;
+  card._live.source.close();
+  card._live = null;
+  card._liveBox.hidden = true;
+}
+
+function renderLive(card, data) {
+  const box = card._liveBox;
+  box.hidden = false;
+  box.innerHTML = '';
+  if (data.error) {
+    box.innerHTML = `<li>${escapeHtml(data.error)}</li>`;
+    return;
+  }
+  data.results.forEach(item => {
+    const li = document.createElement('li');
+    li.innerHTML = `${escapeHtml(item.title)} (${item.year != null ? item.year : 'N/A'}) <span class="similarity-badge">${item.score.toFixed(3)}</span>`;
+    box.appendChild(li);
+  });
+}
+
+function postLive(card, body) {
+  const live = card._live;
+  if (!live || !live.id) return;
+  fetch('live', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify(Object.assign({ id: live.id }, body))
+  }).catch(() => {});
+}
+
+function sendLiveDelta(card, emotion, value) {
+  postLive(card, { set: { [emotion]: value } });
+}
+
+function sendLiveVector(card) {
+  postLive(card, { vector: EMOTIONS.map(e => parseFloat(card._inputs[e].value) || 0) });
 }
 
 function resetAllSliders() {
@@ -470,6 +706,7 @@ function resetAllSliders() {
     const val = wrap && wrap.querySelector('.slider-value');
     if (val) val.textContent = '5';
   });
+  section.querySelectorAll('.user-card').forEach(sendLiveVector);
   showToast('All sliders reset to 5.');
 }
 
@@ -481,7 +718,7 @@ function init() {
   document.getElementById('computeBtn').addEventListener('click', compute);
   document.getElementById('resetSlidersBtn').addEventListener('click', resetAllSliders);
 
-  loadDataset();
+  connect();
 }
 
 init();
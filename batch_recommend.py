@@ -0,0 +1,230 @@
+"""Streaming batch recommendations over JSONL
+
+    python batch_recommend.py users.jsonl --out recs.jsonl [--catalog big.emx] [--workers 8]
+    cat users.jsonl | python batch_recommend.py - > recs.jsonl
+
+One request per input line, the same shape as a /recommend body:
+    {"id": "u1", "vector": [24 numbers], "k": 10}
+    {"id": "u2", "vector": "adrenaline + engagement", "filters": {"year_min": 2000}}
+    {"id": "u3", "vector": {"comfort": 1, "fear": 0.5}, "boost": {"intents": {"comfort": 0.1}}}
+(`vector` may also be spelled `mix`; term mixes as in emotion_vocab.py).
+One result line per request, in input order:
+    {"id": "u1", "results": [{"id": 12, "title": ..., "score": ...}, ...]}
+    {"id": "u2", "line": 2, "error": "vector: unknown term 'adrenalin'"}
+
+Lines are read `CHUNK_LINES` at a time. Within a chunk, requests with the
+same filters and boost are scored together by `topk_batch` (one GEMM per
+`SCORE_BLOCK` of scores) and their term mixes are projected with one
+product, so memory is one chunk whatever the input size. With `--workers`
+chunks go to a process pool (each worker opens the catalog once; .emx
+pages are shared) with a bounded number in flight, and results are still
+written in input order.
+"""
+
+import argparse
+import itertools
+import json
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import recommender_api as api
+from catalog_filters import spec_key
+from emotion_index import DEFAULT_CSV
+from emotion_vocab import vocabulary
+
+CHUNK_LINES = 4096
+
+# per-worker catalog, set by _attach_worker
+_WORKER = {}
+
+
+class BatchScorer:
+    """Scores chunks of JSONL request lines against one `EmotionIndex`."""
+
+    def __init__(self, index, default_k=api.DEFAULT_K):
+        self.index = index
+        self.default_k = default_k
+        self.vocab = vocabulary(index.emotions)
+        # movie id -> result object without the score (rows repeat a lot)
+        self._movies = {}
+        # error lines of the chunk being scored
+        self.errors = 0
+
+    def _movie(self, i, score):
+        base = self._movies.get(i)
+        if base is None:
+            base = api.movie_json(self.index, i, 0.0)
+            del base["score"]
+            self._movies[i] = base
+        return {**base, "score": round(float(score), 6)}
+
+    def _parse(self, line, mixes):
+        """(k, filters, boost, vector or mix terms) of one request line."""
+        req = json.loads(line)
+        if not isinstance(req, dict):
+            raise api.RequestError("request must be a JSON object")
+        req.setdefault("k", self.default_k)
+        k, filters, boost = api.parse_k(req), api.parse_filters(req), api.parse_boost(req)
+        value = req["vector"] if "vector" in req else req.get("mix")
+        if value is None:
+            raise api.RequestError("missing 'vector'")
+        if isinstance(value, (str, dict)):
+            # identical mixes within a chunk are parsed once
+            terms = mixes.get(value) if isinstance(value, str) else None
+            if terms is None:
+                terms = api.parse_mix(self.vocab, value)
+                if isinstance(value, str):
+                    mixes[value] = terms
+            return req, k, filters, boost, terms
+        return req, k, filters, boost, api.parse_vector(self.index, value)
+
+    def score_lines(self, lines, first_line=1):
+        """(JSONL result lines as one string, error count) for a chunk of
+        request lines."""
+        out = [None] * len(lines)
+        groups = {}
+        mixes = {}
+        for pos, line in enumerate(lines):
+            if not line.strip():
+                continue
+            req = {}
+            try:
+                req, k, filters, boost, value = self._parse(line, mixes)
+            except ValueError as e:
+                # RequestError, or malformed JSON
+                out[pos] = self._error(req, first_line + pos, e)
+                continue
+            key = (spec_key(filters), spec_key(boost))
+            group = groups.setdefault(key, (filters, boost, []))
+            group[2].append((pos, req, k, value))
+        for filters, boost, items in groups.values():
+            self._score_group(items, filters, boost, out, first_line)
+        errors, self.errors = self.errors, 0
+        return "".join(line + "\n" for line in out if line is not None), errors
+
+    def _score_group(self, items, filters, boost, out, first_line):
+        U = np.empty((len(items), len(self.index.emotions)), dtype=np.float32)
+        mix_rows = [j for j, item in enumerate(items) if isinstance(item[3], tuple)]
+        for j, item in enumerate(items):
+            if not isinstance(item[3], tuple):
+                U[j] = item[3]
+        if mix_rows:
+            U[mix_rows] = self.vocab.project([items[j][3] for j in mix_rows], normalize=False)
+        for j in mix_rows:
+            if not U[j].any():
+                pos, req = items[j][:2]
+                out[pos] = self._error(req, first_line + pos, "vector is zero; set at least one emotion above 0")
+        good = [j for j in range(len(items)) if out[items[j][0]] is None]
+        if not good:
+            return
+        k = max(items[j][2] for j in good)
+        try:
+            order, scores = self.index.topk_batch(U[good], k, filters=filters, boost=boost)
+        except ValueError as e:
+            # e.g. a tag filter on a catalog without tag columns
+            for j in good:
+                pos, req = items[j][:2]
+                out[pos] = self._error(req, first_line + pos, e)
+            return
+        for j, o, s in zip(good, order, scores):
+            pos, req, k = items[j][:3]
+            result = {"results": [self._movie(int(i), v) for i, v in zip(o[:k], s[:k])]}
+            if "id" in req:
+                result = {"id": req["id"], **result}
+            out[pos] = json.dumps(result)
+
+    def _error(self, req, line, error):
+        self.errors += 1
+        result = {"line": line, "error": str(error)}
+        if isinstance(req, dict) and "id" in req:
+            result = {"id": req["id"], **result}
+        return json.dumps(result)
+
+
+def _attach_worker(catalog, default_k):
+    from emotion_index import open_index
+    _WORKER["scorer"] = BatchScorer(open_index(catalog), default_k)
+
+
+def _score_task(lines, first_line):
+    return _WORKER["scorer"].score_lines(lines, first_line)
+
+
+def _chunks(stream, size):
+    """(first line number, lines) chunks of a text stream."""
+    first = 1
+    while True:
+        lines = list(itertools.islice(stream, size))
+        if not lines:
+            return
+        yield first, lines
+        first += len(lines)
+
+
+def run_batch(catalog, stream, out, default_k=api.DEFAULT_K, workers=1, chunk_lines=CHUNK_LINES):
+    """Score every request line of `stream` and write result lines to `out`.
+    Returns {"lines", "errors"}."""
+    stats = {"lines": 0, "errors": 0}
+
+    def write(result, n):
+        text, errors = result
+        stats["lines"] += n
+        stats["errors"] += errors
+        out.write(text)
+
+    if workers <= 1:
+        from emotion_index import open_index
+        scorer = BatchScorer(open_index(catalog), default_k)
+        for first, lines in _chunks(stream, chunk_lines):
+            write(scorer.score_lines(lines, first), len(lines))
+        return stats
+    with ProcessPoolExecutor(workers, initializer=_attach_worker, initargs=(catalog, default_k)) as pool:
+        # FIFO of in-flight chunks: a few per worker, written in input order
+        pending = deque()
+        for first, lines in _chunks(stream, chunk_lines):
+            pending.append((pool.submit(_score_task, lines, first), len(lines)))
+            if len(pending) >= 2 * workers:
+                future, n = pending.popleft()
+                write(future.result(), n)
+        while pending:
+            future, n = pending.popleft()
+            write(future.result(), n)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score JSONL recommendation requests in chunks")
+    parser.add_argument("input", help="request .jsonl file, or - for stdin")
+    parser.add_argument("--out", default="-", help="result .jsonl file, or - for stdout")
+    parser.add_argument("--catalog", default=DEFAULT_CSV, help="catalog CSV or compiled .emx")
+    parser.add_argument("--k", type=int, default=api.DEFAULT_K, help="k for requests that do not set one")
+    parser.add_argument("--workers", type=int, default=1, help="process pool size (chunks scored in parallel)")
+    parser.add_argument("--chunk-lines", type=int, default=CHUNK_LINES)
+    args = parser.parse_args(argv)
+    if not 1 <= args.k <= api.MAX_K:
+        sys.exit(f"--k must be between 1 and {api.MAX_K}")
+    if args.chunk_lines < 1:
+        sys.exit("--chunk-lines must be at least 1")
+
+    stream = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    out = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8")
+    start = time.perf_counter()
+    try:
+        stats = run_batch(args.catalog, stream, out, args.k, args.workers, args.chunk_lines)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - start
+    # the summary goes to stderr so `--out -` stays clean JSONL
+    print(f"{stats['lines']} lines, {stats['errors']} errors, {elapsed:.1f} s "
+          f"({stats['lines'] / max(elapsed, 1e-9):,.0f} lines/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""Benchmarks for the recommendation hot paths
+
+- Generates synthetic catalogs (M movies x 24 emotions, with year / imdb /
+  genres metadata) and batches of user vectors
+- Measures catalog load (CSV and compiled .emx), single-query top-k, batch
+  top-k, group computation, filtered queries and HTTP request latency, and
+  top-k over the int8 matrix mode with its recall@k
+- Reports throughput, p50/p99 latency and peak RSS; writes JSON, and with
+  `--compare old.json` flags p50 regressions (exit code 1)
+
+Run from the project root:
+    python benchmarks/bench_recommender.py --sizes 1e3,1e5 --out bench_results.json
+    python benchmarks/bench_recommender.py --sizes 1e3,1e5 --compare bench_results.json
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from catalog_store import write_catalog
+from catalog_filters import GenreIndex
+from emotion_index import EMOTIONS, EmotionIndex
+from quant_index import measure_recall
+
+GENRES = ["Action", "Adventure", "Animation", "Comedy", "Crime", "Drama", "Family",
+          "Fantasy", "Horror", "Musical", "Romance", "Sci-Fi", "Thriller", "War"]
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1 << 20 if sys.platform == "darwin" else 1 << 10), 1)
+
+
+def summarize(latencies, items=1):
+    """Latency percentiles (ms) and items/s for a list of seconds."""
+    lat = np.asarray(latencies) * 1000.0
+    return {
+        "runs": len(lat),
+        "mean_ms": round(float(lat.mean()), 4),
+        "p50_ms": round(float(np.percentile(lat, 50)), 4),
+        "p99_ms": round(float(np.percentile(lat, 99)), 4),
+        "throughput_per_s": round(items * len(lat) / (lat.sum() / 1000.0), 1),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def timed(fn, runs, items=1):
+    latencies = []
+    for i in range(runs):
+        start = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - start)
+    return summarize(latencies, items)
+
+
+def synthetic_catalog(m, rng):
+    """Emotion matrix plus metadata resembling the bundled datasets."""
+    emotions = np.round(rng.random((m, len(EMOTIONS)), dtype=np.float32) ** 2 * 0.2, 2)
+    picks = rng.integers(0, len(GENRES), size=(m, 2))
+    meta = {
+        "title": [f"Movie {i}" for i in range(m)],
+        "year": rng.integers(1950, 2025, size=m).astype(np.float64),
+        "genres": [f"{GENRES[a]}|{GENRES[b]}" if a != b else GENRES[a] for a, b in picks],
+        "imdb": np.round(rng.uniform(4.0, 9.5, size=m), 1),
+    }
+    return emotions, meta
+
+
+def write_synthetic(emotions, meta, workdir, csv_max):
+    """Write the catalog as .emx (always) and .csv (up to csv_max rows)."""
+    norms = np.linalg.norm(emotions, axis=1)
+    norms[norms == 0] = 1.0
+    genres = GenreIndex.from_values(meta["genres"])
+    emx = os.path.join(workdir, f"catalog_{len(emotions)}.emx")
+    write_catalog(emx, emotions / norms[:, None], norms,
+                  {"year": meta["year"], "imdb": meta["imdb"]},
+                  {"title": meta["title"], "genres": meta["genres"],
+                   "genres.names": sorted(genres.names, key=genres.names.get)},
+                  extra={"genres.bits": genres.bits},
+                  order=["title", "year", "genres", "imdb"])
+    csv = None
+    if len(emotions) <= csv_max:
+        csv = os.path.join(workdir, f"catalog_{len(emotions)}.csv")
+        df = pd.DataFrame(emotions, columns=EMOTIONS)
+        for name in ["imdb", "genres", "year", "title"]:
+            df.insert(0, name, meta[name])
+        df.to_csv(csv, index=False)
+    return csv, emx
+
+
+def bench_server(index, runs, rng):
+    """Keep-alive POST /recommend latency against an in-process server."""
+    from server import RecommenderHandler, RecommenderServer
+
+    class QuietHandler(RecommenderHandler):
+        def log_message(self, format, *args):
+            pass
+
+    server = RecommenderServer(("127.0.0.1", 0), index, QuietHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    conn = http.client.HTTPConnection("127.0.0.1", server.server_address[1])
+    bodies = [json.dumps({"vector": (rng.random(len(EMOTIONS)) * 10).round(1).tolist(), "k": 10})
+              for _ in range(runs)]
+
+    def request(i):
+        conn.request("POST", "/recommend", body=bodies[i], headers={"Content-Type": "application/json"})
+        resp = conn.getresponse()
+        resp.read()
+        if resp.status != 200:
+            raise RuntimeError(f"server returned {resp.status}")
+
+    try:
+        return timed(request, runs)
+    finally:
+        conn.close()
+        server.shutdown()
+        server.server_close()
+
+
+def run_size(m, args, rng, workdir):
+    print(f"\n== {m:,} movies", flush=True)
+    emotions, meta = synthetic_catalog(m, rng)
+    csv, emx = write_synthetic(emotions, meta, workdir, args.csv_max)
+    del emotions, meta
+    results = {}
+
+    def record(name, stats):
+        results[name] = stats
+        print(f"  {name:<18} p50 {stats['p50_ms']:>10.3f} ms  p99 {stats['p99_ms']:>10.3f} ms  "
+              f"{stats['throughput_per_s']:>12,.1f}/s  rss {stats['peak_rss_mb']} MB", flush=True)
+
+    if csv:
+        record("load_csv", timed(lambda i: EmotionIndex.from_csv(csv), args.load_runs))
+    record("load_emx", timed(lambda i: EmotionIndex.from_binary(emx), args.load_runs))
+
+    index = EmotionIndex.from_binary(emx)
+    queries = rng.random((args.queries, len(EMOTIONS)), dtype=np.float32)
+    record("topk", timed(lambda i: index.topk(queries[i], args.k), args.queries))
+
+    batch = rng.random((args.batch, len(EMOTIONS)), dtype=np.float32)
+    record("topk_batch", timed(lambda i: index.topk_batch(batch, args.k), args.batch_runs, items=args.batch))
+
+    groups = rng.random((args.queries, args.group_size, len(EMOTIONS)), dtype=np.float32)
+    record("group", timed(lambda i: index.group(groups[i], args.k), args.queries))
+
+    specs = [
+        {"year_min": 2000, "year_max": 2001},
+        {"imdb_min": 6.0},
+        {"genres": ["Drama"], "genres_exclude": ["Horror"], "year_min": 1990},
+    ]
+    index.filter_index  # build outside the timed loop
+    record("filtered_topk", timed(lambda i: index.topk(queries[i], args.k, filters=specs[i % len(specs)]),
+                                  args.queries))
+
+    for mode in args.matrix.split(",") if args.matrix else []:
+        index.quantize(mode)
+        stats = timed(lambda i: index.topk(queries[i], args.k), args.queries)
+        stats["recall"] = measure_recall(index, queries, args.k)
+        stats["matrix_mb"] = round(index.quant.nbytes / 2**20, 1)
+        record(f"topk_{mode}", stats)
+        print(f"  {'':<18} recall@{args.k} {stats['recall']:.4f}, matrix {stats['matrix_mb']} MB", flush=True)
+    index.quant = None
+
+    if not args.no_server:
+        record("server_recommend", bench_server(index, args.queries, rng))
+
+    for path in (csv, emx):
+        if path:
+            os.remove(path)
+    return results
+
+
+def compare(current, baseline, threshold):
+    """List (size, bench, old p50, new p50) where p50 regressed by > threshold."""
+    regressions = []
+    for size, benches in current.items():
+        for name, stats in benches.items():
+            old = baseline.get(size, {}).get(name)
+            if old and stats["p50_ms"] > old["p50_ms"] * (1 + threshold):
+                regressions.append((size, name, old["p50_ms"], stats["p50_ms"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the recommendation hot paths")
+    parser.add_argument("--sizes", default="1e3,1e5", help="comma-separated catalog sizes, e.g. 1e3,1e5,1e7")
+    parser.add_argument("--queries", type=int, default=200, help="single queries / groups per size")
+    parser.add_argument("--batch", type=int, default=1000, help="users per batch")
+    parser.add_argument("--batch-runs", type=int, default=10)
+    parser.add_argument("--load-runs", type=int, default=3)
+    parser.add_argument("--group-size", type=int, default=8)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--matrix", default="int8",
+                        help="comma-separated reduced-precision modes to time (empty: skip)")
+    parser.add_argument("--csv-max", type=float, default=1e6, help="skip CSV load above this many movies")
+    parser.add_argument("--no-server", action="store_true", help="skip the HTTP latency benchmark")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--compare", help="previous results JSON to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed p50 slowdown (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        # read first: --out may point at the same file
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+
+    sizes = [int(float(s)) for s in args.sizes.split(",")]
+    rng = np.random.default_rng(args.seed)
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "args": vars(args),
+        "results": {},
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        for m in sizes:
+            report["results"][str(m)] = run_size(m, args, rng, workdir)
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {args.out}")
+
+    if baseline is not None:
+        regressions = compare(report["results"], baseline, args.threshold)
+        for size, name, old, new in regressions:
+            print(f"REGRESSION {size} {name}: p50 {old:.3f} ms -> {new:.3f} ms")
+        if regressions:
+            sys.exit(1)
+        print("No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+"""Append-only delta log over a base catalog
+
+`<catalog>.delta` (next to the base CSV or .emx) is JSON lines:
+    {"base": "<generation of the base file>"}                  header
+    {"op": "add", "row": {"title": "...", "year": 2024, "joy": 0.4, ...}}
+    {"op": "update", "id": 12, "row": {"imdb": 7.9, "fear": 0.6}}
+    {"op": "delete", "id": 40}
+Ids are row ids of the logical catalog: base rows keep their position and
+each add takes the next id, so replaying the log is deterministic.
+
+`open_index` replays the log on top of the base (`EmotionIndex.apply_delta`):
+- adds go into spare capacity of an in-memory copy of the matrix, grown
+  geometrically, so a batch of adds costs O(rows added), not a rebuild
+- updates renormalize only the changed rows
+- deletes set a tombstone (`index.deleted`); queries skip tombstoned rows
+  through the same mask path as metadata filters
+- `append_delta` rejects updates and deletes of ids that do not exist or
+  are already deleted; replay checks all ids before changing the index and
+  treats a repeated delete as a no-op
+- an attached ANN index re-assigns only changed rows to existing centroids;
+  filter indexes rebuild lazily on the next filtered query
+
+`compact(path)` folds the log into a new base without the tombstones (ids
+are renumbered) and starts an empty log for the new base generation. A log
+whose header names another generation (e.g. left over from a compaction that
+crashed after replacing the base) is ignored.
+
+CLI:
+    python catalog_delta.py add <catalog> <rows.csv>
+    python catalog_delta.py delete <catalog> <id> [<id> ...]
+    python catalog_delta.py compact <catalog> [--if-needed]
+"""
+
+import hashlib
+import json
+import os
+import sys
+import warnings
+
+import numpy as np
+
+# `compact --if-needed` threshold: log records per base row
+COMPACT_RATIO = 0.1
+OPS = ("add", "update", "delete")
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends and compaction are not serialized
+    fcntl = None
+
+
+def delta_path(path):
+    return f"{path}.delta"
+
+
+def base_generation(path):
+    """Identity of the base file's contents the log was written against."""
+    if path.endswith(".emx"):
+        from catalog_store import open_catalog
+        generation = open_catalog(path).header.get("generation")
+        if generation:
+            return generation
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+class _Lock:
+    """Exclusive advisory lock on `<catalog>.delta.lock` (no-op without fcntl)."""
+
+    def __init__(self, path):
+        self.path = delta_path(path) + ".lock"
+
+    def __enter__(self):
+        self.f = open(self.path, "a")
+        if fcntl is not None:
+            fcntl.flock(self.f, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self.f, fcntl.LOCK_UN)
+        self.f.close()
+
+
+def validate(record, emotions):
+    """Raise ValueError unless `record` is a well-formed delta record."""
+    if not isinstance(record, dict) or record.get("op") not in OPS:
+        raise ValueError(f"delta record needs op in {OPS}: {record!r}")
+    if record["op"] != "add":
+        i = record.get("id")
+        if isinstance(i, bool) or not isinstance(i, int) or i < 0:
+            raise ValueError(f"{record['op']} needs a non-negative integer id: {record!r}")
+    if record["op"] != "delete":
+        row = record.get("row")
+        if not isinstance(row, dict) or not row:
+            raise ValueError(f"{record['op']} needs a non-empty row object: {record!r}")
+        for e in emotions:
+            value = row.get(e)
+            if value is None:
+                continue
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not np.isfinite(value) or value < 0:
+                raise ValueError(f"emotion {e} must be a finite number >= 0: {record!r}")
+
+
+def check_ids(records, rows, deleted=(), skip_repeats=False):
+    """Replay the ids of `records` over a catalog of `rows` movies (`deleted`
+    tombstoned) and raise ValueError, before anything is applied, if an
+    update or delete names a movie that does not exist or is deleted.
+
+    With `skip_repeats` a delete of an already deleted movie is a no-op
+    instead (logs written before appends were checked may hold them).
+    Returns (rows, deleted ids, positions of the skipped records).
+    """
+    dead = set(deleted)
+    skipped = set()
+    for pos, record in enumerate(records):
+        op = record["op"]
+        if op == "add":
+            rows += 1
+            continue
+        i = record["id"]
+        if i in dead and op == "delete" and skip_repeats:
+            skipped.add(pos)
+            continue
+        if i >= rows or i in dead:
+            raise ValueError(f"{op}: no movie with id {i}{' (deleted)' if i in dead else ''}")
+        if op == "delete":
+            dead.add(i)
+    return rows, dead, skipped
+
+
+def base_rows(path):
+    """Number of movies in the base file (without the log)."""
+    if path.endswith(".emx"):
+        from catalog_store import open_catalog
+        return len(open_catalog(path))
+    import pandas as pd
+    return len(pd.read_csv(path, usecols=[0]))
+
+
+def read_delta(path):
+    """Records of the log for base `path` ([] if absent or stale)."""
+    log = delta_path(path)
+    if not os.path.exists(log):
+        return []
+    with open(log, "rb") as f:
+        lines = f.read().split(b"\n")
+    # a last line without newline is a torn append: ignore it
+    lines = [line for line in lines[:-1] if line.strip()]
+    if not lines:
+        return []
+    header = json.loads(lines[0])
+    if header.get("base") != base_generation(path):
+        warnings.warn(f"Ignoring {log}: written for another version of {path}", stacklevel=2)
+        return []
+    return [json.loads(line) for line in lines[1:]]
+
+
+def append_delta(path, records, emotions=None):
+    """Validate and durably append records to the log of base `path`.
+    Updates and deletes must name a live movie of the catalog as the log
+    leaves it (ValueError otherwise, and nothing is written)."""
+    from emotion_index import EMOTIONS
+    for record in records:
+        validate(record, emotions or EMOTIONS)
+    log = delta_path(path)
+    with _Lock(path):
+        # under the lock: no other append can change the replayed state
+        rows, dead, _ = check_ids(read_delta(path), base_rows(path), skip_repeats=True)
+        check_ids(records, rows, dead)
+        fresh = not os.path.exists(log) or os.path.getsize(log) == 0
+        with open(log, "ab") as f:
+            if fresh:
+                f.write(json.dumps({"base": base_generation(path)}).encode("utf-8") + b"\n")
+            for record in records:
+                f.write(json.dumps(record).encode("utf-8") + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def _grow(index, rows):
+    """Make room for `rows` rows in the index's matrix buffers (amortized)."""
+    n, d = index.movie_unit.shape
+    buf = index._unit_buffer
+    if buf is None or len(buf) < rows:
+        capacity = max(rows, n + n // 4 + 1024)
+        unit = np.empty((capacity, d), dtype=np.float32)
+        norms = np.empty(capacity, dtype=np.float32)
+        unit[:n] = index.movie_unit
+        norms[:n] = index.norms
+        index._unit_buffer, index._norms_buffer = unit, norms
+    index.movie_unit = index._unit_buffer[:rows]
+    index.norms = index._norms_buffer[:rows]
+    if index.deleted is not None and len(index.deleted) < rows:
+        index.deleted = np.concatenate([index.deleted, np.zeros(rows - len(index.deleted), dtype=bool)])
+
+
+def _set_row(index, i, raw):
+    raw = np.asarray(raw, dtype=np.float32)
+    norm = np.linalg.norm(raw)
+    index.norms[i] = norm if norm else 1.0
+    index.movie_unit[i] = raw / index.norms[i] if index.normalize else raw
+
+
+def apply_records(index, records):
+    """Apply delta records to an `EmotionIndex` in place (see module doc)."""
+    import pandas as pd
+    if not records:
+        return index
+    for record in records:
+        validate(record, index.emotions)
+    # every id is checked before the index is touched: a bad record leaves
+    # it as it was
+    deleted = () if index.deleted is None else np.flatnonzero(index.deleted).tolist()
+    _, _, skipped = check_ids(records, len(index), deleted, skip_repeats=True)
+    df = index.df
+    # metadata now lives in the (updated) frame, not the mapped catalog
+    index.catalog = None
+    n0 = len(index)
+    meta_cols = [c for c in df.columns if c not in index.emotions]
+    _grow(index, n0 + sum(r["op"] == "add" for r in records))
+    added, updates, changed = [], [], []
+    for pos, record in enumerate(records):
+        if pos in skipped:
+            continue
+        op, row = record["op"], record.get("row", {})
+        if op == "add":
+            i = n0 + len(added)
+            _set_row(index, i, [row.get(e) or 0.0 for e in index.emotions])
+            added.append({c: row.get(c) for c in df.columns})
+            changed.append(i)
+            continue
+        i = record["id"]
+        if op == "delete":
+            if index.deleted is None:
+                index.deleted = np.zeros(len(index), dtype=bool)
+            index.deleted[i] = True
+            continue
+        if any(e in row for e in index.emotions):
+            current = index.movie_unit[i] * (index.norms[i] if index.normalize else 1.0)
+            _set_row(index, i, [row[e] if e in row else current[j] for j, e in enumerate(index.emotions)])
+            changed.append(i)
+        values = {c: row[c] for c in df.columns if c in row}
+        if i >= n0:
+            added[i - n0].update(values)
+        elif values:
+            updates.append((i, values))
+
+    if added:
+        df = pd.concat([df, pd.DataFrame(added, columns=df.columns)], ignore_index=True)
+    for i, values in updates:
+        for col, value in values.items():
+            df.at[i, col] = value
+    if added or updates:
+        for col in ("year", "imdb"):
+            if col in meta_cols:
+                df[col] = pd.to_numeric(df[col], errors="coerce")
+    index._df = df
+
+    # derived structures: patch the ANN lists, rebuild the rest lazily
+    if index.ann is not None:
+        index.ann.update(changed, index.movie_unit)
+    if index.quant is not None:
+        index.quant.build(index.movie_unit)
+    # a neighbour table describes the old rows: rebuild it offline
+    index.neighbors = None
+    index._filter_index = None
+    index._titles = None
+    index._columns = None
+    index._column_bounds = None
+    if index.version is not None:
+        index.version = f"{index.version}+{len(records)}"
+    if index.cache is not None:
+        index.cache.clear()
+    return index
+
+
+def needs_compaction(path, ratio=COMPACT_RATIO):
+    from emotion_index import open_index
+    records = read_delta(path)
+    return bool(records) and len(records) >= ratio * max(1, len(open_index(path)) - len(records))
+
+
+def compact(path):
+    """Fold the log into a new base file and start an empty log."""
+    from emotion_index import open_index
+    with _Lock(path):
+        index = open_index(path)
+        live = np.ones(len(index), dtype=bool) if index.deleted is None else ~index.deleted
+        df = index.df.loc[live].reset_index(drop=True)
+        raw = index.movie_unit[live] * (index.norms[live][:, None] if index.normalize else 1.0)
+        for j, e in enumerate(index.emotions):
+            df[e] = np.round(raw[:, j].astype(np.float64), 6)
+        if path.endswith(".emx"):
+            from catalog_store import compile_frame
+            compile_frame(df, path, index.emotions)
+        else:
+            tmp = f"{path}.tmp"
+            df.to_csv(tmp, index=False)
+            os.replace(tmp, path)
+        # the new base has a new generation, so a stale log would be ignored
+        # even if we crashed here; replace it with an empty one for this base
+        tmp = f"{delta_path(path)}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(json.dumps({"base": base_generation(path)}).encode("utf-8") + b"\n")
+        os.replace(tmp, delta_path(path))
+    return int(live.sum())
+
+
+def main(argv):
+    usage = "Usage: python catalog_delta.py add <catalog> <rows.csv> | delete <catalog> <id>... | compact <catalog> [--if-needed]"
+    if len(argv) < 2 or argv[0] not in ("add", "delete", "compact"):
+        sys.exit(usage)
+    command, path = argv[0], argv[1]
+    if command == "add":
+        if len(argv) != 3:
+            sys.exit(usage)
+        import pandas as pd
+        rows = pd.read_csv(argv[2]).to_dict("records")
+        records = [{"op": "add", "row": {k: (None if v != v else v) for k, v in row.items()}} for row in rows]
+        append_delta(path, records)
+        print(f"Appended {len(records)} adds to {delta_path(path)}")
+    elif command == "delete":
+        records = [{"op": "delete", "id": int(i)} for i in argv[2:]]
+        append_delta(path, records)
+        print(f"Appended {len(records)} deletes to {delta_path(path)}")
+    else:
+        if "--if-needed" in argv and not needs_compaction(path):
+            print("Delta log is small; nothing to do")
+            return
+        print(f"Compacted {path} ({compact(path)} movies)")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,339 @@
+"""Index-backed metadata filters (year, IMDB rating, genre, intent / cluster tags)
+
+Built once per catalog:
+- `RangeIndex`: numeric column argsorted once; a [lo, hi] range is two
+  `np.searchsorted` calls and a slice of row ids
+- `GenreIndex`: one packed bitset (uint64 words, bit i = row i) per genre
+  from the pipe-delimited column, so AND/OR/NOT genre queries are a few
+  word-wise vector ops; compiled .emx catalogs store the bitsets
+- `TagIndex`: the intent_1/intent_2 and cluster_1/cluster_2 tag columns as
+  int16 codes (-1 = blank) plus one sorted posting list of rows per tag, so
+  restricting to or boosting a tag is a slice of row ids; compiled .emx
+  catalogs store the codes
+
+A filter spec is a plain dict (also the JSON shape accepted by the API):
+    {"years": [[lo, hi], ...],        # union of inclusive ranges; null = open
+     "year_min": 2000, "year_max": 2010,
+     "imdb_min": 7.5, "imdb_max": 9,
+     "genres": ["Drama", "Comedy"],   # any of
+     "genres_all": ["Crime"],         # all of
+     "genres_exclude": ["Horror"],    # none of
+     "intents": ["adrenaline"],       # tagged with any of (either slot)
+     "clusters": ["meaning_growth"]}
+`FilterIndex.mask` turns it into a boolean row mask (None = no filter);
+`EmotionIndex.topk(..., filters=spec)` picks filter-first or score-first
+from the resulting selectivity.
+
+A boost spec adds a bonus to the score of tagged rows instead of filtering:
+    {"intents": {"adrenaline": 0.1}, "clusters": {"engagement": 0.05}}
+`FilterIndex.bonus` turns it into one per-row score offset.
+"""
+
+import json
+import numpy as np
+
+GENRE_KEYS = ("genres", "genres_all", "genres_exclude")
+# tag family -> its catalog columns (primary, secondary)
+TAG_COLUMNS = {"intents": ("intent_1", "intent_2"), "clusters": ("cluster_1", "cluster_2")}
+SPEC_KEYS = {"years", "year_min", "year_max", "imdb_min", "imdb_max", *GENRE_KEYS, *TAG_COLUMNS}
+
+
+def _number(value, name):
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"filter {name} must be a number or null")
+    return float(value)
+
+
+def normalize_spec(spec):
+    """Validate a filter spec; returns a cleaned dict (empty = no filter)."""
+    if spec is None:
+        return {}
+    if not isinstance(spec, dict):
+        raise ValueError("filters must be an object")
+    unknown = set(spec) - SPEC_KEYS
+    if unknown:
+        raise ValueError(f"unknown filters: {sorted(unknown)}")
+    out = {}
+    if spec.get("years") is not None:
+        ranges = spec["years"]
+        if not isinstance(ranges, list) or not all(isinstance(r, list) and len(r) == 2 for r in ranges):
+            raise ValueError("filter years must be a list of [lo, hi] pairs")
+        out["years"] = [[_number(lo, "years"), _number(hi, "years")] for lo, hi in ranges]
+    for name in ("year_min", "year_max", "imdb_min", "imdb_max"):
+        value = _number(spec.get(name), name)
+        if value is not None:
+            out[name] = value
+    for name in (*GENRE_KEYS, *TAG_COLUMNS):
+        if spec.get(name) is not None:
+            values = spec[name]
+            if not isinstance(values, list) or not all(isinstance(v, str) for v in values):
+                raise ValueError(f"filter {name} must be a list of strings")
+            out[name] = sorted(set(values))
+    return out
+
+
+def normalize_boost(spec):
+    """Validate a boost spec ({family: {tag: bonus}}); returns a cleaned
+    dict (empty = no boost)."""
+    if spec is None:
+        return {}
+    if not isinstance(spec, dict):
+        raise ValueError("boost must be an object")
+    unknown = set(spec) - set(TAG_COLUMNS)
+    if unknown:
+        raise ValueError(f"unknown boost: {sorted(unknown)}")
+    out = {}
+    for family, weights in spec.items():
+        if not isinstance(weights, dict):
+            raise ValueError(f"boost {family} must be a tag->bonus object")
+        for tag, w in weights.items():
+            if isinstance(w, bool) or not isinstance(w, (int, float)) or not np.isfinite(w):
+                raise ValueError(f"boost {family}.{tag} must be a finite number")
+        weights = {tag: float(w) for tag, w in sorted(weights.items()) if w}
+        if weights:
+            out[family] = weights
+    return out
+
+
+def spec_key(spec):
+    """Hashable form of a normalized spec (for result caching)."""
+    return json.dumps(spec, sort_keys=True) if spec else ""
+
+
+class RangeIndex:
+    """Row ids of a numeric column sorted by value (NaN rows left out)."""
+
+    def __init__(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        valid = np.flatnonzero(~np.isnan(values))
+        order = np.argsort(values[valid], kind="stable")
+        self.ids = valid[order]
+        self.values = values[self.ids]
+
+    def select(self, lo=None, hi=None):
+        """Row ids with lo <= value <= hi (either bound may be None)."""
+        a = 0 if lo is None else np.searchsorted(self.values, lo, side="left")
+        b = len(self.values) if hi is None else np.searchsorted(self.values, hi, side="right")
+        return self.ids[a:b]
+
+
+def split_genres(values):
+    """Genre -> sorted row ids from a pipe-delimited genres column."""
+    postings = {}
+    for i, value in enumerate(values):
+        if not isinstance(value, str):
+            continue
+        for genre in value.split("|"):
+            genre = genre.strip()
+            if genre:
+                postings.setdefault(genre, []).append(i)
+    return {g: np.array(ids, dtype=np.int64) for g, ids in postings.items()}
+
+
+def pack_rows(rows, size):
+    """Packed uint64 bitset of length `size` with the bits of `rows` set."""
+    bits = np.zeros(-(-size // 64) * 64, dtype=bool)
+    bits[rows] = True
+    return np.packbits(bits, bitorder="little").view(np.uint64)
+
+
+def unpack_words(words, size):
+    """Boolean row mask from a packed uint64 bitset."""
+    return np.unpackbits(words.view(np.uint8), count=size, bitorder="little").view(bool)
+
+
+class GenreIndex:
+    """Inverted genre index: `bits[g]` is the packed row bitset of `names[g]`."""
+
+    def __init__(self, size, names, bits):
+        self.size = size
+        self.names = {name: g for g, name in enumerate(names)}
+        self.bits = bits
+
+    @classmethod
+    def from_values(cls, values):
+        postings = split_genres(values)
+        names = sorted(postings)
+        bits = np.vstack([pack_rows(postings[n], len(values)) for n in names]) if names \
+            else np.zeros((0, -(-len(values) // 64)), dtype=np.uint64)
+        return cls(len(values), names, bits)
+
+    def __contains__(self, genre):
+        return genre in self.names
+
+    def _words(self, genre):
+        g = self.names.get(genre)
+        return self.bits[g] if g is not None else np.zeros(self.bits.shape[1], dtype=np.uint64)
+
+    def query(self, any_of=(), all_of=(), none_of=()):
+        """Packed bitset of rows with any of `any_of`, all of `all_of` and
+        none of `none_of` (empty arguments do not restrict)."""
+        words = np.full(self.bits.shape[1], np.iinfo(np.uint64).max, dtype=np.uint64)
+        if any_of:
+            words &= np.bitwise_or.reduce([self._words(g) for g in any_of])
+        for genre in all_of:
+            words &= self._words(genre)
+        for genre in none_of:
+            words &= ~self._words(genre)
+        return words
+
+    def mask(self, any_of=(), all_of=(), none_of=()):
+        return unpack_words(self.query(any_of, all_of, none_of), self.size)
+
+
+def tag_columns(columns):
+    """Tag family -> the catalog columns of that family present in `columns`."""
+    present = {family: [c for c in names if c in columns] for family, names in TAG_COLUMNS.items()}
+    return {family: names for family, names in present.items() if names}
+
+
+def encode_tags(columns, names):
+    """int16 codes (n x len(columns)) of tag string columns; `names` (tag ->
+    code) gets new tags appended. Blank or missing values are -1."""
+    codes = np.full((len(columns[0]) if columns else 0, len(columns)), -1, dtype=np.int16)
+    for j, values in enumerate(columns):
+        for i, value in enumerate(values):
+            if isinstance(value, str) and value.strip():
+                codes[i, j] = names.setdefault(value.strip(), len(names))
+    return codes
+
+
+class TagIndex:
+    """Integer-coded tag columns with posting lists: rows tagged `names[t]`
+    (in any slot) are ids[offsets[t]:offsets[t + 1]], sorted."""
+
+    def __init__(self, names, codes):
+        self.size = len(codes)
+        self.names = {name: t for t, name in enumerate(names)}
+        self.codes = codes
+        rows, slots = np.nonzero(codes >= 0)
+        # one (tag, row) key per tagged row: sorted by tag, then row
+        pairs = np.unique(codes[rows, slots].astype(np.int64) * max(self.size, 1) + rows)
+        tags, self.ids = np.divmod(pairs, max(self.size, 1))
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(tags, minlength=len(names)))])
+
+    @classmethod
+    def from_values(cls, columns):
+        names = {}
+        codes = encode_tags(columns, names)
+        return cls(list(names), codes)
+
+    def __contains__(self, tag):
+        return tag in self.names
+
+    def rows(self, tag):
+        """Sorted row ids tagged `tag` (empty if unknown)."""
+        t = self.names.get(tag)
+        return self.ids[self.offsets[t]:self.offsets[t + 1]] if t is not None else self.ids[:0]
+
+    def mask(self, tags):
+        """Rows tagged with any of `tags`."""
+        mask = np.zeros(self.size, dtype=bool)
+        for tag in tags:
+            mask[self.rows(tag)] = True
+        return mask
+
+    def add_bonus(self, out, weights):
+        """Add weights[tag] to `out` at every row tagged `tag`."""
+        for tag, w in weights.items():
+            out[self.rows(tag)] += w
+        return out
+
+
+def index_column(index, name):
+    """Column of an `EmotionIndex` catalog, without building the DataFrame
+    for mapped .emx catalogs; None if the catalog has no such column."""
+    cat = index.catalog
+    if cat is None:
+        return index.df[name].to_numpy() if name in index.df.columns else None
+    if name not in cat.header["columns"]:
+        return None
+    if name in cat.header["strings"]:
+        return cat.column(name).tolist()
+    return cat[name]
+
+
+class FilterIndex:
+    """Precomputed year / IMDB / genre indexes for one catalog."""
+
+    def __init__(self, size, year=None, imdb=None, genres=None, tags=None):
+        self.size = size
+        # tag family -> TagIndex
+        self.tags = tags or {}
+        self.ranges = {}
+        if year is not None:
+            self.ranges["year"] = RangeIndex(year)
+        if imdb is not None:
+            self.ranges["imdb"] = RangeIndex(imdb)
+        # `genres` is a column of strings or a prebuilt GenreIndex
+        if genres is None or isinstance(genres, GenreIndex):
+            self.genres = genres
+        else:
+            self.genres = GenreIndex.from_values(genres)
+
+    @classmethod
+    def from_index(cls, index):
+        """Build from an `EmotionIndex` (uses the .emx columns and stored
+        genre bitsets / tag codes when mapped)."""
+        cat = index.catalog
+        if cat is not None and "genres.bits" in cat:
+            genres = GenreIndex(len(index), cat.column("genres.names").tolist(), cat["genres.bits"])
+        else:
+            genres = index_column(index, "genres")
+        columns = cat.header["columns"] if cat is not None else index.df.columns
+        tags = {}
+        for family, names in tag_columns(columns).items():
+            if cat is not None and f"{family}.codes" in cat:
+                tags[family] = TagIndex(cat.column(f"{family}.names").tolist(), cat[f"{family}.codes"])
+            else:
+                tags[family] = TagIndex.from_values([index_column(index, c) for c in names])
+        return cls(len(index), index_column(index, "year"), index_column(index, "imdb"), genres, tags)
+
+    def _rows_mask(self, rows):
+        mask = np.zeros(self.size, dtype=bool)
+        mask[rows] = True
+        return mask
+
+    def _range_mask(self, column, lo, hi):
+        if column not in self.ranges:
+            raise ValueError(f"catalog has no {column} column")
+        return self._rows_mask(self.ranges[column].select(lo, hi))
+
+    def mask(self, spec):
+        """Boolean row mask for a normalized spec, or None if it filters nothing."""
+        if not spec:
+            return None
+        mask = np.ones(self.size, dtype=bool)
+        if "years" in spec:
+            years = np.zeros(self.size, dtype=bool)
+            for lo, hi in spec["years"]:
+                years |= self._range_mask("year", lo, hi)
+            mask &= years
+        if "year_min" in spec or "year_max" in spec:
+            mask &= self._range_mask("year", spec.get("year_min"), spec.get("year_max"))
+        if "imdb_min" in spec or "imdb_max" in spec:
+            mask &= self._range_mask("imdb", spec.get("imdb_min"), spec.get("imdb_max"))
+        if any(name in spec for name in GENRE_KEYS):
+            if self.genres is None:
+                raise ValueError("catalog has no genres column")
+            mask &= self.genres.mask(spec.get("genres", ()), spec.get("genres_all", ()), spec.get("genres_exclude", ()))
+        for family in TAG_COLUMNS:
+            if family in spec:
+                mask &= self._tags(family).mask(spec[family])
+        return mask
+
+    def _tags(self, family):
+        if family not in self.tags:
+            raise ValueError(f"catalog has no {' / '.join(TAG_COLUMNS[family])} columns")
+        return self.tags[family]
+
+    def bonus(self, boost):
+        """Per-row float32 score offset for a normalized boost spec, or None."""
+        if not boost:
+            return None
+        out = np.zeros(self.size, dtype=np.float32)
+        for family, weights in boost.items():
+            self._tags(family).add_bonus(out, weights)
+        return out
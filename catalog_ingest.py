@@ -0,0 +1,262 @@
+"""Streaming CSV ingest with validation
+
+    python catalog_ingest.py datasets/movies_dataset_500_souj.csv [out.emx] [--report rejects.csv]
+    python catalog_ingest.py datasets/movies_dataset_500_souj.csv --check
+
+Reads the CSV `CHUNK_ROWS` rows at a time and checks every row:
+- all 24 emotion columns present (else the whole file is rejected)
+- each emotion value a number in [0, MAX_VALUE] (blank / NaN rejected)
+- title + year not seen on an earlier row
+Good rows go straight into the .emx sections through `CatalogWriter`
+(catalog_store.py); bad rows are counted by reason and, with `--report`,
+written to a CSV with their row number and reasons. `--check` validates
+without writing, `--strict` writes nothing if any row is bad.
+
+Memory is bounded whatever the file size. Duplicates are found first, by
+an external sort: a pass over the title, year and emotion columns spools the
+title + year hashes of valid rows in sorted runs on disk. The runs are merged
+block-wise into a per-row duplicate map, also on disk. The writing pass then
+streams the file a second time, one chunk at a time.
+"""
+
+import argparse
+import csv
+import os
+import shutil
+import sys
+import tempfile
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from catalog_store import NUMERIC_COLUMNS, CatalogWriter
+from emotion_index import EMOTIONS
+
+CHUNK_ROWS = 50000
+MAX_VALUE = 1.0
+# rejected rows printed to the console (all of them go to --report)
+SHOW_BAD = 10
+# duplicate check: runs merged at once, and entries read per run per step
+# (64 x 16384 x 16 bytes = 16 MB)
+MERGE_FANIN = 64
+MERGE_BLOCK = 16384
+RUN_DTYPE = np.dtype([("key", "<u8"), ("row", "<i8")])
+
+
+class DuplicateFilter:
+    """Duplicate uint64 row keys by external sort: `add` spools each chunk's
+    (key, row) pairs as one sorted run file, `duplicates` merges the runs
+    (`MERGE_FANIN` at a time, `MERGE_BLOCK` entries per run in memory) and
+    marks every row whose key appeared on an earlier row in a bool map on
+    disk. Memory stays bounded whatever the number of rows."""
+
+    def __init__(self):
+        self.dir = tempfile.mkdtemp(prefix="ingest-keys-")
+        self.runs = []
+        self._files = 0
+
+    def _path(self):
+        self._files += 1
+        return os.path.join(self.dir, f"run{self._files}.bin")
+
+    def add(self, keys, rows):
+        if not len(keys):
+            return
+        run = np.empty(len(keys), dtype=RUN_DTYPE)
+        run["key"], run["row"] = keys, rows
+        run.sort(order=["key", "row"])
+        path = self._path()
+        run.tofile(path)
+        self.runs.append(path)
+
+    def _merge(self, paths, emit):
+        """Pass the union of sorted runs to `emit`, in sorted blocks."""
+        runs = [np.memmap(p, dtype=RUN_DTYPE, mode="r") for p in paths]
+        pos = [0] * len(runs)
+        while True:
+            heads = {i: run[pos[i]:pos[i] + MERGE_BLOCK] for i, run in enumerate(runs) if pos[i] < len(run)}
+            if not heads:
+                return
+            # every entry up to the smallest head end is final
+            bound = min((h["key"][-1], h["row"][-1]) for h in heads.values())
+            parts = []
+            for i, h in heads.items():
+                keys = h["key"]
+                lo, hi = np.searchsorted(keys, bound[0], "left"), np.searchsorted(keys, bound[0], "right")
+                n = int(lo + np.searchsorted(h["row"][lo:hi], bound[1], "right"))
+                parts.append(h[:n])
+                pos[i] += n
+            block = np.concatenate(parts)
+            block.sort(order=["key", "row"])
+            emit(block)
+
+    def duplicates(self, n_rows):
+        """Bool per row (memory-mapped): True if an earlier row had its key."""
+        while len(self.runs) > MERGE_FANIN:
+            merged = []
+            for start in range(0, len(self.runs), MERGE_FANIN):
+                group = self.runs[start:start + MERGE_FANIN]
+                path = self._path()
+                with open(path, "wb") as f:
+                    self._merge(group, lambda block: f.write(block.tobytes()))
+                for old in group:
+                    os.remove(old)
+                merged.append(path)
+            self.runs = merged
+        if not n_rows:
+            return np.zeros(0, dtype=bool)
+        dup = np.lib.format.open_memmap(os.path.join(self.dir, "dup.npy"), mode="w+", dtype=bool, shape=(n_rows,))
+        last = []
+
+        def mark(block):
+            keys = block["key"]
+            repeat = np.empty(len(keys), dtype=bool)
+            repeat[0] = bool(last) and keys[0] == last[0]
+            repeat[1:] = keys[1:] == keys[:-1]
+            # sorted by (key, row): all but the first row of a key repeat it
+            dup[block["row"][repeat]] = True
+            last[:] = [keys[-1]]
+
+        self._merge(self.runs, mark)
+        return dup
+
+    def close(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+def row_keys(chunk):
+    """Hash of the lower-cased title and year of each row."""
+    title = chunk["title"].astype(str).str.strip().str.lower()
+    year = pd.to_numeric(chunk["year"], errors="coerce") if "year" in chunk else pd.Series(np.nan, index=chunk.index)
+    return pd.util.hash_pandas_object(pd.DataFrame({"title": title, "year": year}), index=False).to_numpy()
+
+
+def validate_chunk(chunk, emotions=EMOTIONS, max_value=MAX_VALUE):
+    """(n x D float32 emotion values, per row a list of (reason, detail)
+    pairs; [] = good)."""
+    raw = np.empty((len(chunk), len(emotions)), dtype=np.float32)
+    reasons = [[] for _ in range(len(chunk))]
+    for j, e in enumerate(emotions):
+        values = pd.to_numeric(chunk[e], errors="coerce").to_numpy(dtype=np.float64)
+        raw[:, j] = values
+        for i in np.flatnonzero(np.isnan(values)):
+            reasons[i].append((f"{e} missing or not a number",) * 2)
+        for i in np.flatnonzero((values < 0) | (values > max_value)):
+            reasons[i].append((f"{e} outside [0, {max_value:g}]", f"{e}={values[i]:g} outside [0, {max_value:g}]"))
+    return raw, reasons
+
+
+def ingest_csv(csv_path, out_path=None, emotions=EMOTIONS, chunk_rows=CHUNK_ROWS,
+               max_value=MAX_VALUE, report=None, check=False, strict=False):
+    """Validate a catalog CSV and (unless `check`) compile its good rows to
+    .emx. Returns {"rows", "written", "rejected", "reasons", "out"}."""
+    columns = list(pd.read_csv(csv_path, nrows=0).columns)
+    missing = [e for e in emotions if e not in columns]
+    if missing:
+        raise ValueError(f"Missing emotions in catalog: {missing}")
+    meta = [c for c in columns if c not in emotions]
+    numeric = [c for c in NUMERIC_COLUMNS if c in meta]
+    text = [c for c in meta if c not in numeric]
+
+    out_path = None if check else out_path or os.path.splitext(csv_path)[0] + ".emx"
+    # text columns stay strings (no type guessing across chunks)
+    dtypes = {c: str for c in text}
+
+    def chunks(usecols=None):
+        return pd.read_csv(csv_path, chunksize=chunk_rows, usecols=usecols, keep_default_na=False,
+                           dtype={c: t for c, t in dtypes.items() if usecols is None or c in usecols},
+                           na_values={c: [""] for c in [*emotions, *numeric]})
+
+    dup_rows = None
+    if "title" in columns:
+        # first pass: only rows that pass the value checks claim their title + year
+        dups, n_rows = DuplicateFilter(), 0
+        try:
+            for chunk in chunks([*emotions, *(c for c in ("title", "year") if c in columns)]):
+                _, reasons = validate_chunk(chunk, emotions, max_value)
+                valid = np.flatnonzero([not r for r in reasons])
+                dups.add(row_keys(chunk.iloc[valid]), n_rows + valid)
+                n_rows += len(chunk)
+            dup_rows = dups.duplicates(n_rows)
+        finally:
+            # the duplicate map stays readable after its file is removed
+            dups.close()
+    writer = CatalogWriter(out_path, numeric, text, emotions, order=meta) if out_path else None
+    report_file = open(report, "w", newline="", encoding="utf-8") if report else None
+    report_csv = csv.writer(report_file) if report_file else None
+    if report_csv:
+        report_csv.writerow(["row", "title", "year", "reasons"])
+    stats = {"rows": 0, "written": 0, "rejected": 0, "reasons": Counter(), "out": out_path}
+    try:
+        for chunk in chunks():
+            raw, reasons = validate_chunk(chunk, emotions, max_value)
+            valid = np.array([not r for r in reasons], dtype=bool)
+            if dup_rows is not None:
+                dup = np.asarray(dup_rows[stats["rows"]:stats["rows"] + len(chunk)])
+                for i in np.flatnonzero(dup):
+                    reasons[i].append(("duplicate title + year",) * 2)
+                valid &= ~dup
+            for i in np.flatnonzero(~valid):
+                row = stats["rows"] + i + 1
+                stats["reasons"].update(reason for reason, _ in reasons[i])
+                detail = "; ".join(d for _, d in reasons[i])
+                if stats["rejected"] < SHOW_BAD:
+                    print(f"Row {row}: {detail}")
+                stats["rejected"] += 1
+                if report_csv:
+                    report_csv.writerow([row, chunk["title"].iat[i] if "title" in chunk else "",
+                                         chunk["year"].iat[i] if "year" in chunk else "", detail])
+            if writer is not None and valid.any():
+                good = chunk[valid]
+                good = good.assign(**{c: pd.to_numeric(good[c], errors="coerce") for c in numeric})
+                writer.append(raw[valid], good)
+            stats["rows"] += len(chunk)
+            stats["written"] += int(valid.sum()) if writer is not None else 0
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        raise
+    finally:
+        if report_file:
+            report_file.close()
+    if writer is not None:
+        if strict and stats["rejected"]:
+            writer.abort()
+            stats["out"], stats["written"] = None, 0
+        else:
+            writer.close()
+    return stats
+
+
+def validate_csv(csv_path, emotions=EMOTIONS, **kwargs):
+    """Check a catalog CSV without writing anything (see `ingest_csv`)."""
+    return ingest_csv(csv_path, emotions=emotions, check=True, **kwargs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Validate a catalog CSV and compile it to .emx in chunks")
+    parser.add_argument("csv")
+    parser.add_argument("out", nargs="?", help="output .emx (default: next to the CSV)")
+    parser.add_argument("--report", help="write rejected rows and their reasons to this CSV")
+    parser.add_argument("--check", action="store_true", help="validate only")
+    parser.add_argument("--strict", action="store_true", help="write nothing if any row is rejected")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--max-value", type=float, default=MAX_VALUE, help="largest allowed emotion value")
+    args = parser.parse_args(argv)
+    try:
+        stats = ingest_csv(args.csv, args.out, chunk_rows=args.chunk_rows, max_value=args.max_value,
+                           report=args.report, check=args.check, strict=args.strict)
+    except ValueError as e:
+        sys.exit(f"Invalid catalog: {e}")
+    print(f"{stats['rows']} rows, {stats['rejected']} rejected")
+    for reason, count in stats["reasons"].most_common():
+        print(f"  {count:>8}  {reason}")
+    if stats["out"]:
+        print(f"Wrote {stats['out']} ({stats['written']} movies)")
+    if stats["rejected"] and (args.check or args.strict):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
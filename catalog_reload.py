@@ -0,0 +1,150 @@
+"""Hot catalog reload for the server
+
+- `catalog_version(path)`: short id from the file's size and mtime (and its
+  delta log's, so appended deltas count as a change, see catalog_delta.py); stored
+  on the index (`index.version`) and part of every result-cache key
+- `CatalogReloader.reload()` builds a new `EmotionIndex` from the catalog
+  path (re-attaching the cache and rebuilding the ANN index), warms it up,
+  then swaps `server.index` in one assignment. Requests already running keep
+  the index object they started with; new requests see the new one
+- `trigger()` runs a reload on a background thread (calls made while one
+  is running are coalesced into one more pass); `watch()` polls the file
+- with pre-forked workers only the parent reloads; server.serve_prefork
+  shares the new index and replaces the workers with forks of it
+
+A failed build (bad CSV, missing file) leaves the current index serving and
+is reported in /health.
+"""
+
+import hashlib
+import os
+import threading
+import time
+
+# seconds between catalog file checks with --watch
+WATCH_INTERVAL = 2.0
+
+
+def catalog_version(path):
+    """Identifier of the catalog file's current contents (size + mtime)."""
+    st = os.stat(path)
+    key = f"{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}"
+    try:
+        delta = os.stat(f"{path}.delta")
+        key += f":{delta.st_size}:{delta.st_mtime_ns}"
+    except FileNotFoundError:
+        pass
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]
+
+
+class CatalogReloader:
+    """Rebuilds `server.index` from `path` and swaps it in atomically."""
+
+    def __init__(self, server, path):
+        self.server = server
+        self.path = path
+        self.reloads = 0
+        self.last_error = None
+        self.last_reload = None
+        self._lock = threading.Lock()
+        self._running = False
+        self._again = False
+
+    def build(self, old):
+        """New index for the current catalog file, configured like `old`."""
+        from emotion_index import open_index
+        index = open_index(self.path)
+        if old.ann is not None:
+            # a saved ANN file describes the old rows: rebuild with its settings
+            # (a tuned n_probe is tuned again for the new rows)
+            tuned = old.ann.recall_target is not None
+            index.build_ann(n_probe=None if tuned else old.ann.n_probe, recall_target=old.ann.recall_target,
+                            n_iter=old.ann.n_iter, seed=old.ann.seed)
+        if old.quant is not None:
+            index.quantize(old.quant.mode, old.quant.rerank)
+        if old.neighbors is not None and old.neighbors.path:
+            try:
+                index.load_neighbors(old.neighbors.path)
+            except (OSError, ValueError) as e:
+                # stale table: /similar falls back to scoring until it is rebuilt
+                print(f"Neighbour table not reloaded: {e}")
+        # warm up what the first requests would otherwise build
+        index.df
+        if old._filter_index is not None:
+            index.filter_index
+        index.topk([1.0] * len(index.emotions), 1)
+        return index
+
+    def reload(self):
+        """Build and swap synchronously; returns the new status."""
+        old = self.server.index
+        try:
+            index = self.build(old)
+        except Exception as e:
+            self.last_error = f"{type(e).__name__}: {e}"
+            print(f"Catalog reload failed ({self.last_error}); still serving version {old.version}")
+            return self.status()
+        # one shared cache: entries carry the version, so old-index requests
+        # still in flight cannot poison it; clearing just frees the slots
+        index.cache = old.cache
+        self.server.index = index
+        if index.cache is not None:
+            index.cache.clear()
+        self.reloads += 1
+        self.last_error = None
+        self.last_reload = time.strftime("%Y-%m-%dT%H:%M:%S")
+        print(f"Catalog reloaded: version {old.version} -> {index.version} ({len(index)} movies)")
+        return self.status()
+
+    def trigger(self):
+        """Reload on a background thread; coalesces overlapping triggers."""
+        with self._lock:
+            if self._running:
+                self._again = True
+                return
+            self._running = True
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        while True:
+            self.reload()
+            with self._lock:
+                if not self._again:
+                    self._running = False
+                    return
+                self._again = False
+
+    def watch(self, interval=WATCH_INTERVAL, on_change=None):
+        """Poll the catalog file; calls `on_change` (default `trigger`) once
+        a new version has been stable for one interval."""
+        on_change = on_change or self.trigger
+
+        def loop():
+            seen = self.server.index.version
+            candidate = None
+            while True:
+                time.sleep(interval)
+                try:
+                    version = catalog_version(self.path)
+                except OSError:
+                    continue  # mid-replace or removed: keep serving
+                if version == seen:
+                    candidate = None
+                elif version == candidate:
+                    # unchanged for a whole interval: the writer is done
+                    seen = version
+                    on_change()
+                else:
+                    candidate = version
+
+        thread = threading.Thread(target=loop, daemon=True)
+        thread.start()
+        return thread
+
+    def status(self):
+        return {
+            "version": self.server.index.version,
+            "reloads": self.reloads,
+            "last_reload": self.last_reload,
+            "last_error": self.last_error,
+        }
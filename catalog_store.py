@@ -0,0 +1,349 @@
+"""Prebuilt binary catalog (.emx) with memory-mapped loading
+
+Compile once:
+    python catalog_store.py datasets/movies_dataset_500_souj.csv
+    -> datasets/movies_dataset_500_souj.emx
+
+Layout (little-endian):
+- 8-byte magic, uint64 header length, JSON header
+- sections, each 64-byte aligned, described in the header as
+  name -> [offset, dtype, shape]:
+  `unit` (M x D float32, pre-normalized rows), `norms` (float32), `year`,
+  `imdb` (float64, NaN when missing) and, per text column, `<col>.offsets`
+  (int64, M + 1) + `<col>.bytes` (utf-8) as an offsets-based string table;
+  `genres.bits` / `genres.names` hold the packed genre bitsets and
+  `intents.codes` / `clusters.codes` (int16, M x slots) + `.names` the
+  integer-coded intent_* / cluster_* tag columns
+- the header's random `generation` changes on every write; delta logs
+  (catalog_delta.py) record the generation of the base they apply to
+
+`compile_catalog` reads the whole CSV; `CatalogWriter` streams row chunks
+into the same layout (used by catalog_ingest.py for large files).
+
+`open_catalog` maps every section with `np.memmap` (read-only), so startup is
+O(header) and worker processes share the pages through the page cache.
+"""
+
+import json
+import os
+import secrets
+import shutil
+import sys
+import tempfile
+import numpy as np
+
+from emotion_index import EMOTIONS, load_catalog
+
+MAGIC = b"EMXCAT1\0"
+ALIGN = 64
+NUMERIC_COLUMNS = ["year", "imdb"]
+
+
+def _encode_strings(values):
+    """Offsets + concatenated utf-8 bytes for a sequence of strings."""
+    encoded = [("" if v is None or v != v else str(v)).encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+
+def _header(sections, emotions, numeric, strings, order):
+    """Header bytes, data start and end offset for sections given as
+    name -> (dtype, shape, nbytes), laid out in order."""
+    # offsets are relative to the data start so the header can be sized afterwards
+    layout, pos = {}, 0
+    for name, (dtype, shape, nbytes) in sections.items():
+        pos = -(-pos // ALIGN) * ALIGN
+        layout[name] = [pos, np.dtype(dtype).str, list(shape)]
+        pos += nbytes
+    header = {
+        "emotions": list(emotions),
+        "rows": int(sections["unit"][1][0]),
+        "numeric": list(numeric),
+        "strings": list(strings),
+        "columns": list(order or [*strings, *numeric]),
+        "sections": layout,
+        "generation": secrets.token_hex(8),
+    }
+    head = json.dumps(header).encode("utf-8")
+    data_start = -(-(len(MAGIC) + 8 + len(head)) // ALIGN) * ALIGN
+    return head, data_start, layout, data_start + pos
+
+
+def write_catalog(path, unit, norms, columns, strings, emotions=EMOTIONS, extra=None, order=None):
+    """Write arrays to a .emx file.
+
+    `columns` maps numeric column name -> 1-D array, `strings` maps text
+    column name -> list of str, `extra` maps section name -> array for
+    additional sections (e.g. precomputed indexes). `order` is the metadata
+    column order restored by `BinaryCatalog.to_frame`.
+    """
+    sections = {"unit": np.ascontiguousarray(unit, dtype=np.float32),
+                "norms": np.ascontiguousarray(norms, dtype=np.float32)}
+    for name, values in columns.items():
+        sections[name] = np.ascontiguousarray(values, dtype=np.float64)
+    for name, values in strings.items():
+        sections[f"{name}.offsets"], sections[f"{name}.bytes"] = _encode_strings(values)
+    for name, values in (extra or {}).items():
+        sections[name] = np.ascontiguousarray(values)
+    head, data_start, layout, end = _header(
+        {name: (arr.dtype, arr.shape, arr.nbytes) for name, arr in sections.items()},
+        emotions, columns, strings, order)
+
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        f.write(np.uint64(len(head)).tobytes())
+        f.write(head)
+        for name, arr in sections.items():
+            f.seek(data_start + layout[name][0])
+            f.write(arr.tobytes())
+        f.truncate(end)
+    # atomic replace so readers never map a half-written file
+    os.replace(tmp, path)
+
+
+class CatalogWriter:
+    """Writes a .emx file from row chunks with memory bounded by the chunk.
+
+    Every section is spooled to its own temporary file as chunks arrive;
+    `close()` sizes the header and copies the spools into place. The genre
+    bitsets (M / 8 bytes per genre) are the only section built in memory.
+    """
+
+    def __init__(self, path, numeric, text, emotions=EMOTIONS, order=None):
+        self.path = path
+        self.emotions = list(emotions)
+        self.numeric = list(numeric)
+        self.text = list(text)
+        self.order = order
+        self.rows = 0
+        self._dir = tempfile.mkdtemp(prefix=".emx-", dir=os.path.dirname(os.path.abspath(path)))
+        self._spools = {}
+        self._string_bytes = dict.fromkeys(self.text, 0)
+        for name in self.text:
+            # string offsets start at 0; each chunk appends its end offsets
+            self._spool(f"{name}.offsets").write(np.zeros(1, dtype=np.int64).tobytes())
+        self._genres = {}
+        from catalog_filters import tag_columns
+        # tag family -> (its columns, tag -> code as first seen)
+        self._tags = {family: (names, {}) for family, names in tag_columns(self.text).items()}
+
+    def _spool(self, name):
+        if name not in self._spools:
+            self._spools[name] = open(os.path.join(self._dir, name), "wb")
+        return self._spools[name]
+
+    def append(self, raw, frame):
+        """Add rows: `raw` (n x D emotion values) and `frame` with the
+        numeric and text columns of the same rows."""
+        raw = np.asarray(raw, dtype=np.float32)
+        norms = np.linalg.norm(raw, axis=1)
+        norms[norms == 0] = 1.0
+        self._spool("unit").write((raw / norms[:, None]).tobytes())
+        self._spool("norms").write(norms.tobytes())
+        for name in self.numeric:
+            self._spool(name).write(frame[name].to_numpy(dtype=np.float64).tobytes())
+        for name in self.text:
+            offsets, data = _encode_strings(frame[name].tolist())
+            self._spool(f"{name}.offsets").write((offsets[1:] + self._string_bytes[name]).tobytes())
+            self._spool(f"{name}.bytes").write(data.tobytes())
+            self._string_bytes[name] += len(data)
+        if "genres" in self.text:
+            from catalog_filters import split_genres
+            for genre, rows in split_genres(frame["genres"].tolist()).items():
+                g = self._genres.setdefault(genre, len(self._genres))
+                self._spool("genres.rows").write(np.stack([np.full(len(rows), g), rows + self.rows], axis=1).tobytes())
+        if self._tags:
+            from catalog_filters import encode_tags
+            for family, (names, codes) in self._tags.items():
+                self._spool(f"{family}.codes").write(encode_tags([frame[c].tolist() for c in names], codes).tobytes())
+        self.rows += len(raw)
+
+    def _genre_bits(self):
+        """genres.bits for the sorted genre names, as `GenreIndex.from_values`
+        builds them, from the spooled (genre, row) pairs."""
+        names = sorted(self._genres)
+        rank = np.empty(len(names), dtype=np.int64)
+        rank[[self._genres[n] for n in names]] = np.arange(len(names))
+        bits = np.zeros((len(names), -(-self.rows // 64) * 8), dtype=np.uint8)
+        spool = os.path.join(self._dir, "genres.rows")
+        if os.path.exists(spool) and os.path.getsize(spool):
+            pairs = np.memmap(spool, dtype=np.int64, mode="r").reshape(-1, 2)
+            for start in range(0, len(pairs), 1 << 20):
+                g, rows = rank[pairs[start:start + (1 << 20), 0]], pairs[start:start + (1 << 20), 1]
+                np.bitwise_or.at(bits, (g, rows >> 3), (1 << (rows & 7)).astype(np.uint8))
+            del pairs
+        return names, bits.view(np.uint64)
+
+    def close(self):
+        """Finish the file (atomically replacing `path`); returns the path."""
+        for f in self._spools.values():
+            f.close()
+        sizes = {"unit": (np.float32, (self.rows, len(self.emotions))), "norms": (np.float32, (self.rows,))}
+        for name in self.numeric:
+            sizes[name] = (np.float64, (self.rows,))
+        for name in self.text:
+            sizes[f"{name}.offsets"] = (np.int64, (self.rows + 1,))
+            sizes[f"{name}.bytes"] = (np.uint8, (self._string_bytes[name],))
+        sections = {name: (dtype, shape, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+                    for name, (dtype, shape) in sizes.items()}
+        # same order as compile_frame: name tables, genre bitsets, tag codes
+        strings, names, bits = list(self.text), {}, {}
+        if "genres" in self.text:
+            genres, bits["genres.bits"] = self._genre_bits()
+            names["genres.names"] = genres
+        for family, (_, codes) in self._tags.items():
+            names[f"{family}.names"] = list(codes)
+        extra = {}
+        for name, values in names.items():
+            strings.append(name)
+            extra[f"{name}.offsets"], extra[f"{name}.bytes"] = _encode_strings(values)
+        extra.update(bits)
+        sections.update({name: (arr.dtype, arr.shape, arr.nbytes) for name, arr in extra.items()})
+        for family, (columns, _) in self._tags.items():
+            sections[f"{family}.codes"] = (np.int16, (self.rows, len(columns)), self.rows * len(columns) * 2)
+        head, data_start, layout, end = _header(sections, self.emotions, self.numeric, strings,
+                                                self.order or [*self.text, *self.numeric])
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "wb") as out:
+            out.write(MAGIC)
+            out.write(np.uint64(len(head)).tobytes())
+            out.write(head)
+            for name in sections:
+                out.seek(data_start + layout[name][0])
+                if name in extra:
+                    out.write(extra[name].tobytes())
+                elif name in self._spools:
+                    with open(os.path.join(self._dir, name), "rb") as f:
+                        shutil.copyfileobj(f, out, 1 << 20)
+            out.truncate(end)
+        # atomic replace so readers never map a half-written file
+        os.replace(tmp, self.path)
+        shutil.rmtree(self._dir, ignore_errors=True)
+        return self.path
+
+    def abort(self):
+        for f in self._spools.values():
+            f.close()
+        shutil.rmtree(self._dir, ignore_errors=True)
+
+
+def compile_catalog(csv_path, out_path=None, emotions=EMOTIONS):
+    """Compile a catalog CSV into a .emx artifact; returns the output path."""
+    out_path = out_path or os.path.splitext(csv_path)[0] + ".emx"
+    return compile_frame(load_catalog(csv_path), out_path, emotions)
+
+
+def compile_frame(df, out_path, emotions=EMOTIONS):
+    """Write a catalog DataFrame (metadata + emotion columns) as .emx."""
+    missing = [e for e in emotions if e not in df.columns]
+    if missing:
+        raise ValueError(f"Missing emotions in catalog: {missing}")
+    matrix = df[emotions].fillna(0).to_numpy(dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1)
+    norms[norms == 0] = 1.0
+    columns = {c: df[c].to_numpy(dtype=np.float64) for c in NUMERIC_COLUMNS if c in df.columns}
+    text = [c for c in df.columns if c not in emotions and c not in columns]
+    strings = {c: df[c].tolist() for c in text}
+    order = [c for c in df.columns if c not in emotions]
+    extra = {}
+    if "genres" in df.columns:
+        # genre inverted index as packed bitsets (see catalog_filters.py)
+        from catalog_filters import GenreIndex
+        genres = GenreIndex.from_values(df["genres"].tolist())
+        strings["genres.names"] = sorted(genres.names, key=genres.names.get)
+        extra["genres.bits"] = genres.bits
+    from catalog_filters import encode_tags, tag_columns
+    for family, names in tag_columns(df.columns).items():
+        # intent / cluster tags as int16 codes (see catalog_filters.TagIndex)
+        codes = {}
+        extra[f"{family}.codes"] = encode_tags([df[c].tolist() for c in names], codes)
+        strings[f"{family}.names"] = list(codes)
+    write_catalog(out_path, matrix / norms[:, None], norms, columns, strings, emotions, extra, order)
+    return out_path
+
+
+class StringColumn:
+    """Read-only view of an offsets-based string table."""
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return bytes(self.data[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+    def tolist(self):
+        raw = bytes(self.data)
+        offs = self.offsets.tolist()
+        return [raw[a:b].decode("utf-8") for a, b in zip(offs[:-1], offs[1:])]
+
+
+class BinaryCatalog:
+    """Memory-mapped .emx catalog. Arrays are read-only views into the file."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"Not an .emx catalog: {path}")
+            head_len = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+            self.header = json.loads(f.read(head_len).decode("utf-8"))
+        data_start = -(-(len(MAGIC) + 8 + head_len) // ALIGN) * ALIGN
+        self.emotions = self.header["emotions"]
+        self.sections = {}
+        for name, (offset, dtype, shape) in self.header["sections"].items():
+            if int(np.prod(shape)) == 0:
+                self.sections[name] = np.zeros(shape, dtype=dtype)
+            else:
+                self.sections[name] = np.memmap(path, dtype=dtype, mode="r",
+                                                offset=data_start + offset, shape=tuple(shape))
+
+    def __len__(self):
+        return self.header["rows"]
+
+    def __getitem__(self, name):
+        return self.sections[name]
+
+    def __contains__(self, name):
+        return name in self.sections
+
+    @property
+    def unit(self):
+        return self.sections["unit"]
+
+    @property
+    def norms(self):
+        return self.sections["norms"]
+
+    def column(self, name):
+        """Numeric column as an array, or a text column as a `StringColumn`."""
+        if name in self.header["strings"]:
+            return StringColumn(self.sections[f"{name}.offsets"], self.sections[f"{name}.bytes"])
+        return self.sections[name]
+
+    def to_frame(self):
+        """Materialize the metadata (no emotion columns) as a DataFrame."""
+        import pandas as pd
+        data = {}
+        for name in self.header["columns"]:
+            if name in self.header["strings"]:
+                data[name] = self.column(name).tolist()
+            else:
+                data[name] = np.asarray(self.sections[name], dtype=float)
+        return pd.DataFrame(data)
+
+
+def open_catalog(path):
+    return BinaryCatalog(path)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit("Usage: python catalog_store.py <catalog.csv> [out.emx]")
+    out = compile_catalog(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
+    print(f"Wrote {out} ({len(open_catalog(out))} movies)")
@@ -0,0 +1,624 @@
+"""Headless emotion scoring engine
+
+- Loads a movie catalog once and owns the (normalized) float32 emotion matrix
+- `topk` scores a single user vector, `topk_batch` scores a matrix of them;
+  `session` keeps one user's scores live under slider moves (score_session.py)
+- `group` computes per-user Top-k, group Top-k (mean vector), pairwise cosine
+  similarity, consensus coefficient and user -> group similarity; consensus
+  comes from running sums (group_stats.py), so large audiences stay O(n*d)
+  and `group_stream` takes participants in chunks; least-misery, Borda and
+  the other score aggregates share one user x movie GEMM pass
+- `quantize` keeps an int8 copy of the matrix for the scan and re-ranks its
+  best candidates in full precision (quant_index.py)
+- `build_neighbors` / `load_neighbors` attach a precomputed "more like this"
+  table (neighbor_table.py)
+- `filters` restrict and `boost` re-weights queries by year / IMDB / genre
+  and the intent / cluster tag columns (catalog_filters.py)
+- `apply_delta` adds, updates and tombstones movies in place (catalog_delta.py);
+  `open_index` replays the catalog's delta log
+
+No GUI imports: the Tk apps, the test_codes scripts and any server worker
+are thin clients of `EmotionIndex`.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+
+from group_stats import STRATEGIES, GroupAccumulator, ScoreAggregator
+
+EMOTIONS = [
+    "joy","sadness","fear","anger","disgust","surprise","trust",
+    "anticipation","curiosity","excitement","hope","love","guilt",
+    "shame","gratitude","loneliness","confidence","determination",
+    "regret","relief","nostalgia","compassion","anxiety","inspiration",
+]
+
+DEFAULT_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "datasets", "movies_dataset_500_souj.csv")
+
+# filtered queries whose candidates are at most this fraction of the catalog
+# gather and score only the candidates; above it, score everything and mask
+FILTER_FIRST_MAX = 0.3
+
+# upper bound on the number of scores materialized at once by `topk_batch`
+# (2**24 float32 = 64 MB); larger user batches are scored in row chunks
+SCORE_BLOCK = 1 << 24
+
+# `group` only builds the n x n pairwise matrix up to this many users
+PAIRWISE_MAX = 64
+
+
+def topk_rows(sim, k):
+    """Top-k column indices and values per row of a 2-D score array, best first.
+
+    Uses `np.argpartition` to select the k best in O(M) and only sorts those k,
+    instead of a full O(M log M) argsort per row.
+    """
+    n, m = sim.shape
+    k = min(k, m)
+    if k < m:
+        part = np.argpartition(-sim, k - 1, axis=1)[:, :k]
+    else:
+        part = np.broadcast_to(np.arange(m), (n, m))
+    part_sim = np.take_along_axis(sim, part, axis=1)
+    order = np.argsort(-part_sim, axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_sim, order, axis=1)
+
+
+def _to_shared(arr):
+    """Copy `arr` into a new shared memory block; returns (block, view)."""
+    from multiprocessing import shared_memory
+    block = shared_memory.SharedMemory(create=True, size=max(1, arr.nbytes))
+    view = np.ndarray(arr.shape, dtype=arr.dtype, buffer=block.buf)
+    view[...] = arr
+    return block, view
+
+
+def _spill(arr):
+    """Read-only memory map of a copy of `arr` in an anonymous temporary
+    file: the rows stay readable but no longer count as process memory."""
+    import tempfile
+    with tempfile.TemporaryFile(prefix="emx-") as f:
+        np.ascontiguousarray(arr).tofile(f)
+        f.flush()
+        # the map keeps its own reference to the (already unlinked) file
+        return np.memmap(f, dtype=arr.dtype, mode="r", shape=arr.shape)
+
+
+def load_catalog(path):
+    """Read a catalog CSV and coerce the numeric metadata columns."""
+    df = pd.read_csv(path)
+    for col in ["year", "imdb"]:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+    return df
+
+
+def open_index(path=DEFAULT_CSV, **kwargs):
+    """EmotionIndex from a compiled .emx catalog or a CSV, by extension,
+    with the catalog's delta log (if any) applied."""
+    from catalog_delta import read_delta
+    from catalog_reload import catalog_version
+    version = catalog_version(path)
+    if path.endswith(".emx"):
+        index = EmotionIndex.from_binary(path)
+    else:
+        index = EmotionIndex.from_csv(path, **kwargs)
+    index.apply_delta(read_delta(path))
+    index.version = version
+    return index
+
+
+class EmotionIndex:
+    """Catalog + emotion matrix with top-k and group scoring.
+
+    With `normalize=True` (default) movie rows are unit vectors and scores are
+    cosine similarities. With `normalize=False` the raw matrix is kept and
+    scores are plain dot products (the behaviour of the CLI engines).
+    """
+
+    def __init__(self, df, emotions=EMOTIONS, normalize=True):
+        missing = [e for e in emotions if e not in df.columns]
+        if missing:
+            raise ValueError(f"Missing emotions in catalog: {missing}")
+        self._df = df.reset_index(drop=True)
+        self.catalog = None
+        self.emotions = list(emotions)
+        self.normalize = normalize
+
+        matrix = self._df[self.emotions].fillna(0).to_numpy(dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1)
+        norms[norms == 0] = 1.0
+        self.norms = norms
+        # movie unit vectors for cosine similarity (or the raw rows for dot scoring)
+        self.movie_unit = matrix / norms[:, None] if normalize else matrix
+        self._init_state()
+
+    def _init_state(self):
+        """Optional structures and lazy caches, shared by every constructor."""
+        # optional approximate index (see ann_index.py); None means exact scans
+        self.ann = None
+        # optional reduced-precision scan copy (see quant_index.py)
+        self.quant = None
+        # optional precomputed movie -> movie neighbours (see neighbor_table.py)
+        self.neighbors = None
+        # optional top-k result cache (see result_cache.py); keys include the
+        # catalog version so a cache shared across reloads never serves stale rows
+        self.cache = None
+        self.version = None
+        # metadata filter indexes, built on first filtered query
+        self._filter_index = None
+        # lower-cased title -> row ids, built on first title lookup
+        self._titles = None
+        # column-major matrix and per-column bounds for score_session.py
+        self._columns = None
+        self._column_bounds = None
+        # tombstones of deleted movies (bool per row) and the spare-capacity
+        # matrix buffers behind appended rows; see catalog_delta.py
+        self.deleted = None
+        self._unit_buffer = None
+        self._norms_buffer = None
+
+    @classmethod
+    def from_csv(cls, path=DEFAULT_CSV, **kwargs):
+        return cls(load_catalog(path), **kwargs)
+
+    @classmethod
+    def from_binary(cls, path):
+        """Zero-copy load of a compiled .emx catalog (see catalog_store.py).
+
+        The movie matrix and norms stay memory-mapped; the metadata
+        DataFrame is only built if `df` is accessed.
+        """
+        from catalog_store import open_catalog
+        catalog = open_catalog(path)
+        index = cls.__new__(cls)
+        index._df = None
+        index.catalog = catalog
+        index.emotions = list(catalog.emotions)
+        index.normalize = True
+        index.norms = catalog.norms
+        index.movie_unit = catalog.unit
+        index._init_state()
+        return index
+
+    @property
+    def df(self):
+        if self._df is None:
+            self._df = self.catalog.to_frame()
+        return self._df
+
+    def __len__(self):
+        return len(self.movie_unit)
+
+    @property
+    def filter_index(self):
+        if self._filter_index is None:
+            from catalog_filters import FilterIndex
+            self._filter_index = FilterIndex.from_index(self)
+        return self._filter_index
+
+    @property
+    def columns(self):
+        """Emotion-major (len(emotions) x M) copy of the movie matrix, so one
+        emotion's column is contiguous (built on first use)."""
+        if self._columns is None:
+            self._columns = np.ascontiguousarray(self.movie_unit.T)
+        return self._columns
+
+    @property
+    def column_bounds(self):
+        """(min, max) of each emotion column."""
+        if self._column_bounds is None:
+            self._column_bounds = (self.columns.min(axis=1), self.columns.max(axis=1))
+        return self._column_bounds
+
+    def filter_mask(self, filters):
+        """Boolean row mask for a filter spec (see catalog_filters.py), or None."""
+        from catalog_filters import normalize_spec
+        return self.filter_index.mask(normalize_spec(filters))
+
+    def _query_mask(self, filters):
+        """Rows a query may return: the filter mask without deleted movies
+        (None when every row qualifies)."""
+        mask = self.filter_mask(filters) if filters else None
+        if self.deleted is None or not self.deleted.any():
+            return mask
+        return ~self.deleted if mask is None else mask & ~self.deleted
+
+    def apply_delta(self, records):
+        """Apply add / update / delete records in place (see catalog_delta.py)."""
+        from catalog_delta import apply_records
+        return apply_records(self, records)
+
+    def share_memory(self):
+        """Move the movie matrix (and ANN vectors) into shared memory.
+
+        Call before forking worker processes so they all read one copy.
+        Matrices that are already memory-mapped from a .emx file are shared
+        through the page cache and left alone. Returns the created
+        `SharedMemory` blocks; the owner must `close()` and `unlink()` them.
+        """
+        blocks = []
+        if not isinstance(self.movie_unit, np.memmap):
+            block, self.movie_unit = _to_shared(self.movie_unit)
+            blocks.append(block)
+            # the private delta spare-capacity copy is not needed any more
+            self._unit_buffer = self._norms_buffer = None
+        if self.ann is not None:
+            block, self.ann.vectors = _to_shared(self.ann.vectors)
+            blocks.append(block)
+        if self.quant is not None:
+            if self.quant.mode == "float32":
+                self.quant.data = self.movie_unit
+            else:
+                block, self.quant.data = _to_shared(self.quant.data)
+                blocks.append(block)
+        return blocks
+
+    def enable_cache(self, max_entries=4096, step=1e-3):
+        """Cache `topk` results keyed on the quantized user vector."""
+        from result_cache import ResultCache
+        self.cache = ResultCache(max_entries, step) if max_entries > 0 else None
+        return self.cache
+
+    def build_ann(self, **kwargs):
+        """Build an IVF index over the movie matrix (kwargs go to `IVFIndex`)."""
+        from ann_index import IVFIndex
+        self.ann = IVFIndex(**kwargs).build(self.movie_unit)
+        if self.cache is not None:
+            self.cache.clear()
+        return self.ann
+
+    def load_ann(self, path):
+        from ann_index import IVFIndex
+        self.ann = IVFIndex.load(path, self.movie_unit)
+        if self.cache is not None:
+            self.cache.clear()
+        return self.ann
+
+    def quantize(self, mode="int8", rerank=None):
+        """Scan a float32 / int8 copy of the movie matrix in `topk` and
+        `topk_batch` (unless `exact`); the best k * `rerank` rows are
+        re-scored in full precision (0: rank by the quantized scores).
+
+        With int8 a matrix held in RAM (CSV catalogs) moves to a temporary
+        file mapping, so only the int8 copy stays resident; a .emx matrix is
+        already mapped.
+        """
+        from quant_index import RERANK, QuantizedMatrix
+        self.quant = QuantizedMatrix(mode, RERANK if rerank is None else rerank).build(self.movie_unit)
+        if mode != "float32" and not isinstance(self.movie_unit, np.memmap):
+            self.movie_unit = _spill(self.movie_unit)
+            # the delta spare-capacity buffer held the same rows
+            self._unit_buffer = self._norms_buffer = None
+        if self.cache is not None:
+            self.cache.clear()
+        return self.quant
+
+    def build_neighbors(self, k=20, workers=None):
+        """Precompute every movie's top-k most similar movies (cosine, deleted
+        movies left out) as a `NeighborTable`; see neighbor_table.py."""
+        from neighbor_table import build_neighbors
+        unit = self.movie_unit if self.normalize else self.movie_unit / self.norms[:, None]
+        self.neighbors = build_neighbors(unit, k, workers, self.deleted)
+        self.neighbors.version = self.version
+        return self.neighbors
+
+    def load_neighbors(self, path):
+        """Attach a saved table; ValueError if it was built for another
+        catalog version (e.g. before a delta was applied)."""
+        from neighbor_table import NeighborTable
+        self.neighbors = NeighborTable.load(path, len(self), self.version)
+        return self.neighbors
+
+    def find_title(self, title):
+        """Row ids of the (not deleted) movies with this title, ignoring case."""
+        if self._titles is None:
+            titles = {}
+            for i, t in enumerate(self.df["title"].tolist()):
+                if isinstance(t, str):
+                    titles.setdefault(t.lower(), []).append(i)
+            self._titles = {t: np.array(rows, dtype=np.int64) for t, rows in titles.items()}
+        rows = self._titles.get(str(title).lower(), np.empty(0, dtype=np.int64))
+        if self.deleted is not None:
+            rows = rows[~self.deleted[rows]]
+        return rows
+
+    def _prepare(self, user_vec):
+        vec = np.asarray(user_vec, dtype=np.float32)
+        if vec.shape != (len(self.emotions),):
+            raise ValueError(f"User vector must have {len(self.emotions)} values, got shape {vec.shape}")
+        if not self.normalize:
+            return vec
+        norm = np.linalg.norm(vec)
+        if norm == 0:
+            raise ValueError("User vector is zero")
+        return vec / norm
+
+    def _prepare_batch(self, user_matrix):
+        U = np.asarray(user_matrix, dtype=np.float32)
+        if U.ndim != 2 or U.shape[1] != len(self.emotions):
+            raise ValueError(f"User matrix must be N x {len(self.emotions)}, got shape {U.shape}")
+        if not self.normalize:
+            return U
+        norms = np.linalg.norm(U, axis=1)
+        zero = np.flatnonzero(norms == 0)
+        if zero.size:
+            raise ValueError(f"User vector {int(zero[0]) + 1} is zero")
+        return U / norms[:, None]
+
+    def scores(self, user_vec, candidates=None):
+        """Similarity of every movie (or only `candidates`) to `user_vec`."""
+        matrix = self.movie_unit if candidates is None else self.movie_unit[candidates]
+        return matrix.dot(self._prepare(user_vec))
+
+    def tag_bonus(self, boost):
+        """Per-row score offset for an intent / cluster boost spec (see
+        catalog_filters.py), or None."""
+        from catalog_filters import normalize_boost
+        return self.filter_index.bonus(normalize_boost(boost))
+
+    def topk(self, user_vec, k=3, candidates=None, exact=False, filters=None, boost=None):
+        """Return (movie indices, scores) of the best `k` matches, best first.
+
+        `candidates` optionally restricts scoring to a subset of row indices;
+        `filters` is a year/IMDB/genre/tag spec and `boost` adds per-tag
+        bonuses to the scores (see catalog_filters.py).
+        Uses the ANN index (or else the quantized matrix) when one is
+        attached, unless `exact` is set or the query is boosted.
+        Results without explicit candidates are served from the cache when
+        one is enabled; cached arrays are read-only. Fewer than `k` results
+        are returned when fewer movies pass the filters.
+        """
+        from catalog_filters import normalize_boost, normalize_spec, spec_key
+        vec = self._prepare(user_vec)
+        filters = normalize_spec(filters)
+        boost = normalize_boost(boost)
+        key = None
+        if self.cache is not None and candidates is None:
+            key = self.cache.key(vec, k, exact, spec_key(filters), self.version)
+            if boost:
+                key += (spec_key(boost),)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        mask = self._query_mask(filters)
+        if candidates is not None and mask is not None:
+            # filters and deletions narrow explicit candidates
+            candidates = np.asarray(candidates)
+            candidates = candidates[mask[candidates]]
+        if boost:
+            order, top = self._topk_boosted(vec, k, mask, candidates, self.filter_index.bonus(boost))
+        elif mask is not None and candidates is None:
+            order, top = self._topk_masked(vec, k, mask, exact)
+        elif self.ann is not None and candidates is None and not exact:
+            order, top = self.ann.search(vec[None, :], k)
+            order, top = order[0], top[0]
+        elif self.quant is not None and candidates is None and not exact:
+            order, top = self.quant.search(vec[None, :], k, self.movie_unit)
+            order, top = order[0], top[0]
+        else:
+            matrix = self.movie_unit if candidates is None else self.movie_unit[candidates]
+            order, top = topk_rows(matrix.dot(vec)[None, :], k)
+            order, top = order[0], top[0]
+            if candidates is not None:
+                order = np.asarray(candidates)[order]
+
+        if key is not None:
+            order.setflags(write=False)
+            top.setflags(write=False)
+            self.cache.put(key, (order, top))
+        return order, top
+
+    def _topk_boosted(self, vec, k, mask, candidates, bonus):
+        """Exact top-k of score + `bonus` over `candidates` and `mask`."""
+        if candidates is not None:
+            candidates = np.asarray(candidates)
+            if mask is not None:
+                candidates = candidates[mask[candidates]]
+        elif mask is not None and mask.mean() <= FILTER_FIRST_MAX:
+            candidates = np.flatnonzero(mask)
+        if candidates is not None:
+            if candidates.size == 0:
+                return candidates, np.empty(0, dtype=np.float32)
+            sim = self.movie_unit[candidates].dot(vec) + bonus[candidates]
+            order, top = topk_rows(sim[None, :], k)
+            return candidates[order[0]], top[0]
+        sim = self.movie_unit.dot(vec) + bonus
+        if mask is not None:
+            sim[~mask] = -np.inf
+        order, top = topk_rows(sim[None, :], min(k, len(self) if mask is None else int(mask.sum())))
+        return order[0], top[0]
+
+    def _topk_masked(self, vec, k, mask, exact):
+        """Top-k over the rows in `mask`, choosing the cheaper strategy.
+
+        Selective filters gather and score only the candidate rows. Broad
+        filters score first: through the ANN index with enough headroom that
+        k survive the mask, or over the whole contiguous matrix with the
+        rejected rows masked out.
+        """
+        candidates = np.flatnonzero(mask)
+        if candidates.size == 0:
+            return candidates, np.empty(0, dtype=np.float32)
+        selectivity = candidates.size / len(self)
+        if selectivity <= FILTER_FIRST_MAX:
+            order, top = topk_rows(self.movie_unit[candidates].dot(vec)[None, :], k)
+            return candidates[order[0]], top[0]
+        if self.ann is not None and not exact:
+            order, top = self.ann.search(vec[None, :], int(np.ceil(2 * k / selectivity)))
+            keep = mask[order[0]]
+            if keep.sum() >= min(k, candidates.size):
+                return order[0][keep][:k], top[0][keep][:k]
+        if self.quant is not None and not exact:
+            order, top = self.quant.search(vec[None, :], k, self.movie_unit, mask)
+            return order[0], top[0]
+        sim = self.movie_unit.dot(vec)
+        sim[~mask] = -np.inf
+        order, top = topk_rows(sim[None, :], min(k, candidates.size))
+        return order[0], top[0]
+
+    def topk_batch(self, user_matrix, k=3, exact=False, filters=None, boost=None):
+        """Top-k for every row of an N x len(emotions) user matrix.
+
+        One GEMM against the movie matrix per chunk of users (chunks keep the
+        N x M score block under `SCORE_BLOCK` entries), then a partial sort.
+        With selective `filters` the candidate rows are gathered once and
+        shared by the whole batch; broad ones (and deletions) score the whole
+        matrix and mask the rejected rows. A `boost` spec adds its per-row
+        bonus to every score block (exact scoring). Returns (indices, scores),
+        both N x k (k capped at the number of candidates), best first per row.
+        """
+        U = self._prepare_batch(user_matrix)
+        mask = self._query_mask(filters)
+        bonus = self.tag_bonus(boost) if boost else None
+        if bonus is not None:
+            exact = True
+        if mask is None and self.ann is not None and not exact:
+            return self.ann.search(U, k)
+        rows = None
+        n_rows = len(self) if mask is None else int(mask.sum())
+        if mask is not None and n_rows <= FILTER_FIRST_MAX * len(self):
+            rows, mask = np.flatnonzero(mask), None
+        matrix = self.movie_unit if rows is None else self.movie_unit[rows]
+        if bonus is not None and rows is not None:
+            bonus = bonus[rows]
+        k = min(k, n_rows)
+        out_idx = np.empty((len(U), k), dtype=np.intp)
+        out_sim = np.empty((len(U), k), dtype=np.float32)
+        if k == 0:
+            return out_idx, out_sim
+        step = max(1, SCORE_BLOCK // len(matrix))
+        for start in range(0, len(U), step):
+            if rows is None and self.quant is not None and not exact:
+                out_idx[start:start + step], out_sim[start:start + step] = \
+                    self.quant.search(U[start:start + step], k, self.movie_unit, mask)
+                continue
+            sim = U[start:start + step] @ matrix.T
+            if bonus is not None:
+                sim += bonus
+            if mask is not None:
+                sim[:, ~mask] = -np.inf
+            out_idx[start:start + step], out_sim[start:start + step] = topk_rows(sim, k)
+        if rows is not None:
+            out_idx = rows[out_idx]
+        return out_idx, out_sim
+
+    def session(self, user_vec, k=3, **kwargs):
+        """Incremental `ScoreSession` for a user vector (see score_session.py)."""
+        from score_session import ScoreSession
+        return ScoreSession(self, user_vec, k, **kwargs)
+
+    def _aggregate_scores(self, U, agg, k=None):
+        """Fold the exact scores of prepared user rows `U` into the
+        `ScoreAggregator` one SCORE_BLOCK chunk at a time; with `k`, also
+        returns the per-user Top-k taken from the same score blocks."""
+        step = max(1, SCORE_BLOCK // len(self.movie_unit))
+        live = self.deleted is not None and self.deleted.any()
+        n_live = len(self) - int(self.deleted.sum()) if live else len(self)
+        k = None if k is None else min(k, n_live)
+        out_idx = out_sim = None
+        if k is not None:
+            out_idx = np.empty((len(U), k), dtype=np.intp)
+            out_sim = np.empty((len(U), k), dtype=np.float32)
+        for start in range(0, len(U), step):
+            sim = U[start:start + step] @ self.movie_unit.T
+            agg.add(sim)
+            if k is not None:
+                if live:
+                    sim[:, self.deleted] = -np.inf
+                out_idx[start:start + step], out_sim[start:start + step] = topk_rows(sim, k)
+        return out_idx, out_sim
+
+    def group(self, users, k=3, per_user=True, pairwise=None, strategy="mean"):
+        """Group recommendation for N users given as scaled (0-1) vectors.
+
+        The group vector is the mean of the raw scaled vectors so that
+        intensity is preserved; similarities use unit vectors. Consensus and
+        user -> group similarity are O(n*d); the n x n `pairwise` matrix is
+        only built when asked for (default: n <= PAIRWISE_MAX) and the
+        per-user Top-k can be skipped for large audiences (None in the result).
+        `strategy` picks how the group Top-k is ranked (see group_stats.py);
+        non-"mean" strategies reuse the per-user score blocks.
+        """
+        if strategy not in STRATEGIES:
+            raise ValueError(f"unknown group strategy {strategy!r} (choose from {', '.join(STRATEGIES)})")
+        raw = np.asarray(users, dtype=np.float32)
+        U = self._prepare_batch(raw)
+        n = len(U)
+        acc = GroupAccumulator(len(self.emotions))
+        acc.add(raw, U)
+
+        if strategy == "mean":
+            result = self.group_result(acc, k)
+            # per-user Top-k in one batched pass
+            per_user_top = self.topk_batch(U, k) if per_user else (None, None)
+        else:
+            agg = ScoreAggregator(len(self), [strategy], self.deleted)
+            per_user_top = self._aggregate_scores(U, agg, k if per_user else None)
+            result = self.group_result(acc, k, agg, strategy)
+        result["per_user_idx"], result["per_user_sim"] = per_user_top
+        result["user_to_group"] = acc.user_to_group(U)
+        if pairwise is None:
+            pairwise = n <= PAIRWISE_MAX
+        # pairwise cosine similarities between users (dot of unit vectors)
+        result["pairwise"] = U.dot(U.T) if pairwise else None
+        return result
+
+    def group_strategies(self, users, k=3, strategies=STRATEGIES):
+        """Group Top-k under several strategies from a single scoring pass.
+
+        Returns {strategy: (movie indices, scores)}.
+        """
+        raw = np.asarray(users, dtype=np.float32)
+        U = self._prepare_batch(raw)
+        acc = GroupAccumulator(len(self.emotions))
+        acc.add(raw, U)
+        agg = ScoreAggregator(len(self), [s for s in strategies if s != "mean"], self.deleted)
+        if agg.strategies:
+            self._aggregate_scores(U, agg)
+        out = {}
+        for strategy in strategies:
+            result = self.group_result(acc, k, agg, strategy)
+            out[strategy] = (result["group_idx"], result["group_sim"])
+        return out
+
+    def group_stream(self, chunks, k=3, strategy="mean"):
+        """Group Top-k and consensus for participants arriving in chunks.
+
+        `chunks` is any iterable of (n_i x 24) scaled vectors, e.g. rows read
+        from a file; only O(d) state (plus O(M) aggregates for non-"mean"
+        strategies) is kept between chunks.
+        """
+        if strategy not in STRATEGIES:
+            raise ValueError(f"unknown group strategy {strategy!r} (choose from {', '.join(STRATEGIES)})")
+        acc = GroupAccumulator(len(self.emotions))
+        agg = ScoreAggregator(len(self), [strategy], self.deleted) if strategy != "mean" else None
+        for chunk in chunks:
+            raw = np.atleast_2d(np.asarray(chunk, dtype=np.float32))
+            U = self._prepare_batch(raw)
+            acc.add(raw, U)
+            if agg is not None:
+                self._aggregate_scores(U, agg)
+        return self.group_result(acc, k, agg, strategy)
+
+    def group_result(self, acc, k=3, agg=None, strategy="mean"):
+        """Group Top-k, consensus and mean user -> group similarity of a
+        `GroupAccumulator` (and of a `ScoreAggregator` for non-"mean"
+        strategies)."""
+        if strategy == "mean":
+            group_idx, group_sim = self.topk(acc.group_unit(), k)
+        else:
+            scores = agg.result(strategy)
+            order, top = topk_rows(scores[None, :], min(k, int(np.isfinite(scores).sum())))
+            group_idx, group_sim = order[0], top[0]
+        return {
+            "users": len(acc),
+            "strategy": strategy,
+            "group_idx": group_idx,
+            "group_sim": group_sim,
+            "consensus": acc.consensus,
+            "mean_user_to_group": acc.mean_user_to_group(),
+        }
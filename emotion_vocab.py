@@ -0,0 +1,172 @@
+"""Intent / cluster / alias vocabulary compiled to a projection matrix
+
+- `INTENT_MAP`, `CLUSTER_MAP` and `EMOTION_ALIASES` are the friendly terms
+  of the recommender scripts, each a weighted mix of the 24 emotions
+- `Vocabulary` compiles them once into a (terms x emotions) float32 matrix
+  whose rows are the terms' emotion weights (raw emotions are identity rows)
+- a user's mix of terms is a sparse row of term weights, so its emotion
+  vector is that row times the matrix; `vectors` does it for thousands of
+  mixes with one product
+- mixes are "adrenaline + engagement", "comfort, suspense=0.6", a
+  {term: weight} dict or a list of terms / (term, weight) pairs; repeated
+  terms add up
+
+A bare name resolves to an intent first, then a cluster, an alias and an
+emotion ("inspiration" is both an intent and an emotion); "intent:",
+"cluster:", "alias:" or "emotion:" picks one explicitly.
+"""
+
+import math
+import re
+
+import numpy as np
+
+from emotion_index import EMOTIONS
+
+EMOTION_ALIASES = {
+    "suspense": {"anticipation": 0.6, "anxiety": 0.4},
+    "pride": {"confidence": 1.0},
+    "acceptance": {"relief": 0.6, "trust": 0.4},
+    "despair": {"sadness": 0.6, "loneliness": 0.4},
+    "hatred": {"anger": 1.0},
+    "shock": {"surprise": 1.0},
+}
+
+INTENT_MAP = {
+    "adrenaline": {"fear": 0.4, "excitement": 0.4, "anger": 0.2},
+    "comfort": {"joy": 0.4, "love": 0.3, "relief": 0.3},
+    "catharsis": {"sadness": 0.4, "regret": 0.3, "hope": 0.3},
+    "fun": {"joy": 0.5, "surprise": 0.3, "excitement": 0.2},
+    "contemplation": {"curiosity": 0.4, "sadness": 0.3, "hope": 0.3},
+    "inspiration": {"hope": 0.4, "confidence": 0.3, "determination": 0.3},
+}
+
+CLUSTER_MAP = {
+    "dark_intensity": {"fear": 0.35, "anger": 0.30, "anxiety": 0.20, "disgust": 0.15},
+    "emotional_pain": {"sadness": 0.40, "loneliness": 0.25, "regret": 0.20, "guilt": 0.15},
+    "positive_energy": {"joy": 0.40, "love": 0.30, "gratitude": 0.20, "relief": 0.10},
+    "engagement": {"curiosity": 0.35, "anticipation": 0.30, "surprise": 0.20, "excitement": 0.15},
+    "meaning_growth": {"hope": 0.35, "confidence": 0.25, "determination": 0.25, "inspiration": 0.15},
+}
+
+# "a + b, c=0.5": terms are separated by "+" or ","
+_SPLIT = re.compile(r"[+,]")
+
+
+class Vocabulary:
+    """Friendly terms compiled to a (terms x emotions) projection matrix."""
+
+    def __init__(self, emotions=EMOTIONS, intents=INTENT_MAP, clusters=CLUSTER_MAP, aliases=EMOTION_ALIASES):
+        self.emotions = list(emotions)
+        col = {e: j for j, e in enumerate(self.emotions)}
+        self.terms = []
+        rows = []
+        # bare names: the first kind that defines them wins
+        self.ids = {}
+        kinds = [("intent", intents), ("cluster", clusters), ("alias", aliases),
+                 ("emotion", {e: {e: 1.0} for e in self.emotions})]
+        for kind, mapping in kinds:
+            for name, weights in mapping.items():
+                unknown = [e for e in weights if e not in col]
+                if unknown:
+                    raise ValueError(f"{kind} {name!r} uses unknown emotions {unknown}")
+                row = np.zeros(len(self.emotions), dtype=np.float32)
+                for e, w in weights.items():
+                    row[col[e]] += w
+                self.ids[f"{kind}:{name}"] = len(rows)
+                self.ids.setdefault(name, len(rows))
+                self.terms.append(f"{kind}:{name}")
+                rows.append(row)
+        self.matrix = np.vstack(rows)
+
+    def __len__(self):
+        return len(self.terms)
+
+    def __contains__(self, term):
+        return term.strip() in self.ids or term.strip().lower() in self.ids
+
+    def parse(self, mix):
+        """(term rows, weights) of one mix; ValueError on unknown terms or
+        bad weights."""
+        if isinstance(mix, str):
+            pairs = []
+            for item in _SPLIT.split(mix):
+                if not item.strip():
+                    continue
+                name, _, weight = item.partition("=")
+                pairs.append((name, weight.strip() if weight else 1.0))
+        elif isinstance(mix, dict):
+            pairs = list(mix.items())
+        elif isinstance(mix, (list, tuple)):
+            pairs = [(item, 1.0) if isinstance(item, str) else tuple(item) for item in mix]
+        else:
+            raise ValueError("a mix must be a string, a term->weight object or a list of terms")
+        ids = np.empty(len(pairs), dtype=np.intp)
+        weights = np.empty(len(pairs), dtype=np.float32)
+        for i, (name, weight) in enumerate(pairs):
+            key = str(name).strip()
+            if key not in self.ids:
+                key = key.lower()
+            if key not in self.ids:
+                raise ValueError(f"unknown term {key!r}")
+            try:
+                weight = float(weight)
+            except (TypeError, ValueError):
+                raise ValueError(f"weight of {key!r} must be a number")
+            if not math.isfinite(weight) or weight < 0:
+                raise ValueError(f"weight of {key!r} must be finite and >= 0")
+            ids[i], weights[i] = self.ids[key], weight
+        return ids, weights
+
+    def vector(self, mix, normalize=True):
+        """Emotion vector of one mix (see `vectors`)."""
+        return self.vectors([mix], normalize)[0]
+
+    def vectors(self, mixes, normalize=True):
+        """N x emotions matrix of N mixes. With `normalize` each row sums to
+        1 (as in the recommender scripts); all-zero rows stay zero.
+
+        Identical string mixes are parsed once, so a batch of thousands of
+        users choosing from a handful of presets costs a few parses and one
+        product.
+        """
+        parsed = {}
+        terms = []
+        for mix in mixes:
+            hit = parsed.get(mix) if isinstance(mix, str) else None
+            if hit is None:
+                hit = self.parse(mix)
+                if isinstance(mix, str):
+                    parsed[mix] = hit
+            terms.append(hit)
+        return self.project(terms, normalize)
+
+    def project(self, terms, normalize=True):
+        """`vectors` of already parsed mixes ((term rows, weights) pairs)."""
+        counts = np.array([len(ids) for ids, _ in terms], dtype=np.intp)
+        # CSR (row, term, weight) triplets scattered into a dense N x terms
+        # block: the vocabulary is a few dozen terms, so one GEMM beats a
+        # sparse kernel here
+        coef = np.zeros((len(terms), len(self)), dtype=np.float32)
+        if counts.sum():
+            rows = np.repeat(np.arange(len(terms)), counts)
+            np.add.at(coef, (rows, np.concatenate([ids for ids, _ in terms])),
+                      np.concatenate([w for _, w in terms]))
+        out = coef @ self.matrix
+        if normalize:
+            total = out.sum(axis=1, keepdims=True)
+            np.divide(out, total, out=out, where=total > 0)
+        return out
+
+
+_DEFAULT = {}
+
+
+def vocabulary(emotions=EMOTIONS):
+    """Shared `Vocabulary` of the default maps over `emotions`; terms that
+    use an emotion missing from `emotions` are left out."""
+    key = tuple(emotions)
+    if key not in _DEFAULT:
+        fits = lambda mapping: {t: w for t, w in mapping.items() if set(w) <= set(key)}
+        _DEFAULT[key] = Vocabulary(key, fits(INTENT_MAP), fits(CLUSTER_MAP), fits(EMOTION_ALIASES))
+    return _DEFAULT[key]
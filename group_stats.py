@@ -0,0 +1,158 @@
+"""Running group statistics for large audiences
+
+Group mode only needs two sums over the participants:
+- raw sum     -> group vector (mean of the scaled 0-1 vectors)
+- unit sum s  -> consensus and user -> group similarity
+
+For unit vectors u_1..u_n, sum_{i<j} u_i.u_j = (|s|^2 - sum |u_i|^2) / 2, so the
+mean pairwise cosine is (|s|^2 - n) / (n (n - 1)) without the n x n matrix.
+`GroupAccumulator` keeps O(d) state, so participants can be streamed in (and
+out) in chunks of any size.
+
+Besides the mean vector, groups can rank movies by an aggregate of the
+per-user scores. `ScoreAggregator` folds chunks of the n x M user-by-movie
+score matrix (one GEMM per chunk) into every strategy at once:
+- "average"        mean score over users
+- "least_misery"   lowest user score (nobody hates it)
+- "most_pleasure"  highest user score
+- "borda"          sum of per-user rank points (M - 1 for a user's best movie)
+- "fairness"       mean - FAIRNESS_PENALTY * std (penalizes disagreement)
+"""
+
+import numpy as np
+
+STRATEGIES = ("mean", "average", "least_misery", "most_pleasure", "borda", "fairness")
+# "mean" scores the mean vector; the others aggregate the per-user scores
+SCORE_STRATEGIES = STRATEGIES[1:]
+FAIRNESS_PENALTY = 0.5
+
+
+class GroupAccumulator:
+    """O(d) running sums over participants; `add` / `remove` take chunks."""
+
+    def __init__(self, dim):
+        self.n = 0
+        self.raw_sum = np.zeros(dim, dtype=np.float64)
+        self.unit_sum = np.zeros(dim, dtype=np.float64)
+        # sum of |u|^2 (== n for unit rows, kept exact for un-normalized indexes)
+        self.unit_sq = 0.0
+
+    def _update(self, raw, unit, sign):
+        raw = np.atleast_2d(np.asarray(raw, dtype=np.float64))
+        unit = np.atleast_2d(np.asarray(unit, dtype=np.float64))
+        if raw.shape != unit.shape or raw.shape[1] != len(self.raw_sum):
+            raise ValueError(f"participants must be N x {len(self.raw_sum)}, got {raw.shape} and {unit.shape}")
+        self.n += sign * len(raw)
+        self.raw_sum += sign * raw.sum(axis=0)
+        self.unit_sum += sign * unit.sum(axis=0)
+        self.unit_sq += sign * float(np.einsum("ij,ij->", unit, unit))
+
+    def add(self, raw, unit):
+        """Add participants: raw scaled vectors and their unit (prepared) rows."""
+        self._update(raw, unit, 1)
+
+    def remove(self, raw, unit):
+        """Remove participants previously added with the same rows."""
+        if len(np.atleast_2d(raw)) > self.n:
+            raise ValueError("removing more participants than were added")
+        self._update(raw, unit, -1)
+
+    def __len__(self):
+        return self.n
+
+    def group_vector(self):
+        """Mean of the raw vectors (keeps intensity, like the GUI)."""
+        if self.n == 0:
+            raise ValueError("Group has no participants")
+        return self.raw_sum / self.n
+
+    def group_unit(self):
+        vec = self.group_vector()
+        norm = np.linalg.norm(vec)
+        if norm == 0:
+            raise ValueError("Group vector is zero")
+        return vec / norm
+
+    @property
+    def consensus(self):
+        """Mean pairwise similarity over all user pairs (1.0 for one user)."""
+        if self.n < 2:
+            return 1.0
+        pair_sum = float(self.unit_sum.dot(self.unit_sum)) - self.unit_sq
+        return pair_sum / (self.n * (self.n - 1))
+
+    def user_to_group(self, unit):
+        """Similarity of the given participants' unit rows to the group."""
+        return np.asarray(unit, dtype=np.float32).dot(self.group_unit().astype(np.float32))
+
+    def mean_user_to_group(self):
+        """Average user -> group similarity, from the sums alone."""
+        return float(self.unit_sum.dot(self.group_unit())) / self.n
+
+
+class ScoreAggregator:
+    """Per-movie aggregates of user score rows, fed in user chunks."""
+
+    def __init__(self, m, strategies=SCORE_STRATEGIES, exclude=None):
+        unknown = set(strategies) - set(SCORE_STRATEGIES)
+        if unknown:
+            raise ValueError(f"unknown group strategies: {sorted(unknown)}")
+        self.m = m
+        self.strategies = tuple(strategies)
+        # rows that never rank (deleted movies): they score -inf in every
+        # result and sit below all live movies in each user's Borda ranking
+        self.exclude = exclude if exclude is not None and exclude.any() else None
+        self.n = 0
+        self.sum = np.zeros(m, dtype=np.float64)
+        self.sq_sum = np.zeros(m, dtype=np.float64) if "fairness" in strategies else None
+        self.min = np.full(m, np.inf, dtype=np.float32) if "least_misery" in strategies else None
+        self.max = np.full(m, -np.inf, dtype=np.float32) if "most_pleasure" in strategies else None
+        self.borda = np.zeros(m, dtype=np.float64) if "borda" in strategies else None
+
+    def add(self, scores):
+        """Fold an (n_i x M) block of user scores into the aggregates."""
+        scores = np.atleast_2d(scores)
+        self.n += len(scores)
+        self.sum += scores.sum(axis=0, dtype=np.float64)
+        if self.sq_sum is not None:
+            self.sq_sum += np.einsum("ij,ij->j", scores, scores, dtype=np.float64)
+        if self.min is not None:
+            np.minimum(self.min, scores.min(axis=0), out=self.min)
+        if self.max is not None:
+            np.maximum(self.max, scores.max(axis=0), out=self.max)
+        if self.borda is not None:
+            # points = number of movies the user scores lower (ascending rank)
+            points = np.empty(scores.shape, dtype=np.float64)
+            rows = np.arange(len(scores))[:, None]
+            ranked = scores if self.exclude is None else np.where(self.exclude, -np.inf, scores)
+            points[rows, np.argsort(ranked, axis=1, kind="stable")] = np.arange(self.m)
+            self.borda += points.sum(axis=0)
+
+    def result(self, strategy):
+        """Aggregate score per movie (higher is better)."""
+        scores = self._result(strategy)
+        if self.exclude is None:
+            return scores
+        if strategy == "borda":
+            # excluded rows gave every live movie the same extra points
+            scores = scores - self.n * float(self.exclude.sum())
+        scores = np.array(scores)
+        scores[self.exclude] = -np.inf
+        return scores
+
+    def _result(self, strategy):
+        if strategy not in self.strategies:
+            raise ValueError(f"strategy {strategy!r} was not aggregated")
+        if self.n == 0:
+            raise ValueError("Group has no participants")
+        if strategy == "average":
+            return self.sum / self.n
+        if strategy == "least_misery":
+            return self.min
+        if strategy == "most_pleasure":
+            return self.max
+        if strategy == "borda":
+            return self.borda
+        mean = self.sum / self.n
+        var = np.maximum(self.sq_sum / self.n - mean * mean, 0.0)
+        return mean - FAIRNESS_PENALTY * np.sqrt(var)
@@ -0,0 +1,150 @@
+"""Live recommendation sessions for the Server-Sent Events endpoint
+
+A client opens `GET /live` (an EventSource) and gets a session id; slider
+moves are then sent as `POST /live {"id": ..., "set": {"joy": 7}}`. Each
+session wraps a `ScoreSession` (score_session.py), so a move is a rank-1
+update rather than a full re-score.
+
+Moves are coalesced per emotion: a slider dragged through twenty positions
+between two passes is applied once, with its latest value. The stream loop
+in server.py runs at most one scoring pass per `LIVE_INTERVAL`, so a drag
+costs a bounded number of passes however many deltas arrive.
+
+Transport-free like recommender_api.py; sessions live in one process.
+"""
+
+import secrets
+import threading
+import time
+
+import numpy as np
+
+from recommender_api import RequestError, parse_k, parse_vector, results_json
+
+# minimum seconds between two scoring passes of one session
+LIVE_INTERVAL = 0.05
+# seconds between keep-alive comments on an idle stream
+HEARTBEAT = 15.0
+MAX_SESSIONS = 256
+
+
+class LiveSession:
+    """Pending slider values for one client plus its `ScoreSession`."""
+
+    def __init__(self, index, vector, k):
+        self.id = secrets.token_urlsafe(12)
+        self.index = index
+        self.k = k
+        self.session = index.session(vector, k)
+        self._pending = {}
+        self._cond = threading.Condition()
+        self.closed = False
+        self.received = 0
+        self.passes = 0
+        self._last_pass = 0.0
+
+    def push(self, changes):
+        """Queue {emotion index: value}; later values replace earlier ones."""
+        with self._cond:
+            self._pending.update(changes)
+            self.received += len(changes)
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify()
+
+    def wait(self, timeout=HEARTBEAT):
+        """Block until changes are pending (True), or timeout / close (False).
+
+        Returns no earlier than LIVE_INTERVAL after the previous pass, so
+        changes arriving in the meantime are coalesced into the next one.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._pending or self.closed, timeout)
+            if self.closed or not self._pending:
+                return False
+        delay = self._last_pass + LIVE_INTERVAL - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        return not self.closed
+
+    def apply(self):
+        """Apply the coalesced changes; returns the Top-k event payload."""
+        with self._cond:
+            changes, self._pending = self._pending, {}
+        for dim, value in changes.items():
+            self.session.set(dim, value)
+        self.passes += 1
+        self._last_pass = time.monotonic()
+        return self.snapshot()
+
+    def snapshot(self):
+        try:
+            order, scores = self.session.topk()
+        except ValueError as e:
+            return {"error": str(e), "passes": self.passes, "received": self.received}
+        return {"results": results_json(self.index, order, scores),
+                "passes": self.passes, "received": self.received}
+
+
+class LiveRegistry:
+    """Open live sessions of this process, by id."""
+
+    def __init__(self, max_sessions=MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def open(self, index, params):
+        """New session from query parameters: optional "k" and "vector"
+        (comma-separated, default all 5s like the UI)."""
+        k = parse_k(params)
+        vector = params.get("vector")
+        if vector is None:
+            vector = np.full(len(index.emotions), 5.0, dtype=np.float32)
+        else:
+            try:
+                values = [float(x) for x in str(vector).split(",")]
+            except ValueError:
+                raise RequestError("vector must be comma-separated numbers")
+            vector = parse_vector(index, values)
+        with self._lock:
+            if len(self._sessions) >= self.max_sessions:
+                raise RequestError("too many live sessions")
+            live = LiveSession(index, vector, k)
+            self._sessions[live.id] = live
+        return live
+
+    def close(self, live):
+        live.close()
+        with self._lock:
+            self._sessions.pop(live.id, None)
+
+    def update(self, payload):
+        """POST /live: {"id": ..., "set": {emotion: value}} or {"id": ..., "vector": [...]}."""
+        live = self._sessions.get(payload.get("id"))
+        if live is None:
+            raise RequestError("unknown or closed live session")
+        if "vector" in payload:
+            values = payload["vector"]
+            if not isinstance(values, list) or len(values) != len(live.index.emotions):
+                raise RequestError(f"vector must be a list of {len(live.index.emotions)} numbers")
+            changes = dict(enumerate(values))
+        elif isinstance(payload.get("set"), dict):
+            changes = {}
+            for emotion, value in payload["set"].items():
+                if emotion not in live.index.emotions:
+                    raise RequestError(f"unknown emotion {emotion!r}")
+                changes[live.index.emotions.index(emotion)] = value
+        else:
+            raise RequestError("pass 'set' ({emotion: value}) or 'vector'")
+        for dim, value in changes.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not np.isfinite(value) or value < 0:
+                raise RequestError("values must be finite numbers >= 0")
+        live.push(changes)
+        return {"queued": len(changes)}
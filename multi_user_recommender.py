@@ -2,8 +2,13 @@
 
 - Based on `movie_recommender_gui_souj.py` UI and logic
 - Allows setting number of users, editing each user's emotion sliders (0-10)
-- Computes each user's Top-3 recommendations, Group Top-3 (mean vector),
+- Each tab shows that user's live Top-3 while a slider is dragged; moves are
+  applied as rank-1 updates to a `ScoreSession` instead of re-scoring
+- Computes each user's Top-3 recommendations, Group Top-3 (mean vector, or
+  least-misery / most-pleasure / Borda / fairness over the user scores),
   pairwise cosine similarity matrix, and a consensus coefficient
+- Consensus comes from the sum of the user vectors (O(n*d)); the pairwise
+  matrix is only printed for groups of up to `PAIRWISE_MAX` users
 
 Run: python multi_user_recommender.py
 """
@@ -14,15 +19,11 @@ from tkinter import ttk, messagebox
 import pandas as pd
 import numpy as np
 
-# --- Config (reused from original GUI) ---
-EMOTIONS = [
-    "joy","sadness","fear","anger","disgust","surprise","trust",
-    "anticipation","curiosity","excitement","hope","love","guilt",
-    "shame","gratitude","loneliness","confidence","determination",
-    "regret","relief","nostalgia","compassion","anxiety","inspiration",
-]
+from emotion_index import EMOTIONS, PAIRWISE_MAX, EmotionIndex
+from group_stats import STRATEGIES
 
-CSV_FILENAME = os.path.join(os.path.dirname(__file__), "movies_emotions_50_souj.csv")
+CSV_FILENAME = os.path.join(os.path.dirname(__file__), "datasets", "movies_emotions_50_souj.csv")
+MAX_USERS = 500
 
 
 class MultiUserRecommenderApp(tk.Tk):
@@ -35,23 +36,17 @@ class MultiUserRecommenderApp(tk.Tk):
             messagebox.showerror("CSV not found", f"CSV file not found: {CSV_FILENAME}")
             self.destroy(); return
 
-        self.df = pd.read_csv(CSV_FILENAME)
-        # ensure numeric columns
-        for col in ["year", "imdb"]:
-            if col in self.df.columns:
-                self.df[col] = pd.to_numeric(self.df[col], errors="coerce")
-
-        # movie emotion matrix
-        self.movie_matrix = self.df[EMOTIONS].fillna(0).to_numpy(dtype=float)
-        # prepare movie unit vectors for cosine similarity
-        norms = np.linalg.norm(self.movie_matrix, axis=1)
-        norms[norms == 0] = 1.0
-        self.movie_unit = (self.movie_matrix.T / norms).T
+        # scoring engine owns the catalog and the normalized movie matrix
+        self.index = EmotionIndex.from_csv(CSV_FILENAME)
+        self.df = self.index.df
 
         # UI state
         self.num_users_var = tk.IntVar(value=2)
+        self.strategy_var = tk.StringVar(value="mean")
         self.user_tabs = None
         self.user_emotion_vars = []  # list of dicts per user
+        self.sessions = []  # live ScoreSession per user
+        self.live_vars = []  # live Top-3 label text per user
 
         self._build_ui()
 
@@ -61,9 +56,13 @@ class MultiUserRecommenderApp(tk.Tk):
         top.pack(fill=tk.X, padx=10, pady=8)
 
         ttk.Label(top, text="Number of users:").pack(side=tk.LEFT)
-        spin = ttk.Spinbox(top, from_=1, to=12, width=5, textvariable=self.num_users_var)
+        spin = ttk.Spinbox(top, from_=1, to=MAX_USERS, width=5, textvariable=self.num_users_var)
         spin.pack(side=tk.LEFT, padx=6)
 
+        ttk.Label(top, text="Group strategy:").pack(side=tk.LEFT, padx=(6, 0))
+        strategy_box = ttk.Combobox(top, values=STRATEGIES, width=14, state="readonly", textvariable=self.strategy_var)
+        strategy_box.pack(side=tk.LEFT, padx=6)
+
         create_btn = ttk.Button(top, text="Create User Tabs", command=self._create_user_tabs)
         create_btn.pack(side=tk.LEFT, padx=6)
 
@@ -100,6 +99,8 @@ class MultiUserRecommenderApp(tk.Tk):
         for child in self.user_tabs.winfo_children():
             child.destroy()
         self.user_emotion_vars = []
+        self.sessions = []
+        self.live_vars = []
 
         for i in range(n):
             frame = ttk.Frame(self.user_tabs)
@@ -119,7 +120,8 @@ class MultiUserRecommenderApp(tk.Tk):
                 lbl = ttk.Label(f, text=emotion.title())
                 lbl.pack(anchor=tk.W)
                 var = tk.DoubleVar(value=5.0)
-                s = ttk.Scale(f, from_=0, to=10, orient=tk.HORIZONTAL, variable=var)
+                s = ttk.Scale(f, from_=0, to=10, orient=tk.HORIZONTAL, variable=var,
+                              command=lambda value, idx=i, e=emotion: self._on_slider(idx, e, value))
                 s.pack(fill=tk.X, padx=2, pady=4)
                 vars_map[emotion] = var
 
@@ -130,82 +132,76 @@ class MultiUserRecommenderApp(tk.Tk):
             preview_btn = ttk.Button(btn_frame, text="Preview Top-3", command=lambda idx=i: self.preview_user_topk(idx))
             preview_btn.pack(side=tk.LEFT, padx=4)
 
-            clear_btn = ttk.Button(btn_frame, text="Reset Sliders", command=lambda vm=vars_map: self._reset_vars(vm))
+            clear_btn = ttk.Button(btn_frame, text="Reset Sliders", command=lambda idx=i: self._reset_vars(idx))
             clear_btn.pack(side=tk.LEFT, padx=4)
 
+            live_var = tk.StringVar()
+            ttk.Label(frame, textvariable=live_var, justify=tk.LEFT).pack(anchor=tk.W, padx=14, pady=(0, 8))
+
             self.user_emotion_vars.append(vars_map)
+            self.sessions.append(self.index.session(np.full(len(EMOTIONS), 0.5), k=3))
+            self.live_vars.append(live_var)
+            self._show_live(i)
 
-    def _reset_vars(self, vars_map):
-        for v in vars_map.values():
+    def _reset_vars(self, user_idx):
+        for v in self.user_emotion_vars[user_idx].values():
             v.set(5.0)
+        self.sessions[user_idx].update(np.full(len(EMOTIONS), 0.5))
+        self._show_live(user_idx)
+
+    def _on_slider(self, user_idx, emotion, value):
+        # one dimension changed: rank-1 update of the user's scores
+        self.sessions[user_idx].set(emotion, float(value) / 10.0)
+        self._show_live(user_idx)
+
+    def _show_live(self, user_idx):
+        try:
+            order, sim = self.sessions[user_idx].topk()
+        except ValueError:
+            self.live_vars[user_idx].set("Live Top-3: set at least one emotion above 0")
+            return
+        lines = [f"{r}. {self.df.iloc[idx]['title']} ({score:.3f})" for r, (idx, score) in enumerate(zip(order, sim), start=1)]
+        self.live_vars[user_idx].set("Live Top-3:\n" + "\n".join(lines))
 
     def preview_user_topk(self, user_idx):
-        vec_unit = self._get_user_unit_vector(user_idx)
-        if vec_unit is None:
+        try:
+            order, sim = self.sessions[user_idx].topk()
+        except ValueError:
             messagebox.showerror("Input error", f"User {user_idx+1}: set at least one emotion slider > 0")
             return
-        sim = self.movie_unit.dot(vec_unit)
-        order = np.argsort(-sim)[:3]
         content = f"User {user_idx+1} Top-3:\n"
-        for rank, idx in enumerate(order, start=1):
+        for rank, (idx, score) in enumerate(zip(order, sim), start=1):
             row = self.df.iloc[idx]
-            content += f"{rank}. {row['title']} ({int(row['year']) if not pd.isna(row['year']) else 'N/A'}) - Similarity: {sim[idx]:.3f}\n"
+            content += f"{rank}. {row['title']} ({int(row['year']) if not pd.isna(row['year']) else 'N/A'}) - Similarity: {score:.3f}\n"
         self._append_results(content)
 
-    def _get_user_unit_vector(self, user_idx):
-        vars_map = self.user_emotion_vars[user_idx]
-        vec = np.array([vars_map[e].get() for e in EMOTIONS], dtype=float) / 10.0
-        norm = np.linalg.norm(vec)
-        if norm == 0:
-            return None
-        return vec / norm
+    def _get_user_vector(self, user_idx):
+        # scaled (0-1), non-unit slider vector (kept current by the session)
+        return self.sessions[user_idx].vector.copy()
 
     def compute_group(self):
         n = len(self.user_emotion_vars)
-        # build unit vectors and check validity
-        user_units = []
+        # build scaled vectors and check validity
+        original_vecs = []
         for i in range(n):
-            u = self._get_user_unit_vector(i)
-            if u is None:
+            v = self._get_user_vector(i)
+            if not v.any():
                 messagebox.showerror("Input error", f"User {i+1} must set at least one emotion slider > 0")
                 return
-            user_units.append(u)
-        U = np.vstack(user_units)
-
-        # per-user Top-3
-        per_user_top3 = []
-        per_user_sims = []
-        for i, u in enumerate(user_units):
-            sim = self.movie_unit.dot(u)
-            order = np.argsort(-sim)[:3]
-            per_user_top3.append([self.df.iloc[idx]['title'] for idx in order])
-            per_user_sims.append(sim)
-
-        # group vector: mean of original (non-unit) scaled vectors to preserve intensity
-        original_vecs = [np.array([self.user_emotion_vars[i][e].get() for e in EMOTIONS], dtype=float) / 10.0 for i in range(n)]
-        group_vec = np.mean(np.vstack(original_vecs), axis=0)
-        group_norm = np.linalg.norm(group_vec)
-        if group_norm == 0:
+            original_vecs.append(v)
+
+        try:
+            result = self.index.group(np.vstack(original_vecs), k=3, strategy=self.strategy_var.get())
+        except ValueError:
             messagebox.showerror("Input error", "Group vector is zero. At least one user must set an emotion above 0.")
             return
-        group_unit = group_vec / group_norm
 
-        group_sim = self.movie_unit.dot(group_unit)
-        group_order = np.argsort(-group_sim)[:3]
+        per_user_top3 = [[self.df.iloc[idx]['title'] for idx in order] for order in result["per_user_idx"]]
+        group_order, group_sim = result["group_idx"], result["group_sim"]
         group_top3 = [self.df.iloc[idx]['title'] for idx in group_order]
-
-        # pairwise cosine similarities between users (dot of unit vectors)
-        sims = U.dot(U.T)
-
-        # consensus coefficient: mean of upper triangle excluding diagonal, or 1.0 if single user
-        if n == 1:
-            consensus = 1.0
-        else:
-            iu = np.triu_indices(n, k=1)
-            consensus = float(np.mean(sims[iu]))
-
-        # similarity of each user to group
-        user_to_group = [float(np.dot(u, group_unit)) for u in user_units]
+        sims = result["pairwise"]
+        consensus = result["consensus"]
+        user_to_group = result["user_to_group"]
 
         # build results output
         out = []
@@ -213,25 +209,28 @@ class MultiUserRecommenderApp(tk.Tk):
         for i, titles in enumerate(per_user_top3, start=1):
             out.append(f"User {i} Top-3:\n")
             for r, t in enumerate(titles, start=1):
-                # show score from per_user_sims
-                idx = per_user_sims[i-1].argmax() if False else None  # placeholder not used
                 out.append(f"  {r}. {t}\n")
             out.append("\n")
 
-        out.append("=== Group Top-3 (Averaged) ===\n")
-        for r, idx in enumerate(group_order, start=1):
+        strategy = result["strategy"]
+        label = "Similarity" if strategy == "mean" else "Score"
+        out.append(f"=== Group Top-3 ({'Averaged' if strategy == 'mean' else strategy}) ===\n")
+        for r, (idx, score) in enumerate(zip(group_order, group_sim), start=1):
             row = self.df.iloc[idx]
-            out.append(f"  {r}. {row['title']} ({int(row['year']) if not pd.isna(row['year']) else 'N/A'}) - Similarity: {group_sim[idx]:.3f}\n")
+            out.append(f"  {r}. {row['title']} ({int(row['year']) if not pd.isna(row['year']) else 'N/A'}) - {label}: {score:.3f}\n")
         out.append("\n")
 
-        out.append("=== Pairwise Cosine Similarity (users) ===\n")
-        # header
-        hdr = "     " + " ".join([f"U{j+1:>6}" for j in range(n)])
-        out.append(hdr + "\n")
-        for i in range(n):
-            row = " ".join([f"{sims[i,j]:6.3f}" for j in range(n)])
-            out.append(f"U{i+1:<3} {row}\n")
-        out.append("\n")
+        if sims is not None:
+            out.append("=== Pairwise Cosine Similarity (users) ===\n")
+            # header
+            hdr = "     " + " ".join([f"U{j+1:>6}" for j in range(n)])
+            out.append(hdr + "\n")
+            for i in range(n):
+                row = " ".join([f"{sims[i,j]:6.3f}" for j in range(n)])
+                out.append(f"U{i+1:<3} {row}\n")
+            out.append("\n")
+        else:
+            out.append(f"(pairwise matrix omitted for more than {PAIRWISE_MAX} users)\n\n")
 
         out.append(f"Consensus coefficient: {consensus:.3f} ({consensus*100:.1f}% average similarity)\n\n")
 
@@ -0,0 +1,187 @@
+"""Precomputed "more like this" neighbour table
+
+    python neighbor_table.py datasets/movies_dataset_500_souj.emx [--k 20] [--workers 4]
+    -> datasets/movies_dataset_500_souj.emx.neighbors.npz
+
+`build_neighbors` finds every movie's top-k most similar movies (cosine of
+the unit rows, the movie itself excluded) in row blocks: each block is one
+(rows x M) GEMM kept under `SCORE_BLOCK` entries, so memory does not grow
+with M^2. Instead of a partial sort of every row, the k-th best score of a
+strided column sample is a lower bound for the row's k-th best; one compare
+against it leaves a few hundred candidates to sort. Blocks are spread over
+a process pool that reads the matrix from one shared memory copy.
+
+`NeighborTable` stores the result CSR-style: the neighbours of movie i are
+`ids[offsets[i]:offsets[i + 1]]` (best first) with their `scores`, so a
+lookup is two offset reads and a slice. `server.py --neighbors` attaches a
+saved table and /similar is then answered from it.
+
+A saved table records the catalog version it was built from (the catalog
+file plus its delta log, see catalog_reload.catalog_version); loading it
+for another version raises ValueError, so deletes and updates applied
+since never come back through a stale table. Rebuild it after changes.
+"""
+
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from emotion_index import SCORE_BLOCK, _to_shared, topk_rows
+
+DEFAULT_K = 20
+# column stride of the sample that sets each row's candidate cut
+PRUNE_STRIDE = 16
+# rows per task handed to a worker (several GEMM blocks each)
+TASK_ROWS = 4096
+
+# per-worker view of the shared matrix, set by _attach_worker
+_SHARED = {}
+
+
+def _attach_worker(name, shape, dtype, exclude):
+    from multiprocessing import shared_memory
+    block = shared_memory.SharedMemory(name=name)
+    _SHARED["block"] = block
+    _SHARED["matrix"] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+    _SHARED["exclude"] = exclude
+
+
+def topk_pruned(sim, k, stride=PRUNE_STRIDE):
+    """`topk_rows` for wide score blocks: only scores >= the k-th best of
+    every `stride`-th column are sorted (at least k per row pass the cut)."""
+    n, m = sim.shape
+    stride = min(stride, m // (4 * k)) if k else 1
+    if stride <= 1:
+        return topk_rows(sim, k)
+    cut = np.partition(sim[:, ::stride], -k, axis=1)[:, -k]
+    if not np.isfinite(cut).all():
+        return topk_rows(sim, k)
+    flat = np.flatnonzero(sim >= cut[:, None])
+    rows, cols = np.divmod(flat, m)
+    values = sim.reshape(-1)[flat]
+    order = np.lexsort((-values, rows))
+    # candidates are grouped by row, best first: take the first k of each
+    pos = np.searchsorted(rows[order], np.arange(n))[:, None] + np.arange(k)
+    return cols[order][pos], values[order][pos]
+
+
+def _neighbors_rows(matrix, start, stop, k, exclude=None):
+    """Top-k neighbours of rows [start, stop) of `matrix`, as (ids, scores)."""
+    step = max(1, SCORE_BLOCK // len(matrix))
+    out_idx = np.empty((stop - start, k), dtype=np.int32)
+    out_sim = np.empty((stop - start, k), dtype=np.float32)
+    for a in range(start, stop, step):
+        b = min(a + step, stop)
+        sim = matrix[a:b] @ matrix.T
+        # a movie is not its own neighbour
+        sim[np.arange(b - a), np.arange(a, b)] = -np.inf
+        if exclude is not None:
+            sim[:, exclude] = -np.inf
+        out_idx[a - start:b - start], out_sim[a - start:b - start] = topk_pruned(sim, k)
+    return out_idx, out_sim
+
+
+def _neighbors_task(start, stop, k):
+    return start, _neighbors_rows(_SHARED["matrix"], start, stop, k, _SHARED["exclude"])
+
+
+def build_neighbors(matrix, k=DEFAULT_K, workers=None, exclude=None):
+    """`NeighborTable` of the top-k rows most similar to each row of a unit
+    matrix. `exclude` (bool per row) keeps rows out of every list and gives
+    them no neighbours; `workers` > 1 runs row tasks in a process pool."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    m = len(matrix)
+    live = m if exclude is None else m - int(exclude.sum())
+    k = max(0, min(k, live - 1))
+    ids = np.empty((m, k), dtype=np.int32)
+    scores = np.empty((m, k), dtype=np.float32)
+    tasks = [(a, min(a + TASK_ROWS, m)) for a in range(0, m, TASK_ROWS)]
+    workers = min(workers or 1, len(tasks))
+    if k and workers <= 1:
+        for a, b in tasks:
+            ids[a:b], scores[a:b] = _neighbors_rows(matrix, a, b, k, exclude)
+    elif k:
+        block, shared = _to_shared(matrix)
+        try:
+            with ProcessPoolExecutor(workers, initializer=_attach_worker,
+                                     initargs=(block.name, shared.shape, shared.dtype, exclude)) as pool:
+                futures = [pool.submit(_neighbors_task, a, b, k) for a, b in tasks]
+                for future in futures:
+                    a, (block_ids, block_scores) = future.result()
+                    ids[a:a + len(block_ids)], scores[a:a + len(block_ids)] = block_ids, block_scores
+        finally:
+            block.close()
+            block.unlink()
+    counts = np.full(m, k, dtype=np.int64)
+    if exclude is not None:
+        counts[exclude] = 0
+    keep = np.repeat(counts > 0, k) if k else np.zeros(0, dtype=bool)
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    return NeighborTable(offsets, ids.reshape(-1)[keep], scores.reshape(-1)[keep])
+
+
+class NeighborTable:
+    """CSR neighbour lists: row i -> ids/scores[offsets[i]:offsets[i + 1]]."""
+
+    def __init__(self, offsets, ids, scores, path=None, version=None):
+        self.offsets = offsets
+        self.ids = ids
+        self.scores = scores
+        self.path = path
+        # catalog version (EmotionIndex.version) the table describes
+        self.version = version
+        # longest list: /similar reads the table for any k up to this
+        self.k = int(np.diff(offsets).max()) if len(offsets) > 1 else 0
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def lookup(self, i, k=None):
+        """(ids, scores) of movie i's neighbours, best first (at most k)."""
+        a, b = self.offsets[i], self.offsets[i + 1]
+        if k is not None:
+            b = min(b, a + k)
+        return self.ids[a:b], self.scores[a:b]
+
+    def save(self, path):
+        np.savez(path, offsets=self.offsets, ids=self.ids, scores=self.scores,
+                 version=np.array("" if self.version is None else self.version))
+        self.path = path
+
+    @classmethod
+    def load(cls, path, rows=None, version=None):
+        """Load a saved table; `rows` (the catalog size) and `version` (the
+        catalog version) must match if given."""
+        with np.load(path) as data:
+            saved = str(data["version"]) if "version" in data.files else ""
+            table = cls(data["offsets"], data["ids"], data["scores"], path, saved or None)
+        if rows is not None and len(table) != rows:
+            raise ValueError(f"Neighbour table was built for {len(table)} movies, catalog has {rows}")
+        if version is not None and table.version != version:
+            raise ValueError(f"Neighbour table was built for catalog version {table.version or 'unknown'}, "
+                             f"catalog is {version}; rebuild it with neighbor_table.py")
+        return table
+
+
+def main(argv=None):
+    from emotion_index import open_index
+    parser = argparse.ArgumentParser(description="Precompute each movie's top-k emotional neighbours")
+    parser.add_argument("catalog", help="catalog CSV or compiled .emx")
+    parser.add_argument("--k", type=int, default=DEFAULT_K)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--out", help="output .npz (default: <catalog>.neighbors.npz)")
+    args = parser.parse_args(argv)
+    if args.k < 1:
+        sys.exit("--k must be at least 1")
+    index = open_index(args.catalog)
+    table = index.build_neighbors(args.k, args.workers)
+    out = args.out or f"{args.catalog}.neighbors.npz"
+    table.save(out)
+    print(f"Wrote {out} ({len(table)} movies, k={table.k})")
+
+
+if __name__ == "__main__":
+    main()
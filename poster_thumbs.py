@@ -0,0 +1,199 @@
+"""Poster thumbnails and title -> poster manifest
+
+    python poster_thumbs.py [--posters movie_posters] [--widths 92,185,342] [--workers 4]
+    -> movie_posters/thumbs/<digest>-<width>.jpg + movie_posters/thumbs/manifest.json
+
+The posters in `movie_posters/` are full-size originals (~460 KB each). This
+build step writes a few downscaled, recompressed JPEG variants per poster
+(progressive, `QUALITY`), a few KB to a few tens of KB each:
+- file names are content-addressed: the digest covers the source bytes and
+  the variant settings, so a name never changes meaning and `server.py`
+  serves them with `Cache-Control: immutable` and a strong ETag
+- re-runs only encode variants whose file does not exist yet
+- JPEG decoding uses Pillow's draft mode (DCT scaling), so a 2000 px poster
+  is decoded at the nearest power-of-two size above the target, not full size
+
+`manifest.json` maps "<title> (<year>)" of the catalog to its variants
+(file names are matched on letters and digits only, so "Molly's_Game_2017.jpg"
+is "Molly's Game (2017)"); `server.py` answers GET /poster?title=...&w=185
+from it.
+
+Needs Pillow (`pip install pillow`); nothing else in the project does.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from emotion_index import DEFAULT_CSV, load_catalog
+
+POSTER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "movie_posters")
+THUMB_DIR = os.path.join(POSTER_DIR, "thumbs")
+MANIFEST = "manifest.json"
+WIDTHS = (92, 185, 342)
+QUALITY = 80
+# bump when the encoder settings change, so every variant gets a new name
+VARIANT_VERSION = 1
+POSTER_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+def match_key(text):
+    """Letters and digits of a title / file stem, lower-cased."""
+    return re.sub(r"[\W_]+", "", text.lower())
+
+
+def variant_name(source_digest, width, quality=QUALITY):
+    digest = hashlib.sha256(f"{source_digest}:{width}:{quality}:{VARIANT_VERSION}".encode()).hexdigest()
+    return f"{digest[:20]}-{width}.jpg"
+
+
+def make_variants(source, out_dir, widths=WIDTHS, quality=QUALITY):
+    """Write the missing variants of one poster; returns {width: file name}
+    plus the source size in bytes."""
+    from PIL import Image
+    with open(source, "rb") as f:
+        data = f.read()
+    source_digest = hashlib.sha256(data).hexdigest()
+    names = {w: variant_name(source_digest, w, quality) for w in widths}
+    missing = [w for w in widths if not os.path.exists(os.path.join(out_dir, names[w]))]
+    # largest first: each smaller variant is resized from the previous one
+    img = None
+    for width in sorted(missing, reverse=True):
+        if img is None:
+            img = Image.open(source)
+            img.draft("RGB", (width, width * 2))
+            img = img.convert("RGB")
+        height = max(1, round(img.height * width / img.width))
+        if img.width > width:
+            img = img.resize((width, height), Image.LANCZOS)
+        tmp = os.path.join(out_dir, f".{names[width]}.tmp")
+        img.save(tmp, "JPEG", quality=quality, optimize=True, progressive=True)
+        # atomic rename: a served name always has its complete bytes
+        os.replace(tmp, os.path.join(out_dir, names[width]))
+    return names, len(data)
+
+
+def _variants_task(args):
+    return make_variants(*args)
+
+
+def build_thumbs(poster_dir=POSTER_DIR, out_dir=THUMB_DIR, catalog=DEFAULT_CSV, widths=WIDTHS,
+                 quality=QUALITY, workers=1):
+    """Build the variants and manifest; returns the manifest dict."""
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        raise RuntimeError("poster thumbnails need Pillow (pip install pillow)")
+    os.makedirs(out_dir, exist_ok=True)
+    sources = sorted(f for f in os.listdir(poster_dir) if f.lower().endswith(POSTER_EXTENSIONS))
+    tasks = [(os.path.join(poster_dir, f), out_dir, widths, quality) for f in sources]
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(workers) as pool:
+            results = list(pool.map(_variants_task, tasks, chunksize=4))
+    else:
+        results = [make_variants(*task) for task in tasks]
+
+    by_key = {match_key(os.path.splitext(f)[0]): (f, names, size) for f, (names, size) in zip(sources, results)}
+    df = load_catalog(catalog)
+    posters = {}
+    for title, year in zip(df["title"], df["year"] if "year" in df.columns else [None] * len(df)):
+        year = None if year is None or year != year else int(year)
+        hit = by_key.get(match_key(f"{title}{'' if year is None else year}"))
+        if hit is None:
+            continue
+        source, names, size = hit
+        posters[f"{title} ({year})" if year is not None else title] = {
+            "source": source,
+            "bytes": size,
+            "variants": {str(w): names[w] for w in widths},
+        }
+    manifest = {"widths": list(widths), "quality": quality, "posters": posters}
+    # drop variants no poster refers to any more (old sources or settings)
+    keep = {name for _, (names, _) in zip(sources, results) for name in names.values()}
+    for name in os.listdir(out_dir):
+        if name.endswith(".jpg") and name not in keep:
+            os.remove(os.path.join(out_dir, name))
+    tmp = os.path.join(out_dir, f".{MANIFEST}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp, os.path.join(out_dir, MANIFEST))
+    return manifest
+
+
+class PosterManifest:
+    """Read side of manifest.json for the server: title (+ year) and width
+    -> variant file name. Re-reads the file when it changes."""
+
+    def __init__(self, out_dir=THUMB_DIR):
+        self.dir = out_dir
+        self.path = os.path.join(out_dir, MANIFEST)
+        self._stamp = None
+        self._by_title = {}
+        self.widths = []
+
+    def _refresh(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            self._stamp, self._by_title, self.widths = None, {}, []
+            return
+        stamp = (st.st_mtime_ns, st.st_size)
+        if stamp == self._stamp:
+            return
+        with open(self.path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        by_title = {}
+        for key, poster in manifest["posters"].items():
+            variants = {int(w): name for w, name in poster["variants"].items()}
+            # "Title (2010)" matches with and without the year
+            by_title[match_key(key)] = variants
+            by_title.setdefault(match_key(key.rpartition(" (")[0] or key), variants)
+        self._by_title, self.widths, self._stamp = by_title, sorted(manifest["widths"]), stamp
+
+    def lookup(self, title, year=None, width=None):
+        """File name of the smallest variant at least `width` px wide (the
+        largest if none is), or None if the title has no poster."""
+        self._refresh()
+        variants = self._by_title.get(match_key(f"{title}{'' if year is None else year}"))
+        if not variants:
+            return None
+        widths = sorted(variants)
+        fit = [w for w in widths if width is None or w >= width]
+        return variants[fit[0] if fit else widths[-1]]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build downscaled poster variants and a title -> poster manifest")
+    parser.add_argument("--posters", default=POSTER_DIR, help="directory of full-size posters")
+    parser.add_argument("--out", help="output directory (default: <posters>/thumbs)")
+    parser.add_argument("--catalog", default=DEFAULT_CSV, help="catalog CSV with title and year")
+    parser.add_argument("--widths", default=",".join(map(str, WIDTHS)), help="comma-separated widths in px")
+    parser.add_argument("--quality", type=int, default=QUALITY, help="JPEG quality (1-95)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+    try:
+        widths = sorted({int(w) for w in args.widths.split(",") if w.strip()})
+    except ValueError:
+        sys.exit("--widths must be comma-separated integers")
+    if not widths or widths[0] < 1:
+        sys.exit("--widths must be positive")
+    if not 1 <= args.quality <= 95:
+        sys.exit("--quality must be between 1 and 95")
+    out_dir = args.out or os.path.join(args.posters, "thumbs")
+    try:
+        manifest = build_thumbs(args.posters, out_dir, args.catalog, widths, args.quality, args.workers)
+    except RuntimeError as e:
+        sys.exit(str(e))
+    sizes = [os.path.getsize(os.path.join(out_dir, v)) for p in manifest["posters"].values()
+             for v in p["variants"].values()]
+    source = sum(p["bytes"] for p in manifest["posters"].values())
+    print(f"{len(manifest['posters'])} posters matched, {len(sizes)} variants "
+          f"({sum(sizes) / 1e6:.1f} MB vs {source / 1e6:.1f} MB of originals) in {out_dir}")
+
+
+if __name__ == "__main__":
+    main()
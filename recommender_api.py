@@ -0,0 +1,233 @@
+"""JSON request handling for the recommendation API
+
+Transport-free: each function takes an `EmotionIndex` and a decoded JSON
+payload (dict) and returns a JSON-serializable dict. `server.py` maps HTTP
+routes onto these; batch jobs can call them directly.
+
+Vectors are either a list of len(EMOTIONS) numbers (any non-negative scale,
+e.g. 0-10 slider values), a {term: weight} object or a string such as
+"adrenaline + engagement, suspense=0.6", where a term is an emotion, intent,
+cluster or alias (emotion_vocab.py). Batches of term mixes are projected to
+emotion vectors with one product.
+"""
+
+import math
+import numpy as np
+
+from emotion_vocab import vocabulary
+from group_stats import STRATEGIES
+
+DEFAULT_K = 3
+MAX_K = 100
+
+
+class RequestError(ValueError):
+    """Invalid client input; reported as HTTP 400."""
+
+
+def _check_vector(vec, name):
+    if not np.isfinite(vec).all() or (vec < 0).any():
+        raise RequestError(f"{name} values must be finite and >= 0")
+    if not vec.any():
+        raise RequestError(f"{name} is zero; set at least one emotion above 0")
+    return vec
+
+
+def parse_mix(vocab, value, name="vector"):
+    """Term weights of a mix string / {term: weight} object (`vocab.parse`),
+    for projecting many mixes with one `vocab.project`."""
+    try:
+        return vocab.parse(value)
+    except ValueError as e:
+        raise RequestError(f"{name}: {e}")
+
+
+def parse_vector(index, value, name="vector"):
+    if isinstance(value, (str, dict)):
+        vocab = vocabulary(index.emotions)
+        return _check_vector(vocab.project([parse_mix(vocab, value, name)], normalize=False)[0], name)
+    if not isinstance(value, list) or len(value) != len(index.emotions):
+        raise RequestError(f"{name} must be a list of {len(index.emotions)} numbers, a term->weight object "
+                           "or a term mix string")
+    try:
+        vec = np.array(value, dtype=np.float32)
+    except (TypeError, ValueError):
+        raise RequestError(f"{name} must contain only numbers")
+    return _check_vector(vec, name)
+
+
+def parse_vectors(index, values, name):
+    """N x D matrix of a list of vectors; term mixes (strings / objects) are
+    parsed once per distinct string and projected together."""
+    vocab = vocabulary(index.emotions)
+    U = np.empty((len(values), len(index.emotions)), dtype=np.float32)
+    parsed, mixes, rows = {}, [], []
+    for i, value in enumerate(values):
+        if not isinstance(value, (str, dict)):
+            U[i] = parse_vector(index, value, f"{name}[{i}]")
+            continue
+        terms = parsed.get(value) if isinstance(value, str) else None
+        if terms is None:
+            terms = parse_mix(vocab, value, f"{name}[{i}]")
+            if isinstance(value, str):
+                parsed[value] = terms
+        mixes.append(terms)
+        rows.append(i)
+    if mixes:
+        U[rows] = vocab.project(mixes, normalize=False)
+        for i in np.array(rows)[~U[rows].any(axis=1)][:1]:
+            _check_vector(U[i], f"{name}[{i}]")
+    return U
+
+
+def parse_k(payload):
+    k = payload.get("k", DEFAULT_K)
+    if isinstance(k, str) and k.isdigit():
+        k = int(k)  # query-string parameters
+    if not isinstance(k, int) or isinstance(k, bool) or not 1 <= k <= MAX_K:
+        raise RequestError(f"k must be an integer between 1 and {MAX_K}")
+    return k
+
+
+def parse_flag(payload, name, default=None):
+    value = payload.get(name, default)
+    if value is not None and not isinstance(value, bool):
+        raise RequestError(f"{name} must be true or false")
+    return value
+
+
+def movie_json(index, i, score):
+    row = index.df.iloc[int(i)]
+    year = row.get("year")
+    imdb = row.get("imdb")
+    genres = row.get("genres", "")
+    return {
+        "id": int(i),
+        "title": row["title"],
+        "year": None if year is None or math.isnan(year) else int(year),
+        "genres": genres if isinstance(genres, str) else "",
+        "imdb": None if imdb is None or math.isnan(imdb) else float(imdb),
+        "score": round(float(score), 6),
+    }
+
+
+def results_json(index, order, scores):
+    return [movie_json(index, i, s) for i, s in zip(order, scores)]
+
+
+def parse_filters(payload):
+    from catalog_filters import normalize_spec
+    try:
+        return normalize_spec(payload.get("filters"))
+    except ValueError as e:
+        raise RequestError(str(e))
+
+
+def parse_boost(payload):
+    from catalog_filters import normalize_boost
+    try:
+        return normalize_boost(payload.get("boost"))
+    except ValueError as e:
+        raise RequestError(str(e))
+
+
+def recommend(index, payload):
+    """{"vector": [...]} or {"vectors": [[...], ...]}, optional "k",
+    "filters" (year/imdb/genre/intent/cluster spec) and "boost" (per-tag
+    score bonus, see catalog_filters.py)."""
+    k = parse_k(payload)
+    filters = parse_filters(payload)
+    boost = parse_boost(payload)
+    if "vectors" in payload:
+        vectors = payload["vectors"]
+        if not isinstance(vectors, list) or not vectors:
+            raise RequestError("vectors must be a non-empty list")
+        U = parse_vectors(index, vectors, "vectors")
+        order, scores = index.topk_batch(U, k, filters=filters, boost=boost)
+        return {"results": [results_json(index, o, s) for o, s in zip(order, scores)]}
+    if "vector" not in payload:
+        raise RequestError("missing 'vector'")
+    order, scores = index.topk(parse_vector(index, payload["vector"]), k, filters=filters, boost=boost)
+    return {"results": results_json(index, order, scores)}
+
+
+def group(index, payload):
+    """{"users": [[...], ...]}, optional "k"; same outputs as the GUI.
+
+    Large audiences: "per_user": false skips the per-user lists and the
+    pairwise matrix is only returned for small groups unless "pairwise"
+    is set explicitly. "strategy" ranks the group list: mean (default),
+    average, least_misery, most_pleasure, borda or fairness.
+    """
+    k = parse_k(payload)
+    strategy = payload.get("strategy", "mean")
+    if strategy not in STRATEGIES:
+        raise RequestError(f"strategy must be one of {', '.join(STRATEGIES)}")
+    per_user = parse_flag(payload, "per_user", True)
+    pairwise = parse_flag(payload, "pairwise")
+    users = payload.get("users")
+    if not isinstance(users, list) or not users:
+        raise RequestError("users must be a non-empty list of vectors")
+    U = parse_vectors(index, users, "users")
+    result = index.group(U, k, per_user=per_user, pairwise=pairwise, strategy=strategy)
+    out = {
+        "strategy": strategy,
+        "group": results_json(index, result["group_idx"], result["group_sim"]),
+        "consensus": round(result["consensus"], 6),
+        "user_to_group": np.round(result["user_to_group"].astype(float), 6).tolist(),
+        "mean_user_to_group": round(result["mean_user_to_group"], 6),
+    }
+    if result["per_user_idx"] is not None:
+        out["per_user"] = [results_json(index, o, s) for o, s in zip(result["per_user_idx"], result["per_user_sim"])]
+    if result["pairwise"] is not None:
+        out["pairwise"] = np.round(result["pairwise"].astype(float), 6).tolist()
+    return out
+
+
+def find_movie(index, payload):
+    """Row index for {"id": n} or {"title": ..., optional "year"}."""
+    if "id" in payload:
+        try:
+            i = int(payload["id"])
+        except (TypeError, ValueError):
+            raise RequestError("id must be an integer")
+        if not 0 <= i < len(index):
+            raise RequestError(f"id out of range (0-{len(index) - 1})")
+        if index.deleted is not None and index.deleted[i]:
+            raise RequestError(f"movie {i} was deleted")
+        return i
+    title = payload.get("title")
+    if not title:
+        raise RequestError("pass 'id' or 'title'")
+    matches = index.find_title(title)
+    if "year" in payload and matches.size:
+        try:
+            year = int(payload["year"])
+        except (TypeError, ValueError):
+            raise RequestError("year must be an integer")
+        matches = matches[index.df["year"].to_numpy()[matches] == year]
+    if not matches.size:
+        raise RequestError(f"movie not found: {title}")
+    return int(matches[0])
+
+
+def similar(index, payload):
+    """Movies whose emotion profile is closest to a given movie.
+
+    Read from the precomputed neighbour table when one is attached and
+    holds k neighbours that are not deleted (O(1)); otherwise scored
+    against the catalog.
+    """
+    k = parse_k(payload)
+    i = find_movie(index, payload)
+    table = index.neighbors
+    if table is not None and k <= table.k:
+        order, scores = table.lookup(i)
+        if index.deleted is not None:
+            keep = ~index.deleted[order]
+            order, scores = order[keep], scores[keep]
+        if len(order) >= k:
+            return {"movie": movie_json(index, i, 1.0), "results": results_json(index, order[:k], scores[:k])}
+    order, scores = index.topk(np.asarray(index.movie_unit[i]), k + 1)
+    keep = order != i
+    return {"movie": movie_json(index, i, 1.0), "results": results_json(index, order[keep][:k], scores[keep][:k])}
@@ -0,0 +1,70 @@
+"""Bounded LRU cache for top-k results
+
+Slider UIs send quantized values (0-10 in 0.5 steps, default 5.0 everywhere),
+so many requests carry identical or near-identical vectors. `EmotionIndex`
+keys results on the user vector quantized to `step` plus k and any filter
+spec; the cache lives on the index, so reloading the catalog (a new index)
+or rebuilding its ANN index starts from an empty cache.
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def quantize(vec, step):
+    """Hashable key for a vector rounded to a grid of size `step`."""
+    return np.round(np.asarray(vec, dtype=np.float64) / step).astype(np.int32).tobytes()
+
+
+class ResultCache:
+    """Thread-safe LRU mapping with hit/miss/eviction counters."""
+
+    def __init__(self, max_entries=4096, step=1e-3):
+        self.max_entries = max_entries
+        self.step = step
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def key(self, vec, *parts):
+        return (quantize(vec, self.step),) + parts
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,160 @@
+"""Incremental re-scoring for one user while sliders move
+
+Moving one slider changes the user vector in a single dimension j, so every
+movie score changes by delta * column j of the movie matrix. `ScoreSession`
+keeps:
+- the dot scores of all movies for the last synced vector, plus the pending
+  per-dimension deltas (applied as one rank-r update when needed)
+- a pool of the best `pool` movies, whose scores are updated exactly on every
+  change (O(pool) per slider tick)
+- an upper bound on every movie outside the pool: its score at the last sync
+  is <= the (pool+1)-th best, and it can have grown by at most
+  sum_j max(delta_j * min_j, delta_j * max_j) over the column bounds
+
+While the k-th best pooled score stays above that bound the Top-k is exact
+without touching the catalog; otherwise the pending deltas are applied and
+the pool is re-selected from the movies scoring at least the weakest pooled
+one (one vectorized compare), falling back to a partial sort.
+"""
+
+import numpy as np
+
+# default number of pooled candidates; a larger pool widens the gap between
+# the k-th best and the outside bound, so fewer slider moves force a rescan
+POOL_SIZE = 256
+
+
+class ScoreSession:
+    """Live Top-k for one user vector of an `EmotionIndex`.
+
+    Scores are exact (no ANN) and match `index.topk(vector, k, exact=True)`.
+    Values may be any non-negative scale (e.g. 0-1 scaled sliders); an
+    all-zero vector is allowed while editing but cannot be ranked.
+    """
+
+    def __init__(self, index, user_vec, k=3, pool=None, filters=None):
+        self.index = index
+        self.k = k
+        self.pool_size = max(k, pool or POOL_SIZE)
+        self._columns = index.columns
+        self._lo, self._hi = index.column_bounds
+        # filtered-out and deleted movies score -inf
+        self._mask = index._query_mask(filters)
+        self.vector = np.zeros(len(index.emotions), dtype=np.float64)
+        self.rescans = 0
+        self.updates = 0
+        # float32 like the movie matrix: a sync streams M x 4 bytes
+        self._scores = np.zeros(len(index), dtype=np.float32)
+        self._pending = np.zeros_like(self.vector)
+        self._pool = None
+        self.update(user_vec)
+        self._sync()
+        self._select_pool()
+
+    def _dim(self, emotion):
+        if isinstance(emotion, str):
+            try:
+                return self.index.emotions.index(emotion)
+            except ValueError:
+                raise ValueError(f"unknown emotion {emotion!r}")
+        return int(emotion)
+
+    def set(self, emotion, value):
+        """Move one slider (`emotion` is a name or column index): rank-1 update."""
+        j = self._dim(emotion)
+        value = float(value)
+        if not np.isfinite(value) or value < 0:
+            raise ValueError("emotion values must be finite and >= 0")
+        delta = value - self.vector[j]
+        if delta == 0:
+            return
+        self.vector[j] = value
+        self._pending[j] += delta
+        self.updates += 1
+        if self._pool is not None:
+            self._pool_scores += delta * self._columns[j, self._pool]
+            self._slack += max(delta * self._lo[j], delta * self._hi[j])
+
+    def update(self, user_vec):
+        """Set several dimensions at once (a full vector of len(emotions))."""
+        vec = np.asarray(user_vec, dtype=np.float64)
+        if vec.shape != self.vector.shape:
+            raise ValueError(f"User vector must have {len(self.vector)} values, got shape {vec.shape}")
+        for j in np.flatnonzero(vec != self.vector):
+            self.set(j, vec[j])
+
+    def _sync(self):
+        """Apply the pending deltas to the full score vector (rank-r update)."""
+        changed = np.flatnonzero(self._pending)
+        if changed.size:
+            self._scores += self._pending[changed].astype(np.float32) @ self._columns[changed]
+            self._pending[changed] = 0.0
+        if self._mask is not None:
+            self._scores[~self._mask] = -np.inf
+
+    def _select_pool(self):
+        m = len(self._scores)
+        size = min(self.pool_size, m)
+        cand = None
+        if self._pool is not None and len(self._pool) == size < m:
+            # after a sync the old pool is exact: only movies scoring at least
+            # its weakest member can belong to the new pool
+            cut = self._scores[self._pool].min()
+            cand = np.flatnonzero(self._scores >= cut)
+            if len(cand) > 4 * size:
+                cand = None
+        if cand is not None:
+            order = np.argsort(-self._scores[cand], kind="stable")
+            self._pool = cand[order[:size]]
+            self._threshold = self._scores[cand[order[size]]] if len(cand) > size else cut
+        elif size < m:
+            part = np.argpartition(-self._scores, size)
+            self._pool = part[:size]
+            # best score outside the pool bounds every non-pooled movie
+            self._threshold = self._scores[part[size]]
+        else:
+            self._pool = np.arange(m)
+            self._threshold = -np.inf
+        self._pool_scores = self._scores[self._pool].astype(np.float64)
+        self._slack = 0.0
+        self.rescans += 1
+
+    def _scale(self):
+        if not self.index.normalize:
+            return 1.0
+        norm = np.linalg.norm(self.vector)
+        if norm == 0:
+            raise ValueError("User vector is zero")
+        return norm
+
+    def topk(self, k=None):
+        """(movie indices, scores) of the current Top-k, best first."""
+        k = self.k if k is None else k
+        scale = self._scale()
+        if len(self._pool) < min(k, len(self._scores)):
+            self.pool_size = max(self.pool_size, k)
+            self._sync()
+            self._select_pool()
+        order = np.argsort(-self._pool_scores, kind="stable")[:k]
+        if len(order) == k and self._pool_scores[order[-1]] < self._threshold + self._slack:
+            # an outside movie may have overtaken the pool: rescan
+            self._sync()
+            self._select_pool()
+            order = np.argsort(-self._pool_scores, kind="stable")[:k]
+        order = order[np.isfinite(self._pool_scores[order])]
+        return self._pool[order], (self._pool_scores[order] / scale).astype(np.float32)
+
+    def scores(self):
+        """Current similarity of every movie to the user vector."""
+        scale = self._scale()
+        self._sync()
+        return self._scores / scale
+
+    def refresh(self):
+        """Recompute all scores from scratch (drops accumulated rounding)."""
+        self._scores = self._columns.T @ self.vector.astype(np.float32)
+        self._pending[:] = 0.0
+        if self._mask is not None:
+            self._scores[~self._mask] = -np.inf
+        self._pool = None
+        self._select_pool()
@@ -1,20 +1,529 @@
-"""Minimal HTTP server to run the web app and load the dataset CSV.
+"""HTTP server for the web app and the recommendation JSON API.
 Run from project root: python server.py
 Then open http://localhost:8000
+
+Static files are served from the project root. JSON API (backed by
+`EmotionIndex`, see recommender_api.py):
+    POST /recommend  {"vector": [24 floats], "k": 3}  or {"vectors": [[...], ...]}
+    POST /group      {"users": [[24 floats], ...], "k": 3}
+    GET  /similar?title=Inception&k=5   (or POST {"id": 0, "k": 5})
+    GET  /poster?title=Inception&year=2010&w=185   302 to the poster thumbnail
+    GET  /thumbs/<digest>-<width>.jpg   thumbnails from poster_thumbs.py (immutable)
+    GET  /live?k=3&vector=5,5,...       Server-Sent Events: live Top-k
+    POST /live       {"id": "<session>", "set": {"joy": 7}}
+    POST /admin/reload                  rebuild the catalog index in the background
+    GET  /health
+
+Options: --port, --catalog (CSV or compiled .emx), --ann, --ann-recall, --matrix, --rerank,
+--neighbors, --cache-size, --workers, --watch, --admin-token, --thumbs,
+--no-browser
+
+Static files (static_assets.py) carry a strong content-hash ETag and
+Last-Modified with `Cache-Control: no-cache`, so a revisit revalidates and
+gets a bodyless 304. Text files (index.html, app.js, the catalog CSV, ...)
+are precompressed once per version with gzip, and brotli when installed, and
+picked by Accept-Encoding; large bodies go out with sendfile. The page and
+its script are prepared at startup, others on first use.
+
+Poster thumbnails are content-addressed (poster_thumbs.py), so they go out
+with a strong ETag and `Cache-Control: immutable`; a matching If-None-Match
+gets 304 without a body.
+
+Catalog updates go live without a restart: `--watch` polls the catalog file,
+and `POST /admin/reload` or SIGHUP reload on demand (see catalog_reload.py).
+The new index is built and warmed on a background thread and swapped in
+atomically; requests already running finish on the old one. With
+`--workers`, only the parent rebuilds; it shares the new matrices and
+replaces the workers with fresh forks (old ones drain and exit).
+
+`--workers N` (POSIX only) pre-forks N processes that accept on one shared
+listening socket. The emotion matrix is moved into shared memory (or stays
+memory-mapped from a .emx) before forking, so catalog memory does not grow
+with the worker count.
 """
+import argparse
+import hmac
 import http.server
+import json
+import multiprocessing
 import os
+import re
+import shutil
+import signal
+import threading
+import time
 import webbrowser
+from email.utils import parsedate_to_datetime
 from pathlib import Path
+from urllib.parse import parse_qsl, urlsplit
+
+import recommender_api
+from catalog_reload import CatalogReloader
+from emotion_index import DEFAULT_CSV, open_index
+from live_sessions import HEARTBEAT, LiveRegistry
+from poster_thumbs import MANIFEST, THUMB_DIR, PosterManifest
+from static_assets import StaticFiles, negotiate
 
 ROOT = Path(__file__).resolve().parent
-os.chdir(ROOT)
-handler = http.server.SimpleHTTPRequestHandler
-server = http.server.HTTPServer(("", 8000), handler)
-print("Serving at http://localhost:8000")
-print("Open http://localhost:8000 in your browser. Press Ctrl+C to stop.")
-try:
-    webbrowser.open("http://localhost:8000")
-except Exception:
-    pass
-server.serve_forever()
+MAX_BODY = 1 << 20
+# content-addressed thumbnail names (poster_thumbs.variant_name)
+THUMB_NAME = re.compile(r"[0-9a-f]{20}-[0-9]+\.jpg")
+IMMUTABLE = "public, max-age=31536000, immutable"
+# compressed copies of static text files (static_assets.py)
+STATIC_CACHE = ROOT / ".static_cache"
+# bodies at least this large go out with sendfile instead of write()
+SENDFILE_MIN = 64 * 1024
+# what the web app loads on every visit (it scores through the API; the
+# CSV is only its fallback without this server)
+WARM_FILES = ("index.html", "app.js")
+# seconds a retired prefork worker waits for its running requests
+RETIRE_GRACE = 5.0
+
+
+class RecommenderHandler(http.server.SimpleHTTPRequestHandler):
+    # HTTP/1.1 keeps connections alive between requests; without TCP_NODELAY
+    # the separate header/body writes stall ~40 ms on delayed ACKs
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    api_routes = {
+        "/recommend": recommender_api.recommend,
+        "/group": recommender_api.group,
+        "/similar": recommender_api.similar,
+    }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, directory=str(ROOT), **kwargs)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/health":
+            index = self.server.index
+            health = {"status": "ok", "movies": len(index)}
+            if index.cache is not None:
+                health["cache"] = index.cache.stats()
+            if self.server.live is not None:
+                health["live_sessions"] = len(self.server.live)
+            if self.server.reloader is not None:
+                health["catalog"] = self.server.reloader.status()
+            self._send_json(200, health)
+        elif url.path == "/similar":
+            self._call_api(url.path, dict(parse_qsl(url.query)))
+        elif url.path == "/live":
+            self._stream_live(dict(parse_qsl(url.query)))
+        elif url.path == "/poster":
+            self._poster_redirect(dict(parse_qsl(url.query)))
+        elif url.path.startswith("/thumbs/"):
+            self._send_thumb(url.path[len("/thumbs/"):])
+        else:
+            self._send_static()
+
+    def do_HEAD(self):
+        self._send_static(head=True)
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path == "/admin/reload":
+            self._admin_reload()
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            length = -1
+        known = url.path in self.api_routes or url.path == "/live"
+        if not known or not 0 < length <= MAX_BODY:
+            # body left unread: don't reuse the connection
+            self.close_connection = True
+        if not known:
+            self._send_json(404, {"error": f"unknown endpoint {url.path}"})
+            return
+        if not 0 < length <= MAX_BODY:
+            self._send_json(400 if length <= MAX_BODY else 413, {"error": "request body must be JSON (max 1 MB)"})
+            return
+        try:
+            payload = json.loads(self.rfile.read(length))
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            self._send_json(400, {"error": "invalid JSON"})
+            return
+        if not isinstance(payload, dict):
+            self._send_json(400, {"error": "request body must be a JSON object"})
+            return
+        self._call_api(url.path, payload)
+
+    def _call_api(self, route, payload):
+        try:
+            if route == "/live":
+                result = self._live_registry().update(payload)
+            else:
+                result = self.api_routes[route](self.server.index, payload)
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        self._send_json(200, result)
+
+    def _admin_reload(self):
+        # any request body is ignored
+        self.close_connection = True
+        token = self.server.admin_token
+        if token:
+            allowed = hmac.compare_digest(self.headers.get("X-Admin-Token", ""), token)
+        else:
+            allowed = self.client_address[0] in ("127.0.0.1", "::1")
+        if not allowed or self.server.reloader is None:
+            self._send_json(403, {"error": "reload needs X-Admin-Token (or a local client when no token is set)"})
+            return
+        if self.server.prefork:
+            # the parent rebuilds once and re-forks the workers from it
+            os.kill(os.getppid(), signal.SIGHUP)
+        else:
+            self.server.reloader.trigger()
+        self._send_json(202, {"status": "reloading", "version": self.server.index.version})
+
+    def _live_registry(self):
+        if self.server.live is None:
+            # sessions live in one process; updates could reach another worker
+            raise recommender_api.RequestError("live sessions need --workers 1")
+        return self.server.live
+
+    def _stream_live(self, params):
+        """Server-Sent Events: one `session` event with the id, then a `topk`
+        event per (coalesced) batch of slider moves until the client leaves."""
+        try:
+            registry = self._live_registry()
+            live = registry.open(self.server.index, params)
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        # no Content-Length: the stream ends when the connection closes
+        self.close_connection = True
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        try:
+            self._send_event("session", {"id": live.id, "k": live.k})
+            self._send_event("topk", live.snapshot())
+            while not live.closed:
+                if live.wait(HEARTBEAT):
+                    self._send_event("topk", live.apply())
+                else:
+                    # comment line: keeps proxies from timing out, detects disconnects
+                    self.wfile.write(b": ping\n\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            registry.close(live)
+
+    def _poster_redirect(self, params):
+        """302 to the thumbnail of ?title=...&year=...&w=... (smallest
+        variant at least w px wide)."""
+        try:
+            year = int(params["year"]) if params.get("year") else None
+            width = int(params["w"]) if params.get("w") else None
+        except ValueError:
+            self._send_json(400, {"error": "year and w must be integers"})
+            return
+        name = None
+        if self.server.posters is not None and params.get("title"):
+            name = self.server.posters.lookup(params["title"], year, width)
+        if name is None:
+            self._send_json(404, {"error": "no poster for that title"})
+            return
+        self.send_response(302)
+        self.send_header("Location", f"/thumbs/{name}")
+        # the manifest can be rebuilt; the thumbnail itself is immutable
+        self.send_header("Cache-Control", "max-age=300")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _send_thumb(self, name):
+        posters = self.server.posters
+        if posters is not None and name == MANIFEST:
+            path = os.path.join(posters.dir, MANIFEST)
+            try:
+                st = os.stat(path)
+            except OSError:
+                self._send_json(404, {"error": "no poster manifest"})
+                return
+            self._send_file(path, "application/json", f'"{st.st_mtime_ns:x}-{st.st_size:x}"', "no-cache")
+        elif posters is not None and THUMB_NAME.fullmatch(name) and os.path.isfile(os.path.join(posters.dir, name)):
+            self._send_file(os.path.join(posters.dir, name), "image/jpeg", f'"{name[:-4]}"', IMMUTABLE)
+        else:
+            self._send_json(404, {"error": "unknown thumbnail"})
+
+    def _send_static(self, head=False):
+        """A file under ROOT in the encoding Accept-Encoding prefers, with
+        ETag / Last-Modified revalidation. Directory listings, redirects and
+        404s are left to SimpleHTTPRequestHandler."""
+        path = self.translate_path(self.path)
+        if os.path.isdir(path) and urlsplit(self.path).path.endswith("/"):
+            path = os.path.join(path, "index.html")
+        asset = self.server.static.get(path, self.guess_type(path))
+        if asset is None:
+            if head:
+                super().do_HEAD()
+            else:
+                super().do_GET()
+            return
+        encoding, (body, _, etag) = negotiate(asset, self.headers.get("Accept-Encoding"))
+        vary = "Accept-Encoding" if len(asset.variants) > 1 else None
+        self._send_file(body, asset.content_type, etag, "no-cache", encoding=encoding, vary=vary,
+                        mtime=asset.mtime, head=head)
+
+    def _not_modified(self, etag, mtime=None):
+        """True (after sending 304) if If-None-Match lists `etag`, or there
+        is no If-None-Match and If-Modified-Since is not before `mtime`."""
+        tags = self.headers.get("If-None-Match")
+        if tags is not None:
+            # weak comparison, as RFC 9110 requires for If-None-Match
+            if tags.strip() != "*" and etag.removeprefix("W/") not in (t.strip().removeprefix("W/") for t in tags.split(",")):
+                return False
+        elif mtime is not None and self.headers.get("If-Modified-Since"):
+            try:
+                since = parsedate_to_datetime(self.headers["If-Modified-Since"]).timestamp()
+            except (TypeError, ValueError, IndexError, OverflowError):
+                return False
+            # HTTP dates have whole seconds
+            if int(mtime) > since:
+                return False
+        else:
+            return False
+        self.send_response(304)
+        self.send_header("ETag", etag)
+        return True
+
+    def _send_file(self, path, content_type, etag, cache_control, encoding=None, vary=None, mtime=None, head=False):
+        """200 with the file (or 304 on a matching If-None-Match /
+        If-Modified-Since). `path` holds the bytes as sent, already
+        compressed when `encoding` is set."""
+        if self._not_modified(etag, mtime):
+            self.send_header("Cache-Control", cache_control)
+            if vary:
+                self.send_header("Vary", vary)
+            self.end_headers()
+            return
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(size))
+            if encoding:
+                self.send_header("Content-Encoding", encoding)
+            if vary:
+                self.send_header("Vary", vary)
+            self.send_header("ETag", etag)
+            if mtime is not None:
+                self.send_header("Last-Modified", self.date_time_string(mtime))
+            self.send_header("Cache-Control", cache_control)
+            self.end_headers()
+            if head:
+                return
+            if size >= SENDFILE_MIN:
+                # end_headers() has flushed; the kernel copies file -> socket
+                self.connection.sendfile(f)
+            else:
+                shutil.copyfileobj(f, self.wfile)
+
+    def _send_event(self, event, obj):
+        self.wfile.write(f"event: {event}\ndata: {json.dumps(obj)}\n\n".encode("utf-8"))
+
+    def _send_json(self, status, obj):
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class RecommenderServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, index, handler=RecommenderHandler):
+        self.index = index
+        self.live = LiveRegistry()
+        # set up by main(): catalog hot reload and its admin token
+        self.reloader = None
+        self.admin_token = None
+        self.prefork = False
+        # PosterManifest for /poster and /thumbs, set by main()
+        self.posters = None
+        self.static = StaticFiles(str(STATIC_CACHE))
+        super().__init__(address, handler)
+
+
+def _worker(server):
+    # the parent handles Ctrl+C and stops workers with SIGTERM
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda *_: os._exit(0))
+    if hasattr(signal, "SIGHUP"):
+        # retire: the parent has forked workers with a newer catalog; stop
+        # accepting (shutdown() must not run on the serving thread)
+        signal.signal(signal.SIGHUP, lambda *_: threading.Thread(target=server.shutdown, daemon=True).start())
+    server.serve_forever()
+    # let requests already accepted finish (idle keep-alive connections
+    # are dropped after RETIRE_GRACE; clients retry on a new one)
+    deadline = time.monotonic() + RETIRE_GRACE
+    while threading.active_count() > 1 and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+
+def _release(blocks):
+    for block in blocks:
+        try:
+            block.close()
+        except BufferError:
+            # an index object still has views on it; unlink frees the
+            # memory once the last mapping goes away
+            pass
+        block.unlink()
+
+
+def serve_prefork(server, workers):
+    """Run `workers` forked processes on the already-bound `server` socket.
+
+    Workers that die are restarted; Ctrl+C or SIGTERM stops them all.
+    Catalog reloads (SIGHUP, --watch, /admin/reload) run only in this
+    process: the new index is built once, moved into shared memory, and a
+    new set of workers is forked from it while the old ones finish their
+    requests and exit, so memory and reload work do not grow with the
+    worker count.
+    """
+    ctx = multiprocessing.get_context("fork")
+    blocks = server.index.share_memory()
+    # a live session's updates must reach the worker holding its stream
+    server.live = None
+    server.prefork = True
+
+    def spawn():
+        proc = ctx.Process(target=_worker, args=(server,), daemon=True)
+        proc.start()
+        return proc
+
+    procs = [spawn() for _ in range(workers)]
+    # (workers, shared blocks) of older catalogs, freed once they exit
+    retiring = []
+
+    def reload_all(*_):
+        # builds on a background thread; the loop below swaps the workers
+        if server.reloader is not None:
+            server.reloader.trigger()
+
+    signal.signal(signal.SIGHUP, reload_all)
+    # treat SIGTERM (service managers) like Ctrl+C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    current = server.index
+    try:
+        while True:
+            if server.index is not current:
+                # forked from the main thread, never from the reload thread
+                current = server.index
+                old, old_blocks = procs, blocks
+                blocks = current.share_memory()
+                procs = [spawn() for _ in range(workers)]
+                for proc in old:
+                    if proc.is_alive():
+                        os.kill(proc.pid, signal.SIGHUP)
+                retiring.append((old, old_blocks))
+                print(f"Workers restarted on catalog version {current.version}")
+            for i, proc in enumerate(procs):
+                proc.join(timeout=1.0 / workers)
+                if not proc.is_alive():
+                    print(f"Worker {proc.pid} exited ({proc.exitcode}), restarting")
+                    procs[i] = spawn()
+            for entry in list(retiring):
+                if not any(proc.is_alive() for proc in entry[0]):
+                    _release(entry[1])
+                    retiring.remove(entry)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        everyone = procs + [proc for old, _ in retiring for proc in old]
+        for proc in everyone:
+            proc.terminate()
+        for proc in everyone:
+            proc.join()
+        _release(blocks)
+        for _, old_blocks in retiring:
+            _release(old_blocks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--catalog", default=DEFAULT_CSV, help="catalog CSV or compiled .emx")
+    parser.add_argument("--ann", help="saved IVF index (.npz from ann_index.py) to attach to the catalog; "
+                        "approximate: its sampled recall@10 is printed at startup")
+    parser.add_argument("--ann-recall", type=float,
+                        help="re-pick the IVF n_probe for this sampled recall@10 (0-1] at startup "
+                             "(default: as saved; higher is slower)")
+    parser.add_argument("--matrix", choices=("float32", "int8"),
+                        help="scan a reduced-precision copy of the emotion matrix (see quant_index.py)")
+    parser.add_argument("--rerank", type=int, help="candidates per result re-scored in full precision (default 4, 0: off)")
+    parser.add_argument("--neighbors", help="neighbour table (.npz from neighbor_table.py) used by /similar")
+    parser.add_argument("--cache-size", type=int, default=4096, help="LRU result cache entries (0 disables)")
+    parser.add_argument("--workers", type=int, default=1, help="pre-forked worker processes (POSIX only)")
+    parser.add_argument("--watch", action="store_true", help="reload the catalog when its file changes")
+    parser.add_argument("--admin-token", help="token for POST /admin/reload (default: local clients only)")
+    parser.add_argument("--thumbs", default=THUMB_DIR, help="poster thumbnail directory (from poster_thumbs.py)")
+    parser.add_argument("--no-browser", action="store_true")
+    args = parser.parse_args()
+    if args.workers > 1 and not hasattr(os, "fork"):
+        parser.error("--workers needs os.fork (not available on this platform)")
+
+    index = open_index(args.catalog)
+    if args.ann_recall is not None and not (args.ann and 0 < args.ann_recall <= 1):
+        parser.error("--ann-recall needs --ann and a value in (0, 1]")
+    if args.ann:
+        ann = index.load_ann(args.ann)
+        if args.ann_recall is not None:
+            ann.tune(args.ann_recall)
+        elif ann.recall is None:
+            ann.recall = ann.measure_recall()
+        print(f"ANN index {args.ann}: {ann.n_probe} of {ann.n_lists} lists probed, "
+              f"sampled recall@10 {ann.recall:.3f} (leave out --ann for exact scans)")
+    if args.matrix:
+        index.quantize(args.matrix, args.rerank)
+    if args.neighbors:
+        try:
+            index.load_neighbors(args.neighbors)
+        except (OSError, ValueError) as e:
+            parser.error(f"--neighbors: {e}")
+    index.enable_cache(args.cache_size)
+    server = RecommenderServer(("", args.port), index)
+    server.reloader = CatalogReloader(server, args.catalog)
+    server.admin_token = args.admin_token
+    server.posters = PosterManifest(args.thumbs)
+    # compress what every page load fetches before the first visitor (and
+    # before forking, so workers share the prepared assets)
+    server.static.warm([str(ROOT / name) for name in WARM_FILES])
+    if hasattr(signal, "SIGHUP"):
+        # SIGHUP (and --watch) reload through the same path as in prefork mode
+        signal.signal(signal.SIGHUP, lambda *_: server.reloader.trigger())
+        on_change = lambda: os.kill(os.getpid(), signal.SIGHUP)
+    else:
+        on_change = server.reloader.trigger
+    if args.watch:
+        server.reloader.watch(on_change=on_change)
+    url = f"http://localhost:{args.port}"
+    print(f"Serving at {url} ({len(index)} movies, {args.workers} worker{'s' if args.workers > 1 else ''})")
+    print(f"Open {url} in your browser. Press Ctrl+C to stop.")
+    if not args.no_browser:
+        try:
+            webbrowser.open(url)
+        except Exception:
+            pass
+    try:
+        if args.workers > 1:
+            serve_prefork(server, args.workers)
+        else:
+            server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""Blocked all-pairs cosine similarity over the catalog
+
+    python similarity_pairs.py datasets/movies_dataset_500_souj.csv --threshold 0.99 --out pairs.csv --groups
+    python similarity_pairs.py big.emx --threshold 0.95 --out pairs.bin --workers 16
+
+Writes every pair of movies (i < j) whose emotion profiles have cosine >=
+`threshold`, for near-duplicate detection and cluster analytics, without the
+dense M x M matrix:
+- the unit rows are ordered by a two-level spherical k-means (ann_index.py)
+  into leaves of about `LEAF_ROWS` similar rows; each leaf gets a bounding
+  cone (center and widest angle of its rows)
+- two leaves whose cones are further apart than the threshold allows cannot
+  hold a qualifying pair and are never scored; the reachable leaves of a
+  leaf are merged into contiguous column spans, so a catalog without
+  structure degrades to plain row-block GEMMs
+- tasks (runs of leaves, `TASK_ROWS` rows) go to a `ProcessPoolExecutor`
+  whose workers read the matrix from one shared memory copy and return only
+  the pairs above the threshold
+- results are written as they arrive (a bounded number of tasks in flight),
+  as CSV (`i,j,score`) or, for other extensions, raw `PAIR_DTYPE` records
+  (`np.fromfile(path, PAIR_DTYPE)`)
+
+`--groups` also prints the connected groups of movies (union-find over the
+streamed pairs), e.g. the clusters of identical vectors in the sample CSV.
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from emotion_index import SCORE_BLOCK, _to_shared
+
+DEFAULT_THRESHOLD = 0.99
+# target rows per k-means leaf (smaller leaves: tighter cones, more overhead)
+LEAF_ROWS = 64
+# rows of leaves per pool task
+TASK_ROWS = 4096
+PAIR_DTYPE = np.dtype([("i", "<i4"), ("j", "<i4"), ("score", "<f4")])
+# groups listed by --groups
+SHOW_GROUPS = 20
+
+# per-process scoring context (matrix, leaf bounds, cones), see _attach_worker
+_CONTEXT = {}
+
+
+def cluster_order(matrix, leaf_rows=LEAF_ROWS, seed=0):
+    """(row order, leaf bounds): rows grouped into leaves of similar rows by
+    a coarse k-means pass and a second pass inside each coarse cluster."""
+    from ann_index import _assign, spherical_kmeans
+    m = len(matrix)
+    n_coarse = max(1, int(np.sqrt(m / leaf_rows)))
+    if n_coarse == 1:
+        groups = [np.arange(m)]
+    else:
+        centroids = spherical_kmeans(matrix, n_coarse, n_iter=5, train_size=64 * n_coarse, seed=seed)
+        labels = _assign(matrix, centroids)
+        order = np.argsort(labels, kind="stable")
+        groups = np.split(order, np.cumsum(np.bincount(labels, minlength=n_coarse))[:-1])
+    order, sizes = [], []
+    for rows in groups:
+        n_leaves = len(rows) // leaf_rows
+        if n_leaves <= 1:
+            order.append(rows)
+            sizes.append(len(rows))
+            continue
+        centroids = spherical_kmeans(matrix[rows], n_leaves, n_iter=5, seed=seed)
+        labels = _assign(matrix[rows], centroids)
+        order.append(rows[np.argsort(labels, kind="stable")])
+        sizes.extend(np.bincount(labels, minlength=n_leaves).tolist())
+    sizes = np.array([s for s in sizes if s], dtype=np.int64)
+    return np.concatenate(order), np.concatenate([[0], np.cumsum(sizes)])
+
+
+def leaf_cones(matrix, bounds):
+    """(unit centers, half-angles) of the rows of each leaf."""
+    centers = np.empty((len(bounds) - 1, matrix.shape[1]), dtype=np.float64)
+    angles = np.empty(len(bounds) - 1, dtype=np.float64)
+    for t in range(len(bounds) - 1):
+        rows = matrix[bounds[t]:bounds[t + 1]].astype(np.float64)
+        center = rows.sum(axis=0)
+        norm = np.linalg.norm(center)
+        if norm == 0:
+            centers[t], angles[t] = center, np.pi
+            continue
+        centers[t] = center / norm
+        angles[t] = np.arccos(np.clip((rows @ centers[t]).min(), -1.0, 1.0))
+    return centers, angles
+
+
+def _attach_worker(name, shape, dtype, bounds, centers, angles):
+    from multiprocessing import shared_memory
+    block = shared_memory.SharedMemory(name=name)
+    _CONTEXT.update(block=block, matrix=np.ndarray(shape, dtype=dtype, buffer=block.buf),
+                    bounds=bounds, centers=centers, angles=angles)
+
+
+def _leaf_spans(s, threshold, bounds, centers, angles):
+    """Column spans [c0, c1) of the leaves t >= s that may hold a pair with
+    leaf s at cosine >= threshold (consecutive leaves merged)."""
+    between = np.arccos(np.clip(centers[s:] @ centers[s], -1.0, 1.0))
+    # best cosine a row of leaf s and a row of leaf t can reach
+    reach = np.cos(np.maximum(0.0, between - angles[s] - angles[s:]))
+    leaves = np.flatnonzero(reach >= threshold - 1e-6) + s
+    if not leaves.size:
+        return []
+    runs = np.split(leaves, np.flatnonzero(np.diff(leaves) > 1) + 1)
+    return [(int(bounds[run[0]]), int(bounds[run[-1] + 1])) for run in runs]
+
+
+def _leaves_pairs(s0, s1, threshold, context=None):
+    """Pairs (row, row, score), row < row, with score >= threshold between the
+    rows of leaves [s0, s1) and the rows of all later positions."""
+    ctx = context or _CONTEXT
+    matrix, bounds = ctx["matrix"], ctx["bounds"]
+    out_i, out_j, out_s, scored = [], [], [], 0
+    for s in range(s0, s1):
+        a0, a1 = int(bounds[s]), int(bounds[s + 1])
+        step = max(1, SCORE_BLOCK // max(1, a1 - a0))
+        for c0, c1 in _leaf_spans(s, threshold, bounds, ctx["centers"], ctx["angles"]):
+            for b0 in range(c0, c1, step):
+                b1 = min(b0 + step, c1)
+                sim = matrix[a0:a1] @ matrix[b0:b1].T
+                scored += sim.size
+                flat = np.flatnonzero(sim >= threshold)
+                rows, cols = np.divmod(flat, b1 - b0)
+                rows, cols = rows + a0, cols + b0
+                keep = cols > rows
+                out_i.append(rows[keep].astype(np.int32))
+                out_j.append(cols[keep].astype(np.int32))
+                out_s.append(sim.reshape(-1)[flat[keep]])
+    if not out_i:
+        empty = np.empty(0, dtype=np.int32)
+        return empty, empty, np.empty(0, dtype=np.float32), scored
+    return np.concatenate(out_i), np.concatenate(out_j), np.concatenate(out_s), scored
+
+
+def all_pairs(matrix, threshold=DEFAULT_THRESHOLD, workers=None, on_pairs=None, leaf_rows=LEAF_ROWS):
+    """Call `on_pairs(i, j, score)` with chunks of all pairs i < j of the unit
+    `matrix` with cosine >= threshold. Returns {"scored", "total"} (scores
+    computed vs the M (M - 1) / 2 pairs of a dense pass)."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    m = len(matrix)
+    order, bounds = cluster_order(matrix, leaf_rows)
+    ordered = np.ascontiguousarray(matrix[order])
+    centers, angles = leaf_cones(ordered, bounds)
+    # tasks: runs of whole leaves with about TASK_ROWS rows each
+    cuts = np.searchsorted(bounds, np.arange(0, m, TASK_ROWS), side="right") - 1
+    cuts = np.unique(np.concatenate([cuts, [len(bounds) - 1]]))
+    tasks = list(zip(cuts[:-1].tolist(), cuts[1:].tolist()))
+    stats = {"scored": 0, "total": m * (m - 1) // 2}
+
+    def emit(result):
+        i, j, score, scored = result
+        stats["scored"] += scored
+        if len(i):
+            i, j = order[i], order[j]
+            on_pairs(np.minimum(i, j), np.maximum(i, j), score)
+
+    workers = min(workers or 1, len(tasks))
+    if workers <= 1:
+        context = {"matrix": ordered, "bounds": bounds, "centers": centers, "angles": angles}
+        for task in tasks:
+            emit(_leaves_pairs(*task, threshold, context))
+        return stats
+    block, shared = _to_shared(ordered)
+    del ordered
+    try:
+        with ProcessPoolExecutor(workers, initializer=_attach_worker,
+                                 initargs=(block.name, shared.shape, shared.dtype, bounds, centers, angles)) as pool:
+            pending, queue = set(), iter(tasks)
+            while True:
+                # keep a few tasks per worker in flight so results never pile up
+                for task in queue:
+                    pending.add(pool.submit(_leaves_pairs, *task, threshold))
+                    if len(pending) >= 2 * workers:
+                        break
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    emit(future.result())
+    finally:
+        block.close()
+        block.unlink()
+    return stats
+
+
+class PairWriter:
+    """Streams pairs to a CSV (`i,j,score`) or raw PAIR_DTYPE file."""
+
+    def __init__(self, path):
+        self.text = path == "-" or path.endswith(".csv")
+        if path == "-":
+            self.f = sys.stdout
+        else:
+            self.f = open(path, "w" if self.text else "wb")
+        if self.text:
+            self.f.write("i,j,score\n")
+        self.count = 0
+
+    def write(self, i, j, score):
+        if self.text:
+            self.f.writelines(f"{a},{b},{s:.6f}\n" for a, b, s in zip(i.tolist(), j.tolist(), score.tolist()))
+        else:
+            records = np.empty(len(i), dtype=PAIR_DTYPE)
+            records["i"], records["j"], records["score"] = i, j, score
+            self.f.write(records.tobytes())
+        self.count += len(i)
+
+    def close(self):
+        if self.f is not sys.stdout:
+            self.f.close()
+
+
+class Groups:
+    """Union-find over movie ids, fed with pair chunks."""
+
+    def __init__(self, m):
+        self.parent = np.arange(m, dtype=np.int64)
+
+    def find(self, x):
+        root = x
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[x] != root:
+            self.parent[x], x = root, self.parent[x]
+        return root
+
+    def union(self, i, j):
+        for a, b in zip(i.tolist(), j.tolist()):
+            ra, rb = self.find(a), self.find(b)
+            if ra != rb:
+                self.parent[max(ra, rb)] = min(ra, rb)
+
+    def groups(self):
+        """Groups with more than one movie, largest first."""
+        roots = np.array([self.find(x) for x in range(len(self.parent))], dtype=np.int64)
+        order = np.argsort(roots, kind="stable")
+        cuts = np.flatnonzero(np.diff(roots[order])) + 1
+        found = [g for g in np.split(order, cuts) if len(g) > 1]
+        return sorted(found, key=len, reverse=True)
+
+
+def main(argv=None):
+    from emotion_index import open_index
+    parser = argparse.ArgumentParser(description="Stream all movie pairs above a cosine threshold")
+    parser.add_argument("catalog", help="catalog CSV or compiled .emx")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--out", default="-", help="pairs .csv, raw records (any other extension) or - for stdout")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--groups", action="store_true", help="print groups of connected movies")
+    args = parser.parse_args(argv)
+    if not -1.0 <= args.threshold <= 1.0:
+        sys.exit("--threshold must be between -1 and 1")
+
+    index = open_index(args.catalog)
+    unit = index.movie_unit if index.normalize else index.movie_unit / index.norms[:, None]
+    live = None if index.deleted is None else np.flatnonzero(~index.deleted)
+    if live is not None:
+        unit = unit[live]
+    writer = PairWriter(args.out)
+    groups = Groups(len(unit)) if args.groups else None
+
+    def on_pairs(i, j, score):
+        if groups is not None:
+            groups.union(i, j)
+        if live is not None:
+            i, j = live[i], live[j]
+        writer.write(i, j, score)
+
+    start = time.perf_counter()
+    try:
+        stats = all_pairs(unit, args.threshold, args.workers, on_pairs)
+    finally:
+        writer.close()
+    # the summary goes to stderr so `--out -` stays a clean CSV
+    log = sys.stderr
+    print(f"{writer.count} pairs with cosine >= {args.threshold} among {len(unit)} movies "
+          f"({stats['scored'] / max(1, stats['total']):.1%} of all pairs scored, "
+          f"{time.perf_counter() - start:.1f} s)", file=log)
+    if groups is not None:
+        found = groups.groups()
+        print(f"{len(found)} groups, {sum(len(g) for g in found)} movies", file=log)
+        titles = index.df["title"].tolist() if "title" in index.df.columns else None
+        for g in found[:SHOW_GROUPS]:
+            ids = g if live is None else live[g]
+            names = [str(titles[i]) for i in ids[:5]] if titles else [str(i) for i in ids[:5]]
+            print(f"  {len(g):>5}  {', '.join(names)}{', ...' if len(g) > 5 else ''}", file=log)
+
+
+if __name__ == "__main__":
+    main()
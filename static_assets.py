@@ -0,0 +1,158 @@
+"""Precompressed static files with strong validators for server.py
+
+`StaticFiles.get(path)` returns the `Asset` for a file under the web root:
+- a strong ETag from the SHA-256 of the content, and the mtime for
+  Last-Modified
+- for text types (HTML, JS, CSS, CSV, JSON, SVG) of at least
+  `MIN_COMPRESS` bytes, gzip and (when the `brotli` package is installed)
+  brotli copies, each with its own ETag, written once to `cache_dir` under
+  their content hash, so restarts and pre-forked workers reuse them and
+  every representation can go out with `sendfile`
+Assets are rebuilt when the file's mtime / size / inode change (one `stat`
+per request); `warm` builds them at startup and drops stale copies.
+
+`negotiate` picks the representation for an Accept-Encoding header
+(brotli, then gzip, then identity; q=0 excludes a coding).
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIN_COMPRESS = 1024
+COMPRESSIBLE = {"application/javascript", "text/javascript", "application/json", "image/svg+xml", "text/csv"}
+# preference order when the client accepts several codings equally
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+
+
+def compressible(content_type):
+    return content_type.startswith("text/") or content_type in COMPRESSIBLE
+
+
+def _compress(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    # mtime=0: the same input always gives the same bytes
+    return gzip.compress(data, GZIP_LEVEL, mtime=0)
+
+
+class Asset:
+    """One file: its representations as encoding -> (path, size, etag)."""
+
+    def __init__(self, path, stamp, content_type, digest, mtime):
+        self.path = path
+        self.stamp = stamp
+        self.content_type = content_type
+        self.mtime = mtime
+        self.etag = f'"{digest}"'
+        self.variants = {None: (path, stamp[1], self.etag)}
+
+
+class StaticFiles:
+    """Per-path `Asset` cache with on-disk compressed copies."""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self._assets = {}
+        self._lock = threading.Lock()
+
+    def get(self, path, content_type=None):
+        """Current `Asset` of a regular file, or None if it is not one."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if not os.path.isfile(path):
+            return None
+        stamp = (st.st_mtime_ns, st.st_size, st.st_ino)
+        asset = self._assets.get(path)
+        if asset is not None and asset.stamp == stamp:
+            return asset
+        with self._lock:
+            asset = self._assets.get(path)
+            if asset is None or asset.stamp != stamp:
+                asset = self._build(path, stamp, content_type or mimetypes.guess_type(path)[0]
+                                    or "application/octet-stream", st.st_mtime)
+                self._assets[path] = asset
+        return asset
+
+    def _build(self, path, stamp, content_type, mtime):
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            if not (compressible(content_type) and stamp[1] >= MIN_COMPRESS):
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    h.update(block)
+                return Asset(path, stamp, content_type, h.hexdigest()[:32], mtime)
+            data = f.read()
+        h.update(data)
+        digest = h.hexdigest()[:32]
+        asset = Asset(path, stamp, content_type, digest, mtime)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        for encoding in ENCODINGS:
+            out = os.path.join(self.cache_dir, f"{digest}.{encoding}")
+            if not os.path.exists(out):
+                tmp = f"{out}.{os.getpid()}.tmp"
+                with open(tmp, "wb") as f:
+                    f.write(_compress(data, encoding))
+                # atomic rename: other workers never see a partial copy
+                os.replace(tmp, out)
+            size = os.path.getsize(out)
+            # a copy that does not shrink the file is not worth a decode
+            if size < stamp[1]:
+                asset.variants[encoding] = (out, size, f'"{digest}-{encoding}"')
+        return asset
+
+    def warm(self, paths, prune=True):
+        """Build (and compress) the assets of existing `paths` now. With
+        `prune`, compressed copies of other files or older versions are
+        deleted (other files are compressed again on first request)."""
+        for path in paths:
+            self.get(path)
+        if not prune or not os.path.isdir(self.cache_dir):
+            return
+        keep = {os.path.basename(v[0]) for asset in self._assets.values() for v in asset.variants.values()}
+        for name in os.listdir(self.cache_dir):
+            if name not in keep:
+                os.remove(os.path.join(self.cache_dir, name))
+
+
+def accepted_encodings(header):
+    """Coding -> q from an Accept-Encoding header (absent: identity only)."""
+    accepted = {}
+    for part in (header or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def negotiate(asset, header):
+    """(encoding or None for identity, (path, size, etag)) to send."""
+    accepted = accepted_encodings(header)
+    best, best_q = None, 0.0
+    for encoding in ENCODINGS:
+        if encoding not in asset.variants:
+            continue
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best, asset.variants[best]
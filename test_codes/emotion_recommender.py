@@ -1,5 +1,12 @@
-import math
-from collections import defaultdict
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from emotion_index import EmotionIndex
+from emotion_vocab import Vocabulary
 
 # ============================================================
 # 1. BASE EMOTIONS (GROUND TRUTH)
@@ -153,29 +160,24 @@ MOVIES = [
 ]
 
 # ============================================================
-# 5. VECTOR UTILITIES
+# 5. TERMS → EMOTION VECTOR (compiled once, see emotion_vocab.py)
 # ============================================================
 
-def normalize(vec):
-    total = sum(vec.values())
-    if total == 0:
-        return vec
-    return {k: v / total for k, v in vec.items()}
-
-def dot_product(v1, v2):
-    return sum(v1[e] * v2.get(e, 0) for e in v1)
-
-def cosine_similarity(v1, v2):
-    num = dot_product(v1, v2)
-    den = math.sqrt(dot_product(v1, v1)) * math.sqrt(dot_product(v2, v2))
-    return num / den if den else 0.0
+# a cluster spreads its weight evenly over its emotions ("redemption" has
+# no column in this space)
+VOCAB = Vocabulary(
+    BASE_EMOTIONS,
+    intents=INTENTS,
+    clusters={c: {e: 1 / len(es) for e in es if e in BASE_EMOTIONS} for c, es in EMOTION_CLUSTERS.items()},
+    aliases={},
+)
 
 # ============================================================
 # 6. USER INPUT → EMOTION VECTOR
 # ============================================================
 
 def build_user_vector():
-    user_vec = defaultdict(float)
+    mix = []
 
     print("\n--- Select Intents (comma separated) ---")
     print(", ".join(INTENTS.keys()))
@@ -184,8 +186,7 @@ def build_user_vector():
     for intent in intents:
         intent = intent.strip()
         if intent in INTENTS:
-            for emo, w in INTENTS[intent].items():
-                user_vec[emo] += w
+            mix.append(f"intent:{intent}")
 
     print("\n--- Select Emotion Clusters (cluster=weight) ---")
     print(", ".join(EMOTION_CLUSTERS.keys()))
@@ -195,36 +196,39 @@ def build_user_vector():
         if "=" in item:
             cluster, weight = item.split("=")
             cluster = cluster.strip()
-            weight = float(weight.strip())
-            emotions = EMOTION_CLUSTERS.get(cluster, [])
-            if emotions:
-                per = weight / len(emotions)
-                for e in emotions:
-                    user_vec[e] += per
+            if cluster in EMOTION_CLUSTERS:
+                mix.append((f"cluster:{cluster}", float(weight.strip())))
+
+    user_vec = VOCAB.vector(mix, normalize=False)
 
     print("\n--- Fine tune individual emotions (emotion=weight) ---")
     print(", ".join(BASE_EMOTIONS))
     emo_input = input("> ").split(",")
 
+    # fine-tuned emotions replace whatever the intents and clusters gave
     for item in emo_input:
         if "=" in item:
             e, w = item.split("=")
-            user_vec[e.strip()] = float(w.strip())
+            if e.strip() in BASE_EMOTIONS:
+                user_vec[BASE_EMOTIONS.index(e.strip())] = float(w.strip())
 
-    return normalize(user_vec)
+    total = user_vec.sum()
+    return user_vec / total if total else user_vec
 
 # ============================================================
 # 7. RECOMMENDATION ENGINE
 # ============================================================
 
-def recommend(user_vec, top_n=5):
-    scored = []
-    for movie in MOVIES:
-        score = dot_product(user_vec, movie["emotions"])
-        scored.append((movie["title"], score))
+MOVIE_INDEX = EmotionIndex(
+    pd.DataFrame([{"title": m["title"], **m["emotions"]} for m in MOVIES])
+      .reindex(columns=["title"] + BASE_EMOTIONS),
+    emotions=BASE_EMOTIONS,
+    normalize=False,
+)
 
-    scored.sort(key=lambda x: x[1], reverse=True)
-    return scored[:top_n]
+def recommend(user_vec, top_n=5):
+    order, scores = MOVIE_INDEX.topk(user_vec, top_n)
+    return [(MOVIE_INDEX.df.iloc[i]["title"], float(s)) for i, s in zip(order, scores)]
 
 # ============================================================
 # 8. MAIN
@@ -235,8 +239,9 @@ if __name__ == "__main__":
     user_vector = build_user_vector()
 
     print("\nYour emotion vector:")
-    for k, v in sorted(user_vector.items(), key=lambda x: -x[1]):
-        print(f"{k:15s} : {v:.2f}")
+    for j in np.argsort(-user_vector, kind="stable"):
+        if user_vector[j]:
+            print(f"{BASE_EMOTIONS[j]:15s} : {user_vector[j]:.2f}")
 
     print("\n🎯 Recommended Movies:")
     results = recommend(user_vector)
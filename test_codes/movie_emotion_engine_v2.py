@@ -1,12 +1,13 @@
-import pandas as pd
+import os
 import numpy as np
-from collections import defaultdict
-import subprocess
 import sys
-import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from catalog_ingest import validate_csv
+from emotion_index import EmotionIndex
+from emotion_vocab import CLUSTER_MAP, EMOTION_ALIASES, INTENT_MAP, vocabulary
 
 CSV_FILE = "movies_emotions_50.csv"
-VALIDATOR_FILE = "validate_csv.py"
 
 # =========================================================
 # CANONICAL EMOTION SPACE (24D)
@@ -20,74 +21,27 @@ EMOTIONS = [
     "nostalgia","compassion","anxiety","inspiration"
 ]
 
-# =========================================================
-# FRIENDLY ALIASES (UX → INTERNAL MAPPING)
-# =========================================================
-
-EMOTION_ALIASES = {
-    "suspense": {"anticipation": 0.6, "anxiety": 0.4},
-    "pride": {"confidence": 1.0},
-    "acceptance": {"relief": 0.6, "trust": 0.4},
-    "despair": {"sadness": 0.6, "loneliness": 0.4},
-    "hatred": {"anger": 1.0},
-    "shock": {"surprise": 1.0}
-}
-
-# =========================================================
-# INTENTS → EMOTIONS
-# =========================================================
-
-INTENT_MAP = {
-    "adrenaline": {"fear": 0.4, "excitement": 0.4, "anger": 0.2},
-    "comfort": {"joy": 0.4, "love": 0.3, "relief": 0.3},
-    "catharsis": {"sadness": 0.4, "regret": 0.3, "hope": 0.3},
-    "fun": {"joy": 0.5, "surprise": 0.3, "excitement": 0.2},
-    "contemplation": {"curiosity": 0.4, "sadness": 0.3, "hope": 0.3},
-    "inspiration": {"hope": 0.4, "confidence": 0.3, "determination": 0.3}
-}
-
-# =========================================================
-# EMOTION CLUSTERS → EMOTIONS
-# =========================================================
-
-CLUSTER_MAP = {
-    "dark_intensity": {
-        "fear": 0.35, "anger": 0.30, "anxiety": 0.20, "disgust": 0.15
-    },
-    "emotional_pain": {
-        "sadness": 0.40, "loneliness": 0.25, "regret": 0.20, "guilt": 0.15
-    },
-    "positive_energy": {
-        "joy": 0.40, "love": 0.30, "gratitude": 0.20, "relief": 0.10
-    },
-    "engagement": {
-        "curiosity": 0.35, "anticipation": 0.30, "surprise": 0.20, "excitement": 0.15
-    },
-    "meaning_growth": {
-        "hope": 0.35, "confidence": 0.25, "determination": 0.25, "inspiration": 0.15
-    }
-}
+# Friendly aliases, intents and clusters live in emotion_vocab.py, compiled
+# once into a (terms x 24) projection matrix
+VOCAB = vocabulary(EMOTIONS)
 
 # =========================================================
 # UTILITIES
 # =========================================================
 
-def normalize(vec):
-    total = sum(vec.values())
-    return {k: v / total for k, v in vec.items()} if total > 0 else vec
-
 def print_top_emotions(vec, top_n=7):
     print("\n🧠 Your emotional state (top influences):")
     print("-" * 45)
-    for e, v in sorted(vec.items(), key=lambda x: x[1], reverse=True)[:top_n]:
-        print(f"{e:<18}: {v:.2f}")
+    for j in np.argsort(-vec, kind="stable")[:top_n]:
+        if vec[j] > 0:
+            print(f"{EMOTIONS[j]:<18}: {vec[j]:.2f}")
 
 # =========================================================
 # USER INPUT
 # =========================================================
 
 def get_user_vector():
-    vec = defaultdict(float)
+    mix = []
 
     print("\n🎬 Emotion-Based Movie Recommender")
     print("=" * 70)
@@ -106,8 +60,7 @@ def get_user_vector():
             intent = intent.strip()
             if intent not in INTENT_MAP:
                 sys.exit(f"❌ Unknown intent: {intent}")
-            for e, w in INTENT_MAP[intent].items():
-                vec[e] += w
+            mix.append(f"intent:{intent}")
 
     # ---------------- STEP 2: CLUSTERS ----------------
     print("\n🌗 STEP 2: WHAT kind of mood?")
@@ -121,8 +74,7 @@ def get_user_vector():
             cluster = cluster.strip()
             if cluster not in CLUSTER_MAP:
                 sys.exit(f"❌ Unknown cluster: {cluster}")
-            for e, w in CLUSTER_MAP[cluster].items():
-                vec[e] += w
+            mix.append(f"cluster:{cluster}")
 
     # ---------------- STEP 3: INDIVIDUAL ----------------
     print("\n🎚️ STEP 3: Fine-tune emotions (optional)")
@@ -141,38 +93,37 @@ def get_user_vector():
             val = float(val)
 
             if name in EMOTION_ALIASES:
-                for e, w in EMOTION_ALIASES[name].items():
-                    vec[e] += w * val
+                mix.append((f"alias:{name}", val))
             elif name in EMOTIONS:
-                vec[name] += val
+                mix.append((f"emotion:{name}", val))
             else:
                 sys.exit(f"❌ Unknown emotion: {name}")
 
-    if not vec:
+    try:
+        vec = VOCAB.vector(mix)
+    except ValueError as e:
+        sys.exit(f"❌ {e}")
+    if not vec.any():
         sys.exit("❌ No input provided. Please select at least one option.")
 
-    vec = normalize(vec)
     print_top_emotions(vec)
 
     # Optional full vector
     show_all = input("\nShow full emotion vector? (y/n): ").strip().lower()
     if show_all == "y":
         print("\nFull normalized emotion vector:")
-        for e in EMOTIONS:
-            print(f"{e:<15}: {vec.get(e, 0):.3f}")
+        for e, v in zip(EMOTIONS, vec):
+            print(f"{e:<15}: {v:.3f}")
 
-    return np.array([vec.get(e, 0) for e in EMOTIONS])
+    return vec
 
 # =========================================================
 # RECOMMENDER
 # =========================================================
 
-def recommend(df, user_vec, top_k=5):
-    movie_matrix = df[EMOTIONS].to_numpy()
-    scores = movie_matrix @ user_vec
-    df = df.copy()
-    df["score"] = scores
-    return df.sort_values("score", ascending=False).head(top_k)
+def recommend(index, user_vec, top_k=5):
+    order, scores = index.topk(user_vec, top_k)
+    return index.df.iloc[order].assign(score=scores)
 
 # =========================================================
 # MAIN
@@ -190,14 +141,15 @@ def main():
     choice = input("> ").strip()
 
     if choice == "1":
-        if not os.path.exists(VALIDATOR_FILE):
-            sys.exit("❌ validate_csv.py not found")
-        subprocess.run([sys.executable, VALIDATOR_FILE], check=True)
+        stats = validate_csv(CSV_FILE, emotions=EMOTIONS)
+        if stats["rejected"]:
+            sys.exit(f"❌ {stats['rejected']} of {stats['rows']} rows failed validation")
+        print(f"✅ {stats['rows']} rows valid")
 
-    df = pd.read_csv(CSV_FILE)
+    index = EmotionIndex.from_csv(CSV_FILE, emotions=EMOTIONS, normalize=False)
 
     user_vec = get_user_vector()
-    results = recommend(df, user_vec)
+    results = recommend(index, user_vec)
 
     print("\n🎯 Recommended Movies (best emotional match):")
     print("-" * 70)
@@ -10,25 +10,22 @@ Run: python movie_recommender_gui.py
 """
 
 import os
+import sys
 import tkinter as tk
 from tkinter import ttk, messagebox
 import pandas as pd
 import numpy as np
 
-# --- Config: release year bins (adjust if you want different ranges) ---
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from emotion_index import EMOTIONS, EmotionIndex
+
+# --- Config: release year bins as inclusive [lo, hi] ranges (None = open) ---
 RELEASE_BINS = {
-    "old": lambda year: year <= 1999,
-    "mid": lambda year: 2000 <= year <= 2010,
-    "new": lambda year: year >= 2011,
+    "old": [None, 1999],
+    "mid": [2000, 2010],
+    "new": [2011, None],
 }
 
-EMOTIONS = [
-    "joy","sadness","fear","anger","disgust","surprise","trust",
-    "anticipation","curiosity","excitement","hope","love","guilt",
-    "shame","gratitude","loneliness","confidence","determination",
-    "regret","relief","nostalgia","compassion","anxiety","inspiration",
-]
-
 CSV_FILENAME = os.path.join(os.path.dirname(__file__), "movies_emotions_50_souj.csv")
 
 
@@ -38,19 +35,13 @@ class MovieRecommenderApp(tk.Tk):
         self.title("Emotion-Based Movie Recommender")
         self.geometry("900x700")
 
-        # load data
-        self.df = pd.read_csv(CSV_FILENAME)
-        for col in ["year", "imdb"]:
-            if col in self.df.columns:
-                self.df[col] = pd.to_numeric(self.df[col], errors="coerce")
-
-        # prepare movie emotion matrix (as np.array)
-        self.emotion_cols = [c for c in EMOTIONS if c in self.df.columns]
-        if len(self.emotion_cols) != len(EMOTIONS):
-            missing = set(EMOTIONS) - set(self.emotion_cols)
-            messagebox.showerror("Data error", f"Missing emotions in CSV: {missing}")
+        # load data; the engine normalizes the movie matrix once
+        try:
+            self.index = EmotionIndex.from_csv(CSV_FILENAME)
+        except ValueError as e:
+            messagebox.showerror("Data error", str(e))
             self.destroy(); return
-        self.movie_matrix = self.df[self.emotion_cols].fillna(0).to_numpy(dtype=float)
+        self.df = self.index.df
 
         # UI variables
         self.time_vars = {k: tk.IntVar(value=1) for k in RELEASE_BINS}  # default all selected
@@ -129,56 +120,37 @@ class MovieRecommenderApp(tk.Tk):
             v.set(1)
 
     def recommend(self):
-        # build timeframe mask
+        # timeframe and IMDB filters, answered from the engine's sorted indexes
+        filters = {}
         selected_bins = [k for k, v in self.time_vars.items() if v.get()]
         if selected_bins:
-            mask = np.zeros(len(self.df), dtype=bool)
-            for b in selected_bins:
-                cond = self.df['year'].apply(lambda y: RELEASE_BINS[b](y) if not pd.isna(y) else False)
-                mask |= cond.to_numpy()
-        else:
-            mask = np.ones(len(self.df), dtype=bool)
-
-        # apply IMDB filter
+            filters["years"] = [RELEASE_BINS[b] for b in selected_bins]
         try:
             min_r = float(self.min_imdb.get())
         except Exception:
             min_r = 0.0
-        mask &= (self.df['imdb'].fillna(0) >= min_r)
+        if min_r > 0:
+            filters["imdb_min"] = min_r
 
-        if not mask.any():
+        mask = self.index.filter_mask(filters)
+        if mask is not None and not mask.any():
             messagebox.showinfo("No matches", "No movies match your timeframe and rating filters.")
             return
 
         # user emotion vector (scale to 0-1)
         user_vec = np.array([self.emotion_vars[e].get() for e in EMOTIONS], dtype=float) / 10.0
-        user_norm = np.linalg.norm(user_vec)
-        if user_norm == 0:
+        if not user_vec.any():
             messagebox.showerror("Input error", "Please set at least one emotion slider above 0.")
             return
-        user_unit = user_vec / user_norm
-
-        # normalize movie vectors
-        movie_vecs = self.movie_matrix.copy()
-        norms = np.linalg.norm(movie_vecs, axis=1)
-        zero_norms = norms == 0
-        norms[zero_norms] = 1.0  # avoid div by zero
-        movie_unit = (movie_vecs.T / norms).T
-
-        # compute similarities for filtered movies
-        indices = np.where(mask)[0]
-        sim = movie_unit[indices].dot(user_unit)
 
-        # rank and pick top 3
-        top_k = min(3, len(sim))
-        order = np.argsort(-sim)[:top_k]
+        # score the filtered movies and pick top 3
+        order, sim = self.index.topk(user_vec, 3, filters=filters)
 
         results = []
-        for idx in order:
-            movie_i = indices[idx]
+        for movie_i, score in zip(order, sim):
             row = self.df.iloc[movie_i]
             results.append((row['title'], int(row['year']) if not pd.isna(row['year']) else "N/A",
-                            row.get('genres', ''), row.get('imdb', ''), sim[idx]))
+                            row.get('genres', ''), row.get('imdb', ''), score))
 
         # show results
         self.results_box.config(state=tk.NORMAL)